@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+PDF目录工具 - 性能基准测试
+生成合成的 PDF 和目录文本，测量解析、写入大纲、保存和读取目录的耗时，
+结果保存为 JSON，可以与基准结果比较并检查性能回退。
+--startup 测量界面从启动进程到第一次绘制的时间（源码运行，或用 --bundle 指定打包后的应用）。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+import outline_core as core
+
+# 界面程序（测量启动时间用）
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "source code.py")
+
+# 默认测试矩阵
+PAGE_COUNTS = [10, 100, 1000, 5000, 20000]
+QUICK_PAGE_COUNTS = [10, 100, 1000]
+OUTLINE_DEPTHS = [0, 1, 4]  # 合成 PDF 中已有大纲的层数，0 表示没有大纲
+TOC_SIZES = [1000, 100000, 1000000]
+QUICK_TOC_SIZES = [1000, 100000]
+
+# 默认数据目录（合成的 PDF 会缓存在这里，重复运行时不必重新生成）
+DATA_DIR = "bench_data"
+
+
+def synthetic_toc(entries, depth, page_count, seed=0):
+    """
+    生成 [[层级, 标题, 页码], ...] 形式的合成目录，层级不超过 depth，页码在 1..page_count 之间递增。
+    """
+    rng = random.Random(seed)
+    toc = []
+    level = 1
+    for i in range(entries):
+        level = rng.randint(1, min(depth, level + 1)) if i else 1
+        page = 1 + i * page_count // entries
+        toc.append([level, f"第 {i + 1} 节 合成标题 Section {i + 1}", page])
+    return toc
+
+
+def synthetic_toc_text(entries, depth=3, page_count=1000):
+    """
+    生成 parse_outline 可以解析的合成目录文本。
+    """
+    return core.toc_to_text(synthetic_toc(entries, depth, page_count))
+
+
+def synthetic_pdf(data_dir, page_count, images, outline_depth):
+    """
+    生成（或复用已生成的）合成 PDF，返回路径。
+    images 为 True 时每页插入一张不同的小图片；outline_depth 大于 0 时附带已有大纲。
+    """
+    name = f"pages{page_count}_img{int(images)}_depth{outline_depth}.pdf"
+    path = os.path.join(data_dir, name)
+    if os.path.exists(path):
+        return path
+
+    rng = random.Random(page_count)
+    doc = fitz.open()
+    for number in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Synthetic page {number + 1}", fontsize=14)
+        page.insert_text((72, 100), "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 2, fontsize=9)
+        if images:
+            pixmap = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 96, 96), False)
+            pixmap.set_rect(pixmap.irect, (rng.randrange(256),))
+            page.insert_image(fitz.Rect(72, 140, 264, 332), pixmap=pixmap)
+    if outline_depth:
+        doc.set_toc(synthetic_toc(max(1, page_count // 2), outline_depth, page_count))
+    os.makedirs(data_dir, exist_ok=True)
+    doc.save(path, garbage=1)
+    doc.close()
+    return path
+
+
+def measure(func, repeat):
+    """
+    运行 func 若干次，返回每次的耗时（秒）。func 可以返回一个清理函数，在计时之后调用。
+    """
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cleanup = func()
+        runs.append(time.perf_counter() - started)
+        if callable(cleanup):
+            cleanup()
+    return runs
+
+
+def bench_parse_outline(sizes, repeat):
+    """
+    测量 parse_outline 解析不同条目数的目录文本。
+    """
+    results = []
+    for entries in sizes:
+        text = synthetic_toc_text(entries)
+        runs = measure(lambda: core.parse_outline(text, 0, []), repeat)
+        results.append(make_result("parse_outline", {"entries": entries}, runs))
+    return results
+
+
+def bench_pdf(path, page_count, images, outline_depth, repeat, work_dir):
+    """
+    对一个合成 PDF 测量读取目录、set_toc 和各种保存方式。
+    """
+    params = {"pages": page_count, "images": images, "outline_depth": outline_depth}
+    new_toc = synthetic_toc(max(1, page_count // 2), 3, page_count)
+    outline = core.parse_outline(core.toc_to_text(new_toc), 0, [])
+    output = os.path.join(work_dir, "out.pdf")
+    results = []
+
+    def load_existing_toc():
+        # 与 TocReader 相同的步骤：打开、读取大纲、转换为文本行
+        doc = fitz.open(path)
+        list(core.toc_to_lines(doc.get_toc()))
+        doc.close()
+
+    results.append(make_result("load_existing_toc", params, measure(load_existing_toc, repeat)))
+
+    def set_toc_only():
+        doc = fitz.open(path)
+        started = time.perf_counter()
+        doc.set_toc(new_toc)
+        elapsed = time.perf_counter() - started
+        doc.close()
+        return elapsed
+
+    results.append(make_result("set_toc", params, [set_toc_only() for _ in range(repeat)]))
+
+    for name, options in [
+        ("save_full", {}),
+        ("save_incremental", {"incremental": True}),
+        ("save_low_memory", {"low_memory": True}),
+        ("save_balanced", {"preset": core.SAVE_PRESET_BALANCED}),
+        ("save_compact", {"preset": core.SAVE_PRESET_COMPACT}),
+    ]:
+        sizes = []
+
+        def save():
+            core.add_outline_to_pdf(path, output, outline, [], **options)
+            sizes.append(os.path.getsize(output))
+            return lambda: os.remove(output)
+
+        result = make_result(name, params, measure(save, repeat))
+        result["output_bytes"] = sizes[-1]
+        results.append(result)
+    return results
+
+
+def startup_command(bundle):
+    """
+    返回启动界面的命令：默认用当前 Python 运行源码；bundle 为打包后的 .app 或可执行文件。
+    """
+    if not bundle:
+        return [sys.executable, SOURCE_PATH]
+    if bundle.rstrip("/").endswith(".app"):
+        name = os.path.splitext(os.path.basename(bundle.rstrip("/")))[0]
+        return [os.path.join(bundle, "Contents", "MacOS", name)]
+    return [bundle]
+
+
+def bench_startup(bundle, repeat):
+    """
+    多次启动界面，测量从启动进程到窗口第一次绘制的时间。
+    应用在 OUTLINE_STARTUP_REPORT 指定的文件中写入各时间点后自动退出。
+    """
+    build = "bundle" if bundle else "source"
+    runs = []
+    imports = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        report_path = os.path.join(work_dir, "startup.json")
+        env = dict(os.environ, OUTLINE_STARTUP_REPORT=report_path)
+        for _ in range(repeat):
+            launched = time.time()
+            subprocess.run(startup_command(bundle), env=env, check=True, timeout=120,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+            os.remove(report_path)
+            runs.append(report["first_paint"] - launched)
+            imports.append(report["module_loaded"] - launched)
+    result = make_result("startup", {"build": build}, runs)
+    result["module_loaded_median"] = statistics.median(imports)
+    result["pymupdf_loaded"] = report["pymupdf_loaded"]
+    return [result]
+
+
+def make_result(name, params, runs):
+    key = "/".join([name] + [f"{k}={int(v) if isinstance(v, bool) else v}" for k, v in params.items()])
+    return {
+        "key": key,
+        "name": name,
+        "params": params,
+        "median": statistics.median(runs),
+        "min": min(runs),
+        "runs": runs,
+    }
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    与基准结果比较中位数，返回超过阈值（相对变慢比例）的条目列表。
+    绝对差值小于 min_delta 秒的条目视为测量噪声，不算回退。
+    """
+    baseline_by_key = {item["key"]: item for item in baseline["results"]}
+    regressions = []
+    for item in results:
+        base = baseline_by_key.get(item["key"])
+        if base is None or base["median"] <= 0:
+            continue
+        change = item["median"] / base["median"] - 1
+        item["baseline_median"] = base["median"]
+        item["change"] = change
+        if change > threshold and item["median"] - base["median"] > min_delta:
+            regressions.append(item)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 目录工具性能基准测试")
+    parser.add_argument("--quick", action="store_true", help="只跑较小的规模")
+    parser.add_argument("--pages", type=int, nargs="+", help="要测试的页数，默认 10 到 20000")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取中位数")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="合成 PDF 的缓存目录")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 路径")
+    parser.add_argument("--baseline", help="与之比较的基准结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的变慢比例，默认 0.25（25%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="小于此差值（毫秒）的变慢视为噪声")
+    parser.add_argument("--startup", action="store_true", help="只测量界面启动到第一次绘制的时间")
+    parser.add_argument("--bundle", help="同时测量打包后的应用（.app 或可执行文件）的启动时间")
+    args = parser.parse_args()
+
+    page_counts = args.pages or (QUICK_PAGE_COUNTS if args.quick else PAGE_COUNTS)
+    toc_sizes = QUICK_TOC_SIZES if args.quick else TOC_SIZES
+
+    if args.startup:
+        print("⏱️  启动时间（源码）...")
+        results = bench_startup(None, args.repeat)
+        if args.bundle:
+            print(f"⏱️  启动时间（{args.bundle}）...")
+            results.extend(bench_startup(args.bundle, args.repeat))
+    else:
+        print("⏱️  parse_outline ...")
+        results = bench_parse_outline(toc_sizes, args.repeat)
+        with tempfile.TemporaryDirectory() as work_dir:
+            for page_count in page_counts:
+                for images in (False, True):
+                    for depth in OUTLINE_DEPTHS:
+                        print(f"⏱️  {page_count} 页，图片：{'有' if images else '无'}，已有大纲层数：{depth} ...")
+                        path = synthetic_pdf(args.data_dir, page_count, images, depth)
+                        results.extend(bench_pdf(path, page_count, images, depth, args.repeat, work_dir))
+
+    for item in results:
+        size = f"{item['output_bytes'] / 2 ** 20:>10.1f} MB" if "output_bytes" in item else ""
+        if "module_loaded_median" in item:
+            size = f"（其中导入 {item['module_loaded_median'] * 1000:.1f} ms）"
+        print(f"   {item['key']:<60} {item['median'] * 1000:>10.1f} ms{size}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+        report["regressions"] = [item["key"] for item in regressions]
+        if regressions:
+            print(f"❌ {len(regressions)} 项比基准慢超过 {args.threshold:.0%}：")
+            for item in regressions:
+                print(f"   {item['key']}: {item['baseline_median'] * 1000:.1f} ms → "
+                      f"{item['median'] * 1000:.1f} ms（{item['change']:+.0%}）")
+            exit_code = 1
+        else:
+            print(f"✅ 没有超过 {args.threshold:.0%} 的性能回退")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📄 结果已保存: {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
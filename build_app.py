@@ -36,6 +36,8 @@ def build_app():
         "--exclude-module=matplotlib",  # 排除不需要的模块
         "--exclude-module=numpy",       # 排除不需要的模块
         "--exclude-module=scipy",       # 排除不需要的模块
+        "--hidden-import=fitz",         # PyMuPDF 在程序中延迟导入，静态分析找不到
+        "--hidden-import=pymupdf",
         *icon_args,                     # 添加图标参数
         script_name
     ]
@@ -52,6 +54,7 @@ def build_app():
         print("\n💡 使用说明:")
         print(f"   双击 dist/{app_name}.app 运行应用")
         print("   可以将.app文件移动到Applications文件夹")
+        print(f"   测量启动时间: python benchmark.py --startup --bundle dist/{app_name}.app")
         
     except subprocess.CalledProcessError as e:
         print(f"❌ 打包失败: {e}")
@@ -2,96 +2,147 @@
 """
 为PDF目录工具创建macOS应用图标
 需要将源图片保存为 icon_source.png
+.icns 文件直接用 Python 写出，不依赖 macOS 的 iconutil，在 Linux 上也能运行
 """
 
 import os
-import subprocess
+import sys
+import json
+import shutil
+import struct
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from PIL import Image, ImageDraw
 
-def create_rounded_icon(source_path, output_path, size=1024, corner_radius=180):
-    """创建圆角矩形图标"""
-    
-    # 打开源图片
-    img = Image.open(source_path).convert("RGBA")
-    
-    # 调整大小为正方形
-    img = img.resize((size, size), Image.Resampling.LANCZOS)
-    
-    # 创建圆角遮罩
+# macOS图标尺寸：(像素, iconset 中的文件名, .icns 中的类型)
+ICON_SIZES = [
+    (16, "icon_16x16.png", b"icp4"),
+    (32, "icon_16x16@2x.png", b"ic11"),
+    (32, "icon_32x32.png", b"icp5"),
+    (64, "icon_32x32@2x.png", b"ic12"),
+    (128, "icon_128x128.png", b"ic07"),
+    (256, "icon_128x128@2x.png", b"ic13"),
+    (256, "icon_256x256.png", b"ic08"),
+    (512, "icon_256x256@2x.png", b"ic14"),
+    (512, "icon_512x512.png", b"ic09"),
+    (1024, "icon_512x512@2x.png", b"ic10"),
+]
+
+CORNER_RATIO = 0.176  # 圆角半径占边长的比例，约18%
+
+# 记录上次生成时源图片的内容哈希，源图片和生成参数都没变时跳过
+CACHE_FILE = ".icon_cache.json"
+
+@lru_cache(maxsize=None)
+def rounded_mask(size, corner_radius):
+    """创建圆角矩形遮罩；同样的尺寸只画一次，遮罩只读使用"""
     mask = Image.new("L", (size, size), 0)
     draw = ImageDraw.Draw(mask)
     draw.rounded_rectangle([(0, 0), (size, size)], corner_radius, fill=255)
-    
-    # 应用遮罩
-    result = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-    result.paste(img, (0, 0))
-    result.putalpha(mask)
-    
+    return mask
+
+def rounded_image(img, size, corner_radius):
+    """把已解码的图片缩放到 size 并套上圆角遮罩"""
+    result = img.resize((size, size), Image.Resampling.LANCZOS)
+    result.putalpha(rounded_mask(size, corner_radius))
+    return result
+
+def png_bytes(img):
+    """把图片编码为 PNG 数据"""
+    buffer = BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def create_rounded_icon(source_path, output_path, size=1024, corner_radius=180):
+    """创建圆角矩形图标，返回生成的图片供后续各尺寸复用"""
+
+    # 打开源图片
+    img = Image.open(source_path).convert("RGBA")
+
+    # 调整大小为正方形并应用遮罩
+    result = rounded_image(img, size, corner_radius)
+
     # 保存
     result.save(output_path, "PNG")
     print(f"✅ 圆角图标已生成: {output_path}")
+    return result
+
+def render_icon_sizes(base_img):
+    """
+    并行生成各尺寸的 PNG 数据，返回 {像素: PNG 数据}。
+    同一像素只生成一次（如 32 既是 16@2x 又是 32x32）；
+    Pillow 缩放和压缩时会释放 GIL，所以线程池就能利用多核。
+    """
+    base_img.load()  # 先解码，避免各线程重复读取文件
+    sizes = sorted({size for size, _, _ in ICON_SIZES})
+
+    def render(size):
+        return png_bytes(rounded_image(base_img, size, int(size * CORNER_RATIO)))
+
+    with ThreadPoolExecutor(max_workers=len(sizes)) as executor:
+        return dict(zip(sizes, executor.map(render, sizes)))
+
+def write_icns(path, entries):
+    """
+    写出 .icns 文件：文件头 'icns' + 总长度，之后每项为 类型 + 长度（含 8 字节项头）+ PNG 数据。
+    entries 为 [(类型, PNG 数据), ...]。
+    """
+    body = b"".join(struct.pack(">4sI", kind, len(data) + 8) + data for kind, data in entries)
+    with open(path, "wb") as f:
+        f.write(struct.pack(">4sI", b"icns", len(body) + 8))
+        f.write(body)
+
+def create_iconset(png_path, base_img=None):
+    """创建macOS图标集和 .icns 文件；base_img 为已经解码的圆角图片，给出时不再重新读取 png_path"""
 
-def create_iconset(png_path):
-    """创建macOS图标集"""
-    
     iconset_dir = "icon.iconset"
-    
+
     # 创建iconset目录
     if os.path.exists(iconset_dir):
-        subprocess.run(["rm", "-rf", iconset_dir])
+        shutil.rmtree(iconset_dir)
     os.makedirs(iconset_dir)
-    
-    # macOS图标尺寸
-    sizes = [
-        (16, "icon_16x16.png"),
-        (32, "icon_16x16@2x.png"),
-        (32, "icon_32x32.png"),
-        (64, "icon_32x32@2x.png"),
-        (128, "icon_128x128.png"),
-        (256, "icon_128x128@2x.png"),
-        (256, "icon_256x256.png"),
-        (512, "icon_256x256@2x.png"),
-        (512, "icon_512x512.png"),
-        (1024, "icon_512x512@2x.png")
-    ]
-    
+
     # 生成各种尺寸
-    base_img = Image.open(png_path).convert("RGBA")
-    
-    for size, filename in sizes:
-        # 按比例计算圆角
-        corner_radius = int(size * 0.176)  # 约18%的圆角
-        
-        # 调整大小
-        resized = base_img.resize((size, size), Image.Resampling.LANCZOS)
-        
-        # 创建圆角遮罩
-        mask = Image.new("L", (size, size), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle([(0, 0), (size, size)], corner_radius, fill=255)
-        
-        # 应用遮罩
-        result = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-        result.paste(resized, (0, 0))
-        result.putalpha(mask)
-        
+    if base_img is None:
+        base_img = Image.open(png_path).convert("RGBA")
+    rendered = render_icon_sizes(base_img)
+
+    for size, filename, _ in ICON_SIZES:
         # 保存到iconset
-        result.save(os.path.join(iconset_dir, filename), "PNG")
-    
+        with open(os.path.join(iconset_dir, filename), "wb") as f:
+            f.write(rendered[size])
+
     print(f"✅ 图标集已创建: {iconset_dir}/")
-    
+
     # 生成.icns文件
+    icns_path = "icon.icns"
+    write_icns(icns_path, [(kind, rendered[size]) for size, _, kind in ICON_SIZES])
+    print(f"✅ 图标文件已生成: {icns_path}")
+    return icns_path
+
+def source_hash(source_path):
+    """源图片内容和生成参数的哈希，任何一个变化都需要重新生成"""
+    digest = hashlib.sha256()
+    with open(source_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(repr((ICON_SIZES, CORNER_RATIO)).encode("utf-8"))
+    return digest.hexdigest()
+
+def is_up_to_date(source_digest, outputs):
+    """上次生成时的哈希与现在相同，且输出文件都还在"""
     try:
-        subprocess.run(["iconutil", "-c", "icns", iconset_dir], check=True)
-        print("✅ 图标文件已生成: icon.icns")
-        return "icon.icns"
-    except subprocess.CalledProcessError:
-        print("❌ 生成.icns失败，但.iconset已创建")
-        return None
+        with open(CACHE_FILE, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return cache.get("source_hash") == source_digest and all(os.path.exists(path) for path in outputs)
 
 def main():
     source_file = "icon_source.png"
-    
+
     if not os.path.exists(source_file):
         print(f"❌ 请将源图片保存为: {source_file}")
         print("💡 步骤:")
@@ -99,19 +150,28 @@ def main():
         print(f"   2. 保存为: {source_file}")
         print("   3. 运行此脚本")
         return
-    
+
     try:
-        # 先创建圆角版本
         rounded_path = "icon_rounded.png"
-        create_rounded_icon(source_file, rounded_path)
-        
+        outputs = [rounded_path, "icon.iconset", "icon.icns"]
+        digest = source_hash(source_file)
+        if "--force" not in sys.argv[1:] and is_up_to_date(digest, outputs):
+            print("✅ 源图片没有变化，图标已是最新（加 --force 强制重新生成）")
+            return
+
+        # 先创建圆角版本
+        rounded = create_rounded_icon(source_file, rounded_path)
+
         # 创建完整的图标集
-        icns_path = create_iconset(rounded_path)
-        
+        icns_path = create_iconset(rounded_path, rounded)
+
+        with open(CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"source_hash": digest}, f)
+
         if icns_path:
             print("\n🎉 图标创建完成！")
             print("现在可以重新打包应用了")
-            
+
     except ImportError:
         print("❌ 需要安装Pillow库")
         print("运行: pip install Pillow")
@@ -119,4 +179,4 @@ def main():
         print(f"❌ 错误: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,1957 @@
+"""
+PDF目录工具 - 核心功能
+解析目录文本、写入 PDF 大纲、提取目录页和检测页码偏移，以及批量模式。
+不依赖 PyQt5，脚本和工作进程可以直接导入，不必加载界面库。
+服务和监视文件夹模式分别在 outline_service.py 和 outline_watch.py 中；
+只有部分功能才用到的标准库（进程池、sqlite3 等）在用到时才加载，界面启动和每个工作进程都不必为它们付出导入时间。
+"""
+
+import sys
+import os
+import importlib.util
+import platform
+import re
+import argparse
+import csv
+import json
+import time
+import shutil
+import cProfile
+import itertools
+import functools
+import bisect
+import mmap
+import tempfile
+import hashlib
+import zlib
+from collections import namedtuple
+import threading
+
+
+def lazy_import(name):
+    """
+    返回延迟加载的模块：第一次访问它的属性时才真正执行导入。
+    打包时需要把模块加到 PyInstaller 的 --hidden-import 中。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# PyMuPDF 导入需要 0.1 秒以上，窗口显示时还用不到，等第一次打开 PDF 时再加载
+fitz = lazy_import("fitz")
+# 只有页面文字缓存用到 sqlite3
+sqlite3 = lazy_import("sqlite3")
+
+SAVE_FULL = "full"  # 完整重写整个文件
+SAVE_INCREMENTAL = "incremental"  # 只在文件末尾追加修改过的对象
+
+SAVE_MODE_NAMES = {
+    SAVE_FULL: "完整重写",
+    SAVE_INCREMENTAL: "增量更新",
+}
+
+# 完整重写时的保存预设：在保存速度和输出大小之间取舍，增量保存不受影响
+SAVE_PRESET_FAST = "fast"  # 原样写出所有对象，最快
+SAVE_PRESET_BALANCED = "balanced"  # 去掉无用对象、压缩未压缩的流、使用对象流
+SAVE_PRESET_COMPACT = "compact"  # 另外合并重复对象、重新压缩图片和字体，最小但最慢
+
+SAVE_PRESETS = {
+    SAVE_PRESET_FAST: {},
+    SAVE_PRESET_BALANCED: {'garbage': 1, 'deflate': True, 'use_objstms': 1},
+    SAVE_PRESET_COMPACT: {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+                          'use_objstms': 1},
+}
+
+SAVE_PRESET_NAMES = {
+    SAVE_PRESET_FAST: "快速",
+    SAVE_PRESET_BALANCED: "均衡",
+    SAVE_PRESET_COMPACT: "紧凑",
+}
+
+# 低内存模式默认在各阶段之间把 MuPDF 对象缓存收缩的百分比，100 即全部清空
+STORE_SHRINK_LOW_MEMORY = 100
+
+
+def store_shrink_percent(value):
+    """
+    命令行参数 --store-shrink 的类型检查：0 到 100 之间的整数。
+    """
+    try:
+        percent = int(value)
+    except ValueError:
+        percent = -1
+    if not 0 <= percent <= 100:
+        raise argparse.ArgumentTypeError(f"应为 0 到 100 之间的整数：{value}")
+    return percent
+
+
+# 大纲条目：层级（从 1 开始）、标题、调整后的页码（从 0 开始）
+OutlineEntry = namedtuple('OutlineEntry', ['level', 'title', 'page'])
+
+def iter_text_lines(text):
+    """
+    按 '\n' 逐行迭代字符串，不一次性生成整个行列表。
+    """
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def parse_outline_line(line, page_offset, page_map=None, after=0):
+    """
+    解析单行目录文本。
+    空行返回 None；否则返回 (层级, 标题, 调整后的页码, 错误信息)，
+    没有错误时错误信息为 None，出错时标题和页码可能为 None。
+    给出 page_map（PageMap）时页码按印刷页码查表，可以是罗马数字等标签，
+    after 为上一条目的物理页码，用于区分多卷中重复的页码；表中没有的数字页码仍按 page_offset 计算。
+    """
+    line = line.rstrip()
+    if not line:
+        return None
+    # 计算缩进以确定层级，制表符对齐到下一个 4 列
+    stripped_line = line.lstrip(' \t')
+    indent = len(line) - len(stripped_line)
+    if indent and '\t' in line[:indent]:
+        indent = len(line[:indent].expandtabs(4))
+    level = indent // 4 + 1  # 每 4 个空格为一个层级
+
+    # 从右边拆出最后一段作为页码，不需要回溯的正则匹配
+    parts = stripped_line.rsplit(None, 1)
+    if len(parts) < 2:
+        return level, None, None, f"格式错误，缺少页码：{line}"
+    title, page = parts
+    if not page.isdecimal():
+        # 页码不是纯数字（如带正负号）时，标题中的连续空白合并为一个空格
+        title = ' '.join(title.split())
+
+    if page_map is not None:
+        page_number = page_map.resolve(page, after)
+        if page_number is not None:
+            return level, title, page_number, None
+    try:
+        page_number = int(page) + page_offset - 1  # 调整页码，考虑 0 起始索引
+    except ValueError:
+        if page_map is not None:
+            return level, title, None, f"页码表中没有印刷页码 {page}，标题：{title}"
+        return level, title, None, f"无法解析页码：{page}，标题：{title}"
+    if page_number < 0:
+        return level, title, page_number, f"页码调整后小于 0：{title}"
+    return level, title, page_number, None
+
+
+def iter_outline(lines, page_offset, errors, page_map=None):
+    """
+    逐行解析目录，按顺序产生 OutlineEntry。
+    缩进每 4 个空格或每个制表符为一个层级；行尾的数字为页码。
+    收集所有解析错误到 errors 列表。
+    page_map 见 parse_outline_line。
+    """
+    new_entry = OutlineEntry._make
+    after = 0
+    for idx, line in enumerate(lines, start=1):
+        parsed = parse_outline_line(line, page_offset, page_map, after)
+        if parsed is None:
+            continue
+        if parsed[3]:
+            errors.append(f"行 {idx} {parsed[3]}")
+            continue
+        after = parsed[2]
+        yield new_entry(parsed[:3])
+
+
+class OutlineCancelled(Exception):
+    """
+    用户取消处理时由进度回调抛出。
+    """
+
+
+class MappedFile:
+    """
+    以只读内存映射方式打开的文件。
+    用 fitz.open(stream=mapped.view, filetype="pdf") 打开时文件内容由系统按需换入换出，
+    不会整份读进进程内存。
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self._mapping)
+
+    def close(self):
+        self.view.release()
+        self._mapping.close()
+
+
+def new_temp_output(output_pdf):
+    """
+    在输出文件所在目录创建一个唯一的临时文件，返回其路径。
+    放在同一目录下才能原子地重命名；权限与新建普通文件相同。
+    """
+    dir_name, base_name = os.path.split(os.path.abspath(output_pdf))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{base_name}.", suffix=".tmp", dir=dir_name)
+    os.close(fd)
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+    return temp_path
+
+
+def replace_file_durably(temp_path, target_path):
+    """
+    把写好的临时文件刷到磁盘后原子地替换目标文件，再同步所在目录，
+    即使中途崩溃或断电，目标位置也只会是旧文件或完整的新文件。
+    """
+    with open(temp_path, 'r+b') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, target_path)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(target_path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def peak_rss_bytes():
+    """
+    返回当前进程自启动以来的峰值常驻内存（字节）；无法获取时返回 None。
+    这是整个进程生命周期的最大值，长时间运行的进程中不能反映某个阶段或某次处理的用量。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def current_rss_bytes():
+    """
+    返回当前进程此刻的常驻内存（字节），读取 /proc/self/statm；其他系统无法获取时返回 None。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def bytes_to_mb(size):
+    return round(size / 2 ** 20, 1) if size is not None else None
+
+
+# 各处理阶段在耗时统计中的名称
+STAGE_NAMES = {
+    'page_map': "建立页码表",
+    'parse': "解析目录",
+    'open': "打开 PDF",
+    'set_toc': "写入大纲",
+    'save': "保存文件",
+    'done': "替换输出",
+}
+
+
+def metrics_log_path():
+    """
+    返回处理记录（JSON Lines）的路径，可以用环境变量 OUTLINE_METRICS_LOG 指定，设为空字符串则不记录。
+    """
+    if "OUTLINE_METRICS_LOG" in os.environ:
+        return os.environ["OUTLINE_METRICS_LOG"] or None
+    return os.path.join(user_cache_dir(), "jobs.jsonl")
+
+
+# 处理记录超过这个大小时改名为 .1 备份（覆盖上一个备份），重新开始记录
+METRICS_LOG_MAX_BYTES = 10 * 2 ** 20
+
+
+def rotate_metrics_log(log_path, max_bytes=METRICS_LOG_MAX_BYTES):
+    """
+    处理记录文件超过 max_bytes 时轮换，只保留一个备份。
+    """
+    try:
+        if os.path.getsize(log_path) > max_bytes:
+            os.replace(log_path, log_path + ".1")
+    except OSError:
+        pass  # 文件还不存在，或其他进程刚刚轮换过
+
+
+class JobMetrics:
+    """
+    记录一次处理中每个阶段（见 STAGE_NAMES）的墙钟时间、CPU 时间和阶段开始、结束时的常驻内存，
+    以及页数、条目数、写入字节数等信息，结束时以一行 JSON 追加到处理记录中。
+    设置环境变量 OUTLINE_PROFILE=1 时同时用 cProfile 记录本次处理，结果保存在记录文件旁边。
+    用 enter(阶段名) 作为 add_outline_to_pdf 的进度回调即可划分阶段；需要在处理所在的线程中创建。
+    CPU 时间是整个进程的，界面线程同时繁忙时会略偏大。
+    peak_rss_mb 是进程自启动以来的峰值（见 peak_rss_bytes），在界面和服务这类长期运行的进程中会偏大，
+    单次处理的内存变化看各阶段的 rss_start_mb 和 rss_end_mb。
+    """
+
+    _profile_counter = itertools.count(1)
+
+    def __init__(self, **fields):
+        self.record = {'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'pid': os.getpid(), **fields, 'stages': {}}
+        self._stage = None
+        self._started = (time.perf_counter(), time.process_time())
+        self._stage_started = self._started
+        self._stage_rss = None
+        self._profiler = None
+        if os.environ.get("OUTLINE_PROFILE"):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def enter(self, stage):
+        """
+        结束当前阶段并开始新的阶段。
+        """
+        self._end_stage()
+        self._stage = stage
+        self._stage_started = (time.perf_counter(), time.process_time())
+        self._stage_rss = current_rss_bytes()
+
+    def update(self, **fields):
+        self.record.update(fields)
+
+    def _end_stage(self):
+        if self._stage is None:
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        self.record['stages'][self._stage] = {
+            'wall': round(wall - self._stage_started[0], 4),
+            'cpu': round(cpu - self._stage_started[1], 4),
+            'rss_start_mb': bytes_to_mb(self._stage_rss),
+            'rss_end_mb': bytes_to_mb(current_rss_bytes()),
+        }
+        self._stage = None
+
+    def finish(self, status):
+        """
+        结束记录并写入处理记录文件，返回记录字典。
+        """
+        self._end_stage()
+        self.record.update({
+            'status': status,
+            'wall': round(time.perf_counter() - self._started[0], 4),
+            'cpu': round(time.process_time() - self._started[1], 4),
+            'rss_mb': bytes_to_mb(current_rss_bytes()),
+            'peak_rss_mb': bytes_to_mb(peak_rss_bytes()),
+        })
+        log_path = metrics_log_path()
+        if self._profiler is not None:
+            self._profiler.disable()
+            profile_dir = os.path.dirname(log_path) if log_path else "."
+            profile_path = os.path.join(
+                profile_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._profile_counter)}.prof")
+            try:
+                os.makedirs(profile_dir, exist_ok=True)
+                self._profiler.dump_stats(profile_path)
+                self.record['profile'] = profile_path
+            except OSError as e:
+                print(f"无法保存性能分析结果: {e}")
+        if log_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+                rotate_metrics_log(log_path, METRICS_LOG_MAX_BYTES)
+                with open(log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(self.record, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"无法写入处理记录: {e}")
+        return self.record
+
+    def summary(self):
+        """
+        返回适合在对话框中显示的耗时摘要。
+        """
+        lines = []
+        for stage, values in self.record['stages'].items():
+            lines.append(f"{STAGE_NAMES.get(stage, stage)}：{values['wall']:.3f}s（CPU {values['cpu']:.3f}s）")
+        lines.append(f"总计：{self.record.get('wall', 0):.3f}s，当前内存 {self.record.get('rss_mb')} MB，"
+                     f"进程峰值内存 {self.record.get('peak_rss_mb')} MB")
+        details = []
+        if 'pages' in self.record:
+            details.append(f"{self.record['pages']} 页")
+        if 'entries' in self.record:
+            details.append(f"{self.record['entries']} 条目录")
+        if 'outline_objects_written' in self.record:
+            method = "差异更新" if self.record['outline_update'] == "diff" else "整体重建"
+            details.append(f"{method}大纲，改写 {self.record['outline_objects_written']} 个对象")
+        if 'bytes_written' in self.record:
+            details.append(f"写入 {self.record['bytes_written'] / 2 ** 20:.1f} MB")
+        if details:
+            lines.append("，".join(details))
+        return "\n".join(lines)
+
+    def size_summary(self):
+        """
+        返回保存预设及其大小、耗时效果的一行说明；没有完整重写时返回空字符串。
+        """
+        record = self.record
+        if not record.get('preset') or 'bytes_written' not in record:
+            return ""
+        before, after = record['input_bytes'], record['bytes_written']
+        change = f"（{after / before - 1:+.0%}）" if before else ""
+        save_seconds = record['stages'].get('save', {}).get('wall', 0)
+        return (f"保存预设：{SAVE_PRESET_NAMES[record['preset']]}，文件大小 {before / 2 ** 20:.1f} MB → "
+                f"{after / 2 ** 20:.1f} MB{change}，保存耗时 {save_seconds:.2f}s")
+
+
+def incremental_save_blocker(doc):
+    """
+    检查文档能否增量保存。
+    可以时返回 None，否则返回不能增量保存的原因。
+    """
+    if doc.is_encrypted or doc.needs_pass:
+        return "文件已加密"
+    if doc.is_repaired:
+        return "文件已损坏并经过修复"
+    if not doc.can_save_incrementally():
+        return "文件不支持增量保存"
+    return None
+
+
+# 需要改写的大纲对象超过条目数的这个比例时，直接用 set_toc 整体重建
+OUTLINE_DIFF_MAX_RATIO = 0.5
+
+# 大纲条目之间互相引用的键
+OUTLINE_LINK_KEYS = ('Parent', 'Prev', 'Next', 'First', 'Last')
+
+
+def outline_tree_links(levels):
+    """
+    按 set_toc 的规则计算大纲树的链接关系。
+    levels 为各条目的层级；返回列表，第 0 项是大纲根节点，第 i 项是第 i 个条目，
+    每项为 {'Parent', 'Prev', 'Next', 'First', 'Last' 对应的节点序号（没有时不出现）, 'Count': 子条目数}，
+    第二层及以下条目的子条目默认折叠，Count 为负数。
+    """
+    links = [{'Count': 0}]
+    last_at_level = {0: 0}
+    for index, level in enumerate(levels, start=1):
+        parent = last_at_level[level - 1]
+        last_at_level[level] = index
+        node = {'Parent': parent, 'Count': 0}
+        parent_links = links[parent]
+        parent_links['Count'] += -1 if level > 1 else 1
+        if 'First' in parent_links:
+            node['Prev'] = parent_links['Last']
+            links[parent_links['Last']]['Next'] = index
+        else:
+            parent_links['First'] = index
+        parent_links['Last'] = index
+        links.append(node)
+    return links
+
+
+def outline_item_xrefs(doc, root_xref):
+    """
+    按先序（与 get_toc 的顺序相同）返回大纲条目的对象编号。
+    比 doc.get_outline_xrefs 快得多，后者每个条目都要在列表中查重，条目多时耗时按平方增长。
+    大纲中有循环引用时返回 None。
+    """
+    def linked(xref, key):
+        kind, value = doc.xref_get_key(xref, key)
+        return int(value.split()[0]) if kind == 'xref' else 0
+
+    xrefs = []
+    seen = set()
+    pending = [linked(root_xref, 'First')]
+    while pending:
+        xref = pending.pop()
+        while xref:
+            if xref in seen:
+                return None
+            seen.add(xref)
+            xrefs.append(xref)
+            first, following = linked(xref, 'First'), linked(xref, 'Next')
+            if first:
+                if following:
+                    pending.append(following)
+                xref = first
+            else:
+                xref = following
+    return xrefs
+
+
+def rewrite_pdf_object(doc, xref, changes):
+    """
+    修改字典对象中的若干键，值为 None 的键会被删除，其余键保持原样。
+    changes 中的值为 PDF 语法的字符串。
+    """
+    values = {}
+    for key in doc.xref_get_keys(xref):
+        kind, value = doc.xref_get_key(xref, key)
+        values[key] = fitz.get_pdf_str(value) if kind == 'string' else value
+    values.update(changes)
+    doc.update_object(xref, "<<" + "".join(f"/{key} {value}" for key, value in values.items()
+                                           if value is not None) + ">>")
+
+
+def update_outline_in_place(doc, toc):
+    """
+    只改写与文档现有大纲不同的条目，而不是用 set_toc 重建整个大纲树。
+    toc 为传给 set_toc 的 [[层级, 标题, 页码（从 1 开始）], ...]。
+    先跳过首尾相同的条目，中间部分按顺序复用原有的大纲对象，再逐个比较标题、跳转页面和链接，
+    只写入真正变化的对象。比较时仍要读取并遍历整个原有大纲，耗时与大纲条目数成正比；
+    节省的是写入的对象数和增量保存追加的大小，这两者只与改动量有关。
+    返回写入的对象数；文档没有大纲、大纲结构无法识别或改动太多时返回 None，由调用方整体重建。
+    """
+    if not toc or toc[0][0] != 1 or any(b[0] > a[0] + 1 for a, b in zip(toc, toc[1:])):
+        return None  # 格式错误交给 set_toc 报告
+    outlines = doc.xref_get_key(doc.pdf_catalog(), "Outlines")
+    if outlines[0] != 'xref':
+        return None
+    root_xref = int(outlines[1].split()[0])
+    old_toc = doc.get_toc(simple=True)
+    old_xrefs = outline_item_xrefs(doc, root_xref)
+    if not old_toc or old_xrefs is None or len(old_toc) != len(old_xrefs):
+        return None
+
+    # 统一成 (层级, 标题, 实际跳转的页面)，页面与 set_toc 的处理方式相同，从 0 开始；没有跳转目标时为 -2
+    last_page = len(doc) - 1
+    old_entries = [(level, title, page - 1) for level, title, page in old_toc]
+    new_entries = [(level, title, min(last_page, max(0, page - 1))) for level, title, page, *_ in toc]
+    old_count, new_count = len(old_entries), len(new_entries)
+    head = 0
+    while head < min(old_count, new_count) and old_entries[head] == new_entries[head]:
+        head += 1
+    tail = 0
+    while (tail < min(old_count, new_count) - head
+           and old_entries[old_count - 1 - tail] == new_entries[new_count - 1 - tail]):
+        tail += 1
+
+    # 新条目使用的对象：首尾沿用原对象，中间部分按顺序复用，不够时再分配（先用占位符表示）
+    middle = old_xrefs[head:old_count - tail]
+    added = max(0, new_count - head - tail - len(middle))
+    placeholders = [('new', i) for i in range(added)]
+    reused = middle[:new_count - head - tail]
+    removed = middle[len(reused):]
+    new_node_xrefs = [root_xref] + old_xrefs[:head] + reused + placeholders + old_xrefs[old_count - tail:]
+    old_node_xrefs = [root_xref] + old_xrefs
+
+    def resolve(links, node_xrefs):
+        resolved = {key: node_xrefs[links[key]] for key in OUTLINE_LINK_KEYS if key in links}
+        resolved['Count'] = links['Count']
+        return resolved
+
+    old_links = outline_tree_links([entry[0] for entry in old_entries])
+    old_by_xref = {xref: (index, resolve(links, old_node_xrefs))
+                   for index, (xref, links) in enumerate(zip(old_node_xrefs, old_links))}
+    new_links = outline_tree_links([entry[0] for entry in new_entries])
+
+    changed = {}
+    for index, (xref, links) in enumerate(zip(new_node_xrefs, new_links)):
+        want = resolve(links, new_node_xrefs)
+        if xref in old_by_xref:
+            old_index, have = old_by_xref[xref]
+        else:
+            old_index, have = None, {}
+        changes = {key: want.get(key) for key in OUTLINE_LINK_KEYS + ('Count',) if want.get(key) != have.get(key)}
+        if index:
+            level, title, page = new_entries[index - 1]
+            old_entry = old_entries[old_index - 1] if old_index else None
+            if old_entry is None or old_entry[1] != title:
+                changes['Title'] = title
+            if old_entry is None or old_entry[2] != page:
+                changes['A'] = page
+                changes['Dest'] = None
+        if changes:
+            changed[xref] = changes
+
+    if len(changed) + len(removed) > OUTLINE_DIFF_MAX_RATIO * new_count:
+        return None
+
+    # 分配新对象，再把占位符换成真正的对象编号
+    real_xrefs = {placeholder: doc.get_new_xref() for placeholder in placeholders}
+    for xref, changes in changed.items():
+        values = {}
+        for key, value in changes.items():
+            if value is None or key == 'Dest':
+                values[key] = None
+            elif key in OUTLINE_LINK_KEYS:
+                values[key] = f"{real_xrefs.get(value, value)} 0 R"
+            elif key == 'Count':
+                values[key] = str(value) if value else None
+            elif key == 'Title':
+                values[key] = fitz.get_pdf_str(value)
+            else:  # 'A'，与 set_toc 相同，跳转到页面顶部向下 36 点的位置
+                top = doc.page_cropbox(value).height - 36
+                values[key] = f"<</S/GoTo/D[{doc.page_xref(value)} 0 R/XYZ 72 {top:g} 0]>>"
+        if xref in real_xrefs:
+            doc.update_object(real_xrefs[xref], "<<" + "".join(
+                f"/{key} {value}" for key, value in values.items() if value is not None) + ">>")
+        else:
+            rewrite_pdf_object(doc, xref, values)
+    for xref in removed:
+        doc.update_object(xref, "null")
+    return len(changed) + len(removed)
+
+
+# 页数少于此值时直接在当前进程中提取，省去启动进程池的开销
+PARALLEL_EXTRACT_MIN_PAGES = 8
+
+
+def split_page_chunks(page_numbers, chunks):
+    """
+    把页码列表切成若干段连续的块，每个工作进程处理一块。
+    """
+    chunks = max(1, min(chunks, len(page_numbers)))
+    size = -(-len(page_numbers) // chunks)
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+
+def extract_pages_parallel(pdf_path, page_numbers, extract_chunk, workers=None):
+    """
+    用进程池并行提取页面内容。
+    extract_chunk(pdf_path, pages) 必须是模块级函数，返回 {页码: 结果}；
+    每个工作进程只打开一次文档。返回合并后的 {页码: 结果}。
+    """
+    page_numbers = list(page_numbers)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(page_numbers) < PARALLEL_EXTRACT_MIN_PAGES:
+        return extract_chunk(pdf_path, page_numbers)
+    from concurrent.futures import ProcessPoolExecutor  # 加载 multiprocessing 较慢，需要并行时才导入
+    results = {}
+    chunks = split_page_chunks(page_numbers, workers)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        for chunk_result in executor.map(extract_chunk, [pdf_path] * len(chunks), chunks):
+            results.update(chunk_result)
+    return results
+
+
+def page_text_rows(page):
+    """
+    按基线把页面上的文字片段合并成行，返回 [(x0, y0, y1, 文本), ...]。
+    目录页的页码常常是单独右对齐的文本块，这样可以和标题合并到同一行。
+    """
+    spans = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                if span["text"].strip():
+                    x0, y0, x1, y1 = span["bbox"]
+                    spans.append((x0, y0, x1, y1, span["text"], span["size"]))
+    spans.sort(key=lambda span: ((span[1] + span[3]) / 2, span[0]))
+
+    rows = []
+    for span in spans:
+        center = (span[1] + span[3]) / 2
+        if rows:
+            row = rows[-1]
+            row_center = (row[0][1] + row[0][3]) / 2
+            if abs(center - row_center) < (row[0][3] - row[0][1]) / 2:
+                row.append(span)
+                continue
+        rows.append([span])
+
+    result = []
+    for row in rows:
+        row.sort(key=lambda span: span[0])
+        text = row[0][4]
+        for prev, span in zip(row, row[1:]):
+            # 片段之间有明显间隔时补一个空格
+            if span[0] - prev[2] > prev[5] * 0.25:
+                text += ' '
+            text += span[4]
+        result.append((row[0][0], min(span[1] for span in row), max(span[3] for span in row), text.strip()))
+    return result
+
+
+def extract_text_rows_chunk(pdf_path, page_numbers):
+    """
+    提取一组页面的文字行（页码从 0 开始），供 extract_pages_parallel 使用。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return {number: page_text_rows(doc[number]) for number in page_numbers}
+    finally:
+        doc.close()
+
+
+# 目录页中的一行：标题 + 引导符（点、省略号、空白等）+ 页码
+CONTENTS_LINE_PATTERN = re.compile(r'(?P<title>.*?\S)(?P<leader>[\s.·•…．。_\-—]+)(?P<page>\d{1,5})')
+# 以罗马数字页码结尾的行（前言等），无法作为页码使用
+ROMAN_PAGE_PATTERN = re.compile(r'.*\s[ivxlcdm]+', re.IGNORECASE)
+# 标题开头的章节编号，如 1.2.3
+SECTION_NUMBER_PATTERN = re.compile(r'(\d+(?:\.\d+)*)\.?\s')
+# 左边距相差不超过这个值（pt）的行视为同一缩进
+INDENT_TOLERANCE = 4
+
+
+def contents_rows_to_toc(page_rows):
+    """
+    从目录页的文字行中识别“标题 …… 页码”条目，
+    按缩进（整份目录没有缩进时按 1.2.3 式编号）推断层级。
+    page_rows 为 {页码: [(x0, y0, y1, 文本), ...]}。
+    返回 [[层级, 标题, 页码], ...]，与 doc.get_toc() 的格式相同。
+    """
+    entries = []  # (相对左边距, 标题, 页码)
+    for number in sorted(page_rows):
+        rows = page_rows[number]
+        page_entries = []
+        pending = None  # 没有页码的行，可能是换行的长标题
+        for x0, y0, y1, text in rows:
+            match = CONTENTS_LINE_PATTERN.fullmatch(text)
+            if not match:
+                if ROMAN_PAGE_PATTERN.fullmatch(text):
+                    pending = None
+                else:
+                    pending = (x0, y1, y1 - y0, text)
+                continue
+            title = match.group('title').rstrip('.·•…．。_-— ')
+            if not title or title.isdigit():
+                pending = None
+                continue
+            if pending and y0 - pending[1] < pending[2] * 0.8 and x0 >= pending[0] - INDENT_TOLERANCE:
+                title = f"{pending[3]} {title}"
+                x0 = pending[0]
+            pending = None
+            page_entries.append((x0, title, int(match.group('page'))))
+        if page_entries:
+            # 奇偶页左边距可能不同，以本页最小左边距为基准
+            margin = min(entry[0] for entry in page_entries)
+            entries.extend((x0 - margin, title, page) for x0, title, page in page_entries)
+
+    if not entries:
+        return []
+
+    indents = []
+    for x0 in sorted(entry[0] for entry in entries):
+        if not indents or x0 - indents[-1] > INDENT_TOLERANCE:
+            indents.append(x0)
+
+    toc = []
+    prev_level = 0
+    for x0, title, page in entries:
+        if len(indents) > 1:
+            level = sum(1 for indent in indents if indent <= x0 + INDENT_TOLERANCE)
+        else:
+            number = SECTION_NUMBER_PATTERN.match(title)
+            level = number.group(1).count('.') + 1 if number else 1
+        # 层级只能逐级加深
+        level = min(level, prev_level + 1)
+        toc.append([level, title, page])
+        prev_level = level
+    return toc
+
+
+def extract_contents_toc(pdf_path, first_page, last_page, workers=None):
+    """
+    从印刷目录页（first_page 到 last_page，从 1 开始，含两端）提取目录，
+    并行提取各页文字，返回 parse_outline 可以直接解析的目录文本。
+    页码为书上印刷的页码，需要时再设置页码偏移量。
+    """
+    page_rows = extract_pages_cached(
+        pdf_path, range(first_page - 1, last_page), 'rows', extract_text_rows_chunk, workers)
+    return toc_to_text(contents_rows_to_toc(page_rows))
+
+
+# 标题识别：标题最多的字符数、比正文至少大多少磅才算标题字号、
+# 同一字体平均每页最多几行（再多就是正文中的强调）、同一文字出现在几页以上视为页眉页脚
+HEADING_MAX_CHARS = 120
+HEADING_MIN_SIZE_DELTA = 1.0
+HEADING_MAX_LINES_PER_PAGE = 2
+HEADING_REPEAT_PAGES = 3
+HEADING_MAX_LEVELS = 3
+# 超过这么多页的文档先抽样这么多页确定正文字体，再只提取比正文显眼的行
+HEADING_SAMPLE_PAGES = 200
+
+BOLD_FONT_PATTERN = re.compile(r'bold|black|heavy|semibold|demi', re.IGNORECASE)
+
+
+def page_font_lines(page, body_font=None):
+    """
+    统计页面上各字体（字号取到 0.5 磅，是否粗体）的字符数，并挑出可能是标题的行：
+    比正文字号大或者是粗体的短行。body_font 为 [字号, 是否粗体]，没有给出时以本页字符最多的字体为正文。
+    返回 {'chars': [[字号, 是否粗体, 字符数], ...], 'lines': [[字号, 是否粗体, x0, y0, y1, 文本], ...]}。
+    """
+    chars = {}
+    lines = []
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    for block in page.get_text("dict", flags=flags)["blocks"]:
+        for line in block.get("lines", ()):
+            size = 0
+            bold = True
+            text = ''
+            for span in line["spans"]:
+                span_text = span["text"]
+                if not span_text.strip():
+                    text += span_text
+                    continue
+                span_size = round(span["size"] * 2) / 2
+                span_bold = bool(span["flags"] & 16) or bool(BOLD_FONT_PATTERN.search(span["font"]))
+                key = (span_size, span_bold)
+                chars[key] = chars.get(key, 0) + len(span_text)
+                size = max(size, span_size)
+                bold = bold and span_bold
+                text += span_text
+            text = ' '.join(text.split())
+            if size and len(text) <= HEADING_MAX_CHARS and not FOLIO_PATTERN.fullmatch(text):
+                x0, y0, x1, y1 = line["bbox"]
+                lines.append([size, bold, round(x0, 1), round(y0, 1), round(y1, 1), text])
+
+    if body_font is None and chars:
+        body_font = max(chars, key=chars.get)
+    if body_font is not None:
+        body_size, body_bold = body_font
+        lines = [line for line in lines
+                 if line[0] >= body_size + HEADING_MIN_SIZE_DELTA or line[1] and not body_bold]
+    return {'chars': [[size, bold, count] for (size, bold), count in chars.items()], 'lines': lines}
+
+
+def extract_font_lines_chunk(pdf_path, page_numbers, body_font=None):
+    """
+    统计一组页面的字体并挑出候选标题行（页码从 0 开始），供 extract_pages_parallel 使用。
+    body_font 见 page_font_lines，用 functools.partial 传入。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return {number: page_font_lines(doc[number], body_font) for number in page_numbers}
+    finally:
+        doc.close()
+
+
+def repeated_line_texts(pages):
+    """
+    返回在超过 HEADING_REPEAT_PAGES 页上出现的行文字（页眉、页脚、版权声明等）。
+    """
+    seen = {}
+    for result in pages.values():
+        for text in {line[5] for line in result['lines']}:
+            seen[text] = seen.get(text, 0) + 1
+    return {text for text, count in seen.items() if count > HEADING_REPEAT_PAGES}
+
+
+def body_font(pages):
+    """
+    返回 {页码: page_font_lines 的结果} 中字符数最多的字体 (字号, 是否粗体)，即正文字体；没有文字时返回 None。
+    """
+    chars = {}
+    for result in pages.values():
+        for size, bold, count in result['chars']:
+            chars[size, bold] = chars.get((size, bold), 0) + count
+    return max(chars, key=chars.get) if chars else None
+
+
+def classify_heading_fonts(pages, max_levels=HEADING_MAX_LEVELS):
+    """
+    根据 {页码: page_font_lines 的结果} 中的字体统计选出标题字体。
+    字符数最多的字体是正文；比正文大或者是粗体、平均每页不超过几行的字体是标题，
+    按字号从大到小（同字号时粗体在前）对应第 1、2、3 级。
+    只出现在一页上的字体（如封面标题）在还有其他标题字体时不计入。
+    返回 [(字号, 是否粗体), ...]，下标加 1 即为层级。
+    """
+    body = body_font(pages)
+    if body is None:
+        return []
+    body_size, body_bold = body
+
+    repeated = repeated_line_texts(pages)
+    line_counts = {}
+    font_pages = {}
+    for number, result in pages.items():
+        for size, bold, x0, y0, y1, text in result['lines']:
+            if text not in repeated:
+                line_counts[size, bold] = line_counts.get((size, bold), 0) + 1
+                font_pages.setdefault((size, bold), set()).add(number)
+
+    fonts = []
+    for (size, bold), count in line_counts.items():
+        if size >= body_size + HEADING_MIN_SIZE_DELTA or bold and not body_bold and size >= body_size:
+            if count <= HEADING_MAX_LINES_PER_PAGE * len(pages):
+                fonts.append((size, bold))
+    if any(len(font_pages[font]) > 1 for font in fonts):
+        fonts = [font for font in fonts if len(font_pages[font]) > 1]
+    fonts.sort(key=lambda font: (-font[0], not font[1]))
+    return fonts[:max_levels]
+
+
+def heading_toc(pages, fonts):
+    """
+    按页面顺序列出使用标题字体的行，返回 [[层级, 标题, 页码], ...]（页码从 1 开始）。
+    同一页上紧挨着的同字体行是换行的长标题，合并为一条。
+    """
+    levels = {font: level for level, font in enumerate(fonts, start=1)}
+    repeated = repeated_line_texts(pages)
+    toc = []
+    prev_level = 0
+    for number in sorted(pages):
+        previous = None  # 本页上一条标题行：(字体, y1, 行高)
+        for size, bold, x0, y0, y1, text in sorted(pages[number]['lines'], key=lambda line: (line[3], line[2])):
+            level = levels.get((size, bold))
+            if level is None or text in repeated:
+                previous = None
+                continue
+            if previous and previous[0] == (size, bold) and y0 - previous[1] < previous[2] * 0.8:
+                toc[-1][1] = f"{toc[-1][1]} {text}"
+                previous = ((size, bold), y1, y1 - y0)
+                continue
+            # 层级只能逐级加深
+            level = min(level, prev_level + 1)
+            toc.append([level, text, number + 1])
+            prev_level = level
+            previous = ((size, bold), y1, y1 - y0)
+    return toc
+
+
+def detect_headings(pdf_path, workers=None, sample_pages=HEADING_SAMPLE_PAGES, max_levels=HEADING_MAX_LEVELS):
+    """
+    为没有目录页的 PDF 按字体统计识别标题，返回 parse_outline 可以直接解析的目录文本，
+    页码为 PDF 的实际页码（偏移量为 0）；没有识别到标题时返回空字符串。
+    各页分块并行提取；页数超过 sample_pages 时先抽样确定整份文档的正文字体，
+    之后每页只传回比它显眼的行（否则每页按本页的正文字体挑选）。sample_pages 为 None 时不抽样。
+    """
+    doc = fitz.open(pdf_path)
+    page_count = len(doc)
+    doc.close()
+
+    chunk = extract_font_lines_chunk
+    kind = 'fonts'
+    if sample_pages and page_count > sample_pages:
+        step = page_count / sample_pages
+        sample = sorted({int(i * step) for i in range(sample_pages)})
+        body = body_font(extract_pages_cached(pdf_path, sample, kind, chunk, workers))
+        if body is None:
+            return ''
+        chunk = functools.partial(extract_font_lines_chunk, body_font=list(body))
+        kind = f"fonts:{body[0]}:{int(body[1])}"
+    pages = extract_pages_cached(pdf_path, range(page_count), kind, chunk, workers)
+    return toc_to_text(heading_toc(pages, classify_heading_fonts(pages, max_levels)))
+
+
+def user_cache_dir():
+    """
+    返回本应用的用户缓存目录（不保证已存在）。
+    可以用环境变量 OUTLINE_CACHE_DIR 指定。
+    """
+    if os.environ.get("OUTLINE_CACHE_DIR"):
+        return os.environ["OUTLINE_CACHE_DIR"]
+    system = platform.system()
+    if system == "Darwin":
+        return os.path.expanduser("~/Library/Caches/Outline")
+    elif system == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        return os.path.join(base, "Outline", "Cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "outline")
+
+
+def file_fingerprint(path):
+    """
+    计算文件内容的指纹（BLAKE2b），内容相同的文件指纹相同，与路径无关。
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 页面文字缓存的默认大小上限
+PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+class PageTextCache:
+    """
+    持久化的页面文字缓存（SQLite），以文件内容指纹为键。
+    每页按种类（如 'search' 纯文本、'rows' 带位置的文字行）分别保存，
+    总大小超过上限时按最近使用时间淘汰整份文档的缓存。
+    文件的路径、大小和修改时间会被记住，文件未变化时不必重新计算指纹。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or user_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, "page_text.sqlite3")
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, fingerprint TEXT);
+                CREATE TABLE IF NOT EXISTS documents (
+                    fingerprint TEXT PRIMARY KEY, bytes INTEGER NOT NULL DEFAULT 0, last_used REAL);
+                CREATE TABLE IF NOT EXISTS pages (
+                    fingerprint TEXT, kind TEXT, page INTEGER, data BLOB,
+                    PRIMARY KEY (fingerprint, kind, page));
+            """)
+
+    def connect(self):
+        # 每次操作使用独立连接，可以在任意线程和多个进程中使用
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def fingerprint(self, path):
+        """
+        返回文件的内容指纹；路径、大小和修改时间都没变时直接使用记录的指纹。
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.connect() as conn:
+            row = conn.execute("SELECT size, mtime_ns, fingerprint FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        fingerprint = file_fingerprint(path)
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                         (path, stat.st_size, stat.st_mtime_ns, fingerprint))
+        return fingerprint
+
+    def get_pages(self, fingerprint, kind, page_numbers):
+        """
+        读取已缓存的页面，返回 {页码: 数据}，缺少的页面不在结果中。
+        """
+        wanted = set(page_numbers)
+        result = {}
+        with self.connect() as conn:
+            rows = conn.execute("SELECT page, data FROM pages WHERE fingerprint = ? AND kind = ?",
+                                (fingerprint, kind))
+            for page, data in rows:
+                if page in wanted:
+                    result[page] = json.loads(zlib.decompress(data))
+            if result:
+                conn.execute("UPDATE documents SET last_used = ? WHERE fingerprint = ?",
+                             (time.time(), fingerprint))
+        return result
+
+    def put_pages(self, fingerprint, kind, pages):
+        """
+        保存 {页码: 数据}，数据须可以 JSON 序列化；之后按需淘汰旧缓存。
+        """
+        if not pages:
+            return
+        records = [(fingerprint, kind, page, zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8')))
+                   for page, data in pages.items()]
+        with self.connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", records)
+            conn.execute("INSERT OR IGNORE INTO documents (fingerprint) VALUES (?)", (fingerprint,))
+            # 覆盖已有页面时旧数据的长度已不在表中，直接按实际保存的数据重新求和
+            conn.execute("""
+                UPDATE documents SET last_used = ?,
+                    bytes = (SELECT COALESCE(SUM(LENGTH(data)), 0) FROM pages WHERE fingerprint = ?)
+                WHERE fingerprint = ?""", (time.time(), fingerprint, fingerprint))
+        self.evict()
+
+    def evict(self):
+        """
+        总大小超过上限时，从最久未使用的文档开始删除。
+        """
+        with self.connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM documents").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for fingerprint, size in conn.execute(
+                    "SELECT fingerprint, bytes FROM documents ORDER BY last_used").fetchall():
+                conn.execute("DELETE FROM pages WHERE fingerprint = ?", (fingerprint,))
+                conn.execute("DELETE FROM documents WHERE fingerprint = ?", (fingerprint,))
+                conn.execute("DELETE FROM files WHERE fingerprint = ?", (fingerprint,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+_page_cache = None
+
+
+def default_page_cache():
+    """
+    返回共享的页面文字缓存；缓存目录不可用时返回 None（不使用缓存）。
+    """
+    global _page_cache
+    if _page_cache is None:
+        try:
+            _page_cache = PageTextCache()
+        except (OSError, sqlite3.Error) as e:
+            print(f"无法使用页面文字缓存: {e}")
+            _page_cache = False
+    return _page_cache or None
+
+
+def extract_pages_cached(pdf_path, page_numbers, kind, extract_chunk, workers=None, cache=None):
+    """
+    与 extract_pages_parallel 相同，但先从页面文字缓存中读取，
+    只并行提取缓存中没有的页面，再写回缓存。
+    kind 区分同一页面的不同提取结果。
+    """
+    page_numbers = list(page_numbers)
+    cache = cache or default_page_cache()
+    if cache is None:
+        return extract_pages_parallel(pdf_path, page_numbers, extract_chunk, workers)
+    try:
+        fingerprint = cache.fingerprint(pdf_path)
+        pages = cache.get_pages(fingerprint, kind, page_numbers)
+    except sqlite3.Error as e:
+        print(f"读取页面文字缓存失败: {e}")
+        return extract_pages_parallel(pdf_path, page_numbers, extract_chunk, workers)
+
+    missing = [number for number in page_numbers if number not in pages]
+    if missing:
+        extracted = extract_pages_parallel(pdf_path, missing, extract_chunk, workers)
+        pages.update(extracted)
+        try:
+            cache.put_pages(fingerprint, kind, extracted)
+        except sqlite3.Error as e:
+            print(f"写入页面文字缓存失败: {e}")
+    return pages
+
+
+def normalize_search_text(text):
+    """
+    规范化文字以便匹配：去掉所有空白（包括换行），统一为小写。
+    """
+    return ''.join(text.split()).lower()
+
+
+def extract_search_text_chunk(pdf_path, page_numbers):
+    """
+    提取一组页面规范化后的纯文本（页码从 0 开始），供 extract_pages_parallel 使用。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return {number: normalize_search_text(doc[number].get_text()) for number in page_numbers}
+    finally:
+        doc.close()
+
+
+class PageTextIndex:
+    """
+    PDF 各页文字的索引，第一次查询时才并行提取，之后重复使用。
+    """
+
+    def __init__(self, pdf_path, workers=None):
+        self.pdf_path = pdf_path
+        self.workers = workers
+        self._texts = None
+
+    def texts(self):
+        """
+        返回按物理页顺序排列的规范化页面文本列表。
+        """
+        if self._texts is None:
+            doc = fitz.open(self.pdf_path)
+            page_count = len(doc)
+            doc.close()
+            pages = extract_pages_cached(
+                self.pdf_path, range(page_count), 'search', extract_search_text_chunk, self.workers)
+            self._texts = [pages[number] for number in range(page_count)]
+        return self._texts
+
+    def find(self, text):
+        """
+        返回包含 text 的所有页码（从 0 开始）。
+        """
+        needle = normalize_search_text(text)
+        return [number for number, page_text in enumerate(self.texts()) if needle in page_text]
+
+
+# 自动检测偏移量时最多抽查的目录条目数，以及参与匹配的标题最短长度
+OFFSET_SAMPLE_SIZE = 40
+OFFSET_MIN_TITLE_LENGTH = 4
+
+
+def detect_page_offset(index, toc_text):
+    """
+    抽查若干目录标题在哪些页面上出现，统计“实际页码 - 目录页码”，
+    票数最多的即为建议的页码偏移量。
+    返回 (偏移量, 置信度 0~1, 抽查条目数)；没有任何标题匹配时返回 None。
+    """
+    outline = [entry for entry in parse_outline(toc_text, 0, [])
+               if len(normalize_search_text(entry.title)) >= OFFSET_MIN_TITLE_LENGTH]
+    if not outline:
+        return None
+    step = max(1, len(outline) // OFFSET_SAMPLE_SIZE)
+    sample = outline[::step][:OFFSET_SAMPLE_SIZE]
+
+    votes = {}
+    for entry in sample:
+        printed_page = entry.page + 1
+        # 同一个标题出现在多页（如页眉）时，每个偏移量只计一票
+        for offset in {number + 1 - printed_page for number in index.find(entry.title)}:
+            votes[offset] = votes.get(offset, 0) + 1
+    if not votes:
+        return None
+    # 票数相同时取绝对值较小的偏移量
+    offset = max(votes, key=lambda candidate: (votes[candidate], -abs(candidate)))
+    return offset, votes[offset] / len(sample), len(sample)
+
+
+# 印刷页码表的来源
+PAGE_MAP_LABELS = "labels"  # PDF 自带的页码标签
+PAGE_MAP_FOLIOS = "folios"  # 页眉页脚中识别出的页码
+
+PAGE_MAP_SOURCE_NAMES = {
+    PAGE_MAP_LABELS: "页码标签",
+    PAGE_MAP_FOLIOS: "页眉页脚",
+}
+
+# 页眉页脚区域占页面高度的比例，只在这里查找印刷页码
+FOLIO_BAND_RATIO = 0.1
+# 页眉页脚中的页码，允许“- 12 -”“[xii]”“第12页”之类的写法
+FOLIO_PATTERN = re.compile(r'(?:第|[-–—\[(])?(\d{1,5}|[ivxlcdm]{1,12})(?:页|[-–—\]).])?', re.IGNORECASE)
+# 识别出的页码须与前后这么多页之内的某一页一致，排除页眉中的年份、章节号等
+FOLIO_NEIGHBOR_PAGES = 3
+# 两个一致的页码之间最多隔这么多页时补全中间没有页码的页（如章首页）
+FOLIO_MAX_GAP = 20
+
+ROMAN_NUMERALS = [
+    (1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'), (90, 'xc'),
+    (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i'),
+]
+
+
+def int_to_roman(number):
+    """
+    把正整数转换为小写罗马数字。
+    """
+    digits = []
+    for value, numeral in ROMAN_NUMERALS:
+        count, number = divmod(number, value)
+        digits.append(numeral * count)
+    return ''.join(digits)
+
+
+def roman_to_int(text):
+    """
+    把罗马数字（不区分大小写）转换为整数；不是规范写法时返回 None。
+    """
+    text = text.lower()
+    values = {numeral: value for value, numeral in ROMAN_NUMERALS if len(numeral) == 1}
+    total = 0
+    for i, char in enumerate(text):
+        value = values.get(char)
+        if value is None:
+            return None
+        if i + 1 < len(text) and values.get(text[i + 1], 0) > value:
+            total -= value
+        else:
+            total += value
+    return total if total > 0 and int_to_roman(total) == text else None
+
+
+def format_page_number(style, number):
+    """
+    按 PDF 页码标签的样式格式化页码：D 阿拉伯数字，r/R 罗马数字，a/A 字母，空样式没有数字部分。
+    """
+    if style == 'D':
+        return str(number)
+    if style in ('r', 'R'):
+        roman = int_to_roman(number)
+        return roman.upper() if style == 'R' else roman
+    if style in ('a', 'A'):
+        return chr(ord(style) + (number - 1) % 26) * ((number - 1) // 26 + 1)
+    return ''
+
+
+def labels_from_rules(rules, page_count):
+    """
+    根据 PDF 的页码标签规则（doc.get_page_labels() 的结果）生成每一页的标签。
+    """
+    labels = [None] * page_count
+    rules = sorted(rules, key=lambda rule: rule['startpage'])
+    for i, rule in enumerate(rules):
+        start = rule['startpage']
+        end = rules[i + 1]['startpage'] if i + 1 < len(rules) else page_count
+        style = rule.get('style', '')
+        prefix = rule.get('prefix', '')
+        first = rule.get('firstpagenum', 1)
+        for number in range(start, min(end, page_count)):
+            labels[number] = prefix + format_page_number(style, first + number - start) or None
+    return labels
+
+
+def page_folio_candidates(page):
+    """
+    返回页眉和页脚区域中可能是印刷页码的词（阿拉伯数字或罗马数字，小写）。
+    """
+    rect = page.rect
+    band = rect.height * FOLIO_BAND_RATIO
+    candidates = []
+    for clip in (fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + band),
+                 fitz.Rect(rect.x0, rect.y1 - band, rect.x1, rect.y1)):
+        for word in page.get_text("words", clip=clip):
+            match = FOLIO_PATTERN.fullmatch(word[4])
+            if match:
+                candidates.append(match.group(1).lower())
+    return candidates
+
+
+def extract_folio_chunk(pdf_path, page_numbers):
+    """
+    提取一组页面页眉页脚中的页码候选（页码从 0 开始），供 extract_pages_parallel 使用。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return {number: page_folio_candidates(doc[number]) for number in page_numbers}
+    finally:
+        doc.close()
+
+
+def folio_labels(page_candidates):
+    """
+    根据每页的页码候选推断印刷页码，返回每个物理页的标签（无法确定时为 None）。
+    候选页码与物理页码之差（连同数字样式）在相邻几页中一致时才被采用；
+    前后两个采用的页码一致且相隔不远时，中间缺少页码的页按同样的差值补全，
+    每段页码前面紧挨着的一页没有页码时也补上（章首页通常不印页码），补上的页码与上一个页码重复时除外。
+    插页不计入页码、之后的页码差值改变，所以不会被补上页码。
+    """
+    keys = []
+    for number, candidates in enumerate(page_candidates):
+        page_keys = set()
+        for text in candidates:
+            if text.isdecimal():
+                page_keys.add(('D', number - int(text)))
+            else:
+                value = roman_to_int(text)
+                if value is not None:
+                    page_keys.add(('r', number - value))
+        keys.append(page_keys)
+
+    accepted = []
+    for number, page_keys in enumerate(keys):
+        neighbors = range(max(0, number - FOLIO_NEIGHBOR_PAGES), min(len(keys), number + FOLIO_NEIGHBOR_PAGES + 1))
+        for key in sorted(page_keys):
+            if any(key in keys[other] for other in neighbors if other != number):
+                accepted.append((number, key))
+                break
+
+    labels = [None] * len(keys)
+    previous = None
+    for number, key in accepted:
+        style, offset = key
+        if previous is not None and previous[1] == key and number - previous[0] <= FOLIO_MAX_GAP:
+            start = previous[0] + 1
+        elif (number > 0 and labels[number - 1] is None and (previous is None or previous[0] < number - 1)
+              and (previous is None or labels[previous[0]] != format_page_number(style, number - 1 - offset))):
+            # 一段页码前面紧挨着的无页码页多半是章首页；补上的页码与上一个页码重复时则是插页
+            start = number - 1
+        else:
+            start = number
+        for page in range(start, number + 1):
+            if page - offset > 0:
+                labels[page] = format_page_number(style, page - offset)
+        previous = (number, key)
+    return labels
+
+
+def split_page_label(label):
+    """
+    把标签拆成 (样式, 前缀, 数字)：阿拉伯数字为 ('D', '', n)，小写罗马数字为 ('r', '', n)，
+    其他标签整体作为前缀 ('', 标签, None)，没有标签为 ('', '', None)。
+    """
+    if not label:
+        return '', '', None
+    if label.isdecimal():
+        return 'D', '', int(label)
+    value = roman_to_int(label) if label.islower() else None
+    if value is not None:
+        return 'r', '', value
+    return '', label, None
+
+
+class PageMap:
+    """
+    印刷页码到物理页码（从 0 开始）的对照表，每份文档只建立一次，之后每次查表 O(1)。
+    labels 为每个物理页的印刷页码（没有为 None），source 为来源（PAGE_MAP_LABELS 或 PAGE_MAP_FOLIOS）。
+    同一个印刷页码出现多次（如多卷合订、每卷从 1 开始）时记下所有位置。
+    """
+
+    def __init__(self, labels, source):
+        self.labels = labels
+        self.source = source
+        self._pages = {}
+        for number, label in enumerate(labels):
+            if label:
+                self._pages.setdefault(label.lower(), []).append(number)
+        self.mapped_pages = sum(len(pages) for pages in self._pages.values())
+
+    def resolve(self, label, after=0):
+        """
+        返回印刷页码 label 对应的物理页码；没有时返回 None。
+        出现多次时取 after（上一条目的物理页码）及之后的第一个，都在之前时取最后一个。
+        """
+        pages = self._pages.get(label.lower())
+        if pages is None:
+            return None
+        if pages[0] >= after or len(pages) == 1:
+            return pages[0]
+        index = bisect.bisect_left(pages, after)
+        return pages[min(index, len(pages) - 1)]
+
+    def label_rules(self):
+        """
+        把对照表转换为页码标签规则，可以传给 doc.set_page_labels() 写回 PDF。
+        连续递增的阿拉伯数字或罗马数字合并为一条规则。
+        """
+        rules = []
+        previous = None
+        for number, label in enumerate(self.labels):
+            style, prefix, value = split_page_label(label)
+            if previous is not None and (style, prefix) == previous[:2]:
+                if value is None and not prefix or value is not None and value == previous[2] + 1:
+                    previous = (style, prefix, value)
+                    continue
+            rules.append({'startpage': number, 'prefix': prefix, 'style': style, 'firstpagenum': value or 1})
+            previous = (style, prefix, value)
+        return rules
+
+
+def build_page_map(pdf_path, workers=None, cache=None):
+    """
+    为 PDF 建立印刷页码对照表：优先使用 PDF 自带的页码标签，
+    没有时并行识别页眉页脚中的页码（结果保存在页面文字缓存中）。
+    两者都没有时返回 None。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        page_count = len(doc)
+        rules = doc.get_page_labels()
+    finally:
+        doc.close()
+    if rules:
+        return PageMap(labels_from_rules(rules, page_count), PAGE_MAP_LABELS)
+    pages = extract_pages_cached(pdf_path, range(page_count), 'folio', extract_folio_chunk, workers, cache)
+    labels = folio_labels([pages[number] for number in range(page_count)])
+    if not any(labels):
+        return None
+    return PageMap(labels, PAGE_MAP_FOLIOS)
+
+
+_thumbnail_local = threading.local()
+_thumbnail_generation = 0
+
+
+def invalidate_thumbnail_documents():
+    """
+    让各线程保留的缩略图文档在下一次渲染时关闭并重新打开。
+    在原地改写 PDF 之前和加载新文件时调用：修改时间的精度不一定能区分紧接着的改写。
+    """
+    global _thumbnail_generation
+    _thumbnail_generation += 1
+
+
+def render_page_thumbnail(pdf_path, page_number, width):
+    """
+    以较低分辨率渲染一页（页码从 0 开始），宽度约为 width 像素。
+    返回 (宽, 高, 每行字节数, RGB 像素数据)，可以直接构造 QImage。
+    每个线程各自打开并保留一份文档（文件修改或调用 invalidate_thumbnail_documents 后重新打开），
+    可以在线程池中调用。
+    """
+    key = (pdf_path, os.stat(pdf_path).st_mtime_ns, _thumbnail_generation)
+    if getattr(_thumbnail_local, 'key', None) != key:
+        if getattr(_thumbnail_local, 'doc', None) is not None:
+            _thumbnail_local.doc.close()
+        _thumbnail_local.doc = _thumbnail_local.key = None
+        _thumbnail_local.doc = fitz.open(pdf_path)
+        _thumbnail_local.key = key
+    page = _thumbnail_local.doc[page_number]
+    zoom = width / page.rect.width
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return pixmap.width, pixmap.height, pixmap.stride, pixmap.samples
+
+
+def toc_to_lines(toc):
+    """
+    将 PyMuPDF 获取的目录列表逐条转换为文本行。
+    """
+    for entry in toc:
+        level, title, page = entry
+        indent = ' ' * 4 * (level - 1)  # 每级缩进 4 个空格
+        yield f"{indent}{title}  {page}"
+
+
+def toc_to_text(toc):
+    """
+    将 PyMuPDF 获取的目录列表转换为文本格式，便于显示和编辑。
+    """
+    return '\n'.join(toc_to_lines(toc))
+
+
+def generate_output_path(input_pdf):
+    """
+    根据输入文件路径生成输出文件路径。
+    """
+    dir_name, base_name = os.path.split(input_pdf)
+    name, ext = os.path.splitext(base_name)
+    new_name = f"{name}_含目录{ext}"
+    output_pdf = os.path.join(dir_name, new_name)
+    return output_pdf
+
+
+def parse_outline(text, page_offset, errors, page_map=None):
+    """
+    解析用户输入的目录文本，调整页码，并生成大纲列表。
+    text 可以是字符串、UTF-8 编码的 bytes，也可以是任意按行迭代的对象（如打开的文件）。
+    收集所有解析错误到 errors 列表。
+    将每行最后的部分作为页码；给出 page_map 时按印刷页码对照表定位（见 build_page_map）。
+    """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode('utf-8-sig')
+    if isinstance(text, str):
+        text = iter_text_lines(text)
+    return list(iter_outline(text, page_offset, errors, page_map))
+
+
+def open_pdf(pdf):
+    """
+    打开 PDF：pdf 可以是文件路径，也可以是内存中的 PDF 数据（bytes）。
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+
+def read_toc_text(pdf):
+    """
+    读取 PDF 已有的大纲，返回与 toc_to_text 相同格式的目录文本；没有大纲时返回空字符串。
+    pdf 可以是文件路径或 PDF 数据。
+    """
+    doc = open_pdf(pdf)
+    try:
+        return toc_to_text(doc.get_toc())
+    finally:
+        doc.close()
+
+
+def apply_outline(doc, outline, errors):
+    """
+    把 parse_outline 生成的大纲写入已打开的文档，替换原有的大纲。
+    页码超出范围的条目会被忽略并记录到 errors。
+    已有大纲时只改写变化的条目，改动太多或无法比较时再整体重建。
+    返回 (写入的条目列表, 更新方式 "diff"/"rebuild"/None, 写入的大纲对象数)。
+    """
+    toc = []
+    for item in outline:
+        if 0 <= item.page < len(doc):
+            toc.append([item.level, item.title, item.page + 1])  # set_toc 的页码从 1 开始
+        else:
+            errors.append(f"标题“{item.title}”的页码 {item.page + 1} 超出 PDF 页数范围，将被忽略。")
+
+    if not toc:
+        errors.append("没有有效的大纲项被添加。")
+        return toc, None, None
+    outline_objects = update_outline_in_place(doc, toc)
+    if outline_objects is not None:
+        return toc, "diff", outline_objects
+    doc.set_toc(toc)
+    return toc, "rebuild", len(toc) + 1  # 所有条目和大纲根节点
+
+
+def add_outline_to_bytes(pdf_data, outline, errors, preset=SAVE_PRESET_FAST, metrics=None, page_labels=None):
+    """
+    在内存中为 PDF 数据添加大纲，返回新的 PDF 数据，不读写任何文件。
+    总是完整重写；preset、metrics、page_labels 和 errors 的含义与 add_outline_to_pdf 相同。
+    保存失败时把原因记录到 errors 并返回 None。
+    """
+    if metrics is not None:
+        metrics.enter('open')
+        metrics.update(input_bytes=len(pdf_data))
+    doc = open_pdf(pdf_data)
+    try:
+        if metrics is not None:
+            metrics.enter('set_toc')
+        toc, outline_update, outline_objects = apply_outline(doc, outline, errors)
+        if page_labels:
+            doc.set_page_labels(page_labels)
+        if metrics is not None:
+            metrics.update(pages=len(doc), toc_entries=len(toc), save_mode=SAVE_FULL, preset=preset)
+            if outline_update is not None:
+                metrics.update(outline_update=outline_update, outline_objects_written=outline_objects)
+            metrics.enter('save')
+        try:
+            data = doc.tobytes(**SAVE_PRESETS[preset])
+        except Exception as e:
+            errors.append(f"保存新 PDF 文件时出错：{str(e)}")
+            return None
+    finally:
+        doc.close()
+    if metrics is not None:
+        metrics.update(bytes_written=len(data))
+    return data
+
+
+def add_outline_to_pdf(input_pdf, output_pdf, outline, errors, incremental=False, progress=None, doc=None,
+                       low_memory=False, metrics=None, preset=SAVE_PRESET_FAST, page_labels=None,
+                       store_shrink=None):
+    """
+    将大纲添加到 PDF 中并保存为新文件。
+    如果 PDF 已有大纲，将其替换。
+    收集所有添加大纲时的错误到 errors 列表。
+    incremental 为 True 时只追加大纲对象和目录更新（增量保存），
+    文件加密或已损坏时自动退回完整重写。
+    output_pdf 与 input_pdf 相同时直接写入原文件。
+    progress 为可选回调，进入每个阶段（open、set_toc、save、done）时以阶段名调用；
+    回调抛出 OutlineCancelled 即可取消，未完成的临时文件会被删除，输出文件保持原样。
+    doc 为已经打开的输入文档，传入时不再重新打开；处理结束后总会被关闭。
+    low_memory 为 True 时以内存映射方式打开输入文件，并在各阶段之间清空 MuPDF 的对象缓存。
+    输出先写入同目录的临时文件，刷盘后再原子地替换。
+    metrics 为可选的 JobMetrics，用来记录各阶段的耗时、页数、条目数和写入字节数。
+    preset 为完整重写时使用的保存预设（见 SAVE_PRESETS），增量保存时忽略。
+    page_labels 为可选的页码标签规则（见 PageMap.label_rules），给出时替换 PDF 原有的页码标签。
+    store_shrink 为各阶段之间收缩 MuPDF 对象缓存的百分比（0 到 100，0 为不收缩），
+    默认 None 时低内存模式使用 STORE_SHRINK_LOW_MEMORY，否则不收缩。
+    返回实际使用的保存方式：SAVE_INCREMENTAL 或 SAVE_FULL。
+    """
+    def report(stage):
+        if metrics is not None:
+            metrics.enter(stage)
+        if progress is not None:
+            progress(stage)
+
+    if store_shrink is None:
+        store_shrink = STORE_SHRINK_LOW_MEMORY if low_memory else 0
+    in_place = os.path.abspath(output_pdf) == os.path.abspath(input_pdf)
+    # 先写到临时文件，全部完成后再替换输出文件，避免留下写了一半的 PDF
+    temp_pdf = new_temp_output(output_pdf)
+    mapped = None
+
+    try:
+        report('open')
+        if metrics is not None:
+            metrics.update(input_bytes=os.path.getsize(input_pdf))
+        if doc is None:
+            if low_memory and not incremental:
+                # 增量保存必须按文件名打开，只有完整重写才能使用内存映射
+                mapped = MappedFile(input_pdf)
+                doc = fitz.open(stream=mapped.view, filetype="pdf")
+            else:
+                doc = fitz.open(input_pdf)
+        save_mode = SAVE_FULL
+        if incremental:
+            reason = incremental_save_blocker(doc)
+            if reason:
+                errors.append(f"无法增量保存（{reason}），已改为完整重写。")
+            else:
+                save_mode = SAVE_INCREMENTAL
+
+        if save_mode == SAVE_INCREMENTAL and not in_place:
+            # 增量保存只能写回打开的文件，先复制一份再在副本上追加
+            doc.close()
+            shutil.copyfile(input_pdf, temp_pdf)
+            doc = fitz.open(temp_pdf)
+
+        report('set_toc')
+        toc, outline_update, outline_objects = apply_outline(doc, outline, errors)
+        if page_labels:
+            doc.set_page_labels(page_labels)
+        if metrics is not None:
+            metrics.update(pages=len(doc), toc_entries=len(toc), save_mode=save_mode,
+                           preset=preset if save_mode == SAVE_FULL else None)
+            if outline_update is not None:
+                metrics.update(outline_update=outline_update, outline_objects_written=outline_objects)
+        if store_shrink:
+            fitz.TOOLS.store_shrink(store_shrink)
+
+        report('save')
+        saved = False
+        try:
+            if save_mode == SAVE_INCREMENTAL:
+                # 直接写入原文件时无法撤销，这一步开始后不再响应取消
+                doc.save(doc.name, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            else:
+                doc.save(temp_pdf, **SAVE_PRESETS[preset])
+            saved = True
+        except Exception as e:
+            errors.append(f"保存新 PDF 文件时出错：{str(e)}")
+        doc.close()
+
+        if mapped is not None:
+            mapped.close()
+            mapped = None
+        if store_shrink:
+            fitz.TOOLS.store_shrink(store_shrink)
+
+        if saved and not (save_mode == SAVE_INCREMENTAL and in_place):
+            report('done')
+            replace_file_durably(temp_pdf, output_pdf)
+        if saved and metrics is not None:
+            written = os.path.getsize(output_pdf)
+            if save_mode == SAVE_INCREMENTAL and in_place:
+                written -= metrics.record['input_bytes']  # 只统计追加的部分
+            metrics.update(bytes_written=written)
+    finally:
+        if doc is not None and not doc.is_closed:
+            doc.close()
+        if mapped is not None:
+            mapped.close()
+        if os.path.exists(temp_pdf):
+            os.remove(temp_pdf)
+    return save_mode
+
+
+TOC_SIDECAR_SUFFIX = ".toc.txt"  # 批量模式下与 PDF 同名的目录文本文件后缀
+
+
+def load_batch_jobs(source, default_offset=0):
+    """
+    从目录或清单文件生成批量任务列表。
+    目录：处理其中每个带有同名 .toc.txt 目录文件的 PDF。
+    清单：CSV 文件，每行为 “PDF 路径,目录文本路径[,页码偏移量]”，
+    相对路径以清单所在目录为准，# 开头的行会被忽略。
+    返回 (jobs, skipped)，skipped 为找不到目录文件的 PDF。
+    """
+    jobs = []
+    skipped = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith('.pdf'):
+                continue
+            pdf_path = os.path.join(source, name)
+            toc_path = os.path.splitext(pdf_path)[0] + TOC_SIDECAR_SUFFIX
+            if os.path.isfile(toc_path):
+                jobs.append({'pdf': pdf_path, 'toc': toc_path, 'offset': default_offset})
+            else:
+                skipped.append(pdf_path)
+        return jobs, skipped
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"清单行缺少目录文件：{','.join(row)}")
+            offset = int(row[2]) if len(row) > 2 and row[2] else default_offset
+            jobs.append({
+                'pdf': os.path.join(base_dir, row[0]),
+                'toc': os.path.join(base_dir, row[1]),
+                'offset': offset,
+            })
+    return jobs, skipped
+
+
+def run_batch_job(job):
+    """
+    处理单个批量任务：读取目录文本，解析并写入 PDF。
+    目录文本来自 job['toc'] 文件，或直接由 job['toc_text'] 给出（界面中的文件队列）；
+    job['detect_headings'] 为 True 时按字体识别正文中的标题生成目录。
+    在工作进程中运行，不创建任何窗口，所有异常都记录到结果中。
+    """
+    metrics = JobMetrics(source="batch", pdf=job['pdf'], output=job['output'])
+    result = {'pdf': job['pdf'], 'output': job['output'], 'errors': []}
+    errors = result['errors']
+    try:
+        page_map = page_labels = None
+        if job.get('page_map') and not job.get('detect_headings'):
+            # 识别出的标题页码是实际页码，不查印刷页码表；批量模式已经按文件并行，这里不再另开进程
+            metrics.enter('page_map')
+            page_map = build_page_map(job['pdf'], workers=1)
+            if page_map is None:
+                errors.append("没有找到页码标签或页眉页脚中的页码，已按偏移量计算页码。")
+            else:
+                result['page_map'] = page_map.source
+                if job.get('write_labels') and page_map.source == PAGE_MAP_FOLIOS:
+                    page_labels = page_map.label_rules()
+        metrics.enter('parse')
+        if job.get('detect_headings'):
+            # 批量模式已经按文件并行，这里不再另开进程
+            toc_text = detect_headings(job['pdf'], workers=1)
+        elif 'toc_text' in job:
+            toc_text = job['toc_text'].strip()
+        else:
+            with open(job['toc'], encoding='utf-8-sig') as f:
+                toc_text = f.read().strip()
+        outline = parse_outline(toc_text, job['offset'], errors, page_map)
+        result['entries'] = len(outline)
+        metrics.update(entries=len(outline))
+        if outline:
+            result['save_mode'] = add_outline_to_pdf(
+                job['pdf'], job['output'], outline, errors, job.get('incremental', False),
+                low_memory=job.get('low_memory', False), metrics=metrics,
+                preset=job.get('preset', SAVE_PRESET_FAST), page_labels=page_labels,
+                store_shrink=job.get('store_shrink'))
+            result['status'] = 'partial' if errors else 'ok'
+        else:
+            errors.append("没有识别到标题。" if job.get('detect_headings') else "无法解析目录内容，请检查格式。")
+            result['status'] = 'failed'
+    except Exception as e:
+        errors.append(f"处理 PDF 时发生错误：{str(e)}")
+        result['status'] = 'failed'
+    record = metrics.finish(result['status'])
+    result['seconds'] = record['wall']
+    result['peak_rss_mb'] = record['peak_rss_mb']
+    result['stages'] = record['stages']
+    for key in ('preset', 'input_bytes', 'bytes_written'):
+        if record.get(key) is not None:
+            result[key] = record[key]
+    return result
+
+
+def failed_job_result(job, message):
+    """
+    任务没能在工作进程中完成（进程异常退出等）时使用的结果，字段与 run_batch_job 的结果一致。
+    """
+    return {'pdf': job['pdf'], 'output': job.get('output'), 'errors': [message], 'status': 'failed',
+            'seconds': 0, 'peak_rss_mb': None}
+
+
+# 工作进程异常退出（内存不足被杀死、MuPDF 崩溃等）时记录的错误
+WORKER_CRASHED_MESSAGE = "工作进程异常退出（可能是内存不足或 PDF 导致 MuPDF 崩溃）"
+
+
+def run_batch(jobs, workers=None, report_path=None, isolate_jobs=False):
+    """
+    使用进程池并行处理批量任务，逐个输出处理状态，并写入汇总报告。
+    isolate_jobs 为 True 时每个工作进程只处理一个任务，
+    这样记录的峰值内存就是该任务本身的峰值（需要 Python 3.11+）。
+    工作进程异常退出时重建进程池，重新提交还没完成的任务；
+    再次异常退出后改为逐个处理，只把导致崩溃的任务记为失败，之后恢复并行处理。
+    中途出错或被中断时，汇总报告中也会包含已经完成的任务。
+    返回汇总信息字典。
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    started = time.perf_counter()
+    results = []
+    workers = workers or os.cpu_count() or 1
+    pool_options = {}
+    if isolate_jobs and sys.version_info >= (3, 11):
+        pool_options['max_tasks_per_child'] = 1
+
+    def report(result):
+        results.append(result)
+        peak = f"{result['peak_rss_mb']:>8.1f}MB" if result['peak_rss_mb'] is not None else ""
+        size = ""
+        if 'preset' in result and 'bytes_written' in result:
+            size = f" {result['input_bytes'] / 2 ** 20:>8.1f}MB → {result['bytes_written'] / 2 ** 20:.1f}MB"
+        print(f"[{len(results)}/{len(jobs)}] {result['status']:<7} {result['seconds']:>8.2f}s {peak}{size}  {result['pdf']}")
+        for error in result['errors']:
+            print(f"    {error}")
+
+    pending = list(range(len(jobs)))  # 还没有结果的任务序号
+    crashes = 0
+    try:
+        while pending:
+            one_at_a_time = crashes >= 2
+            submitted = pending[:1] if one_at_a_time else list(pending)
+            with ProcessPoolExecutor(max_workers=1 if one_at_a_time else workers, **pool_options) as executor:
+                futures = {executor.submit(run_batch_job, jobs[index]): index for index in submitted}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        if not one_at_a_time:
+                            continue  # 不知道是哪个任务导致的，稍后重新提交
+                        result = failed_job_result(jobs[index], WORKER_CRASHED_MESSAGE)
+                        crashes = 0  # 找到了导致崩溃的任务，其余的恢复并行处理
+                    except Exception as e:
+                        result = failed_job_result(jobs[index], f"处理 PDF 时发生错误：{str(e)}")
+                    pending.remove(index)
+                    report(result)
+            if pending and set(submitted) & set(pending):
+                crashes += 1
+                print(f"⚠️  {WORKER_CRASHED_MESSAGE}，重新启动进程池处理剩余的 {len(pending)} 个文件"
+                      + ("（逐个处理）" if crashes >= 2 else ""))
+    finally:
+        elapsed = time.perf_counter() - started
+        summary = {
+            'total': len(results),
+            'ok': sum(1 for r in results if r['status'] == 'ok'),
+            'partial': sum(1 for r in results if r['status'] == 'partial'),
+            'failed': sum(1 for r in results if r['status'] == 'failed'),
+            'unfinished': len(pending),
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'files_per_second': round(len(results) / elapsed, 3) if elapsed > 0 else None,
+            'max_peak_rss_mb': max((r['peak_rss_mb'] for r in results if r['peak_rss_mb'] is not None), default=None),
+            # 只统计完整重写的文件，增量保存记录的是追加的字节数
+            'input_bytes': sum(r['input_bytes'] for r in results if 'preset' in r and 'bytes_written' in r),
+            'bytes_written': sum(r['bytes_written'] for r in results if 'preset' in r and 'bytes_written' in r),
+            'results': sorted(results, key=lambda r: r['pdf']),
+        }
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def batch_main(argv):
+    """
+    命令行批量模式入口：python "source code.py" --batch 目录或清单 [选项]
+    """
+    parser = argparse.ArgumentParser(
+        prog='source code.py --batch',
+        description="批量为 PDF 添加大纲，不打开窗口。")
+    parser.add_argument('--batch', required=True, metavar='SOURCE',
+                        help=f"PDF 所在目录（每个 PDF 配一个同名 {TOC_SIDECAR_SUFFIX} 文件）或 CSV 清单")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    parser.add_argument('--offset', type=int, default=0, help="默认页码偏移量")
+    parser.add_argument('--output-dir', help="输出目录，默认与输入文件相同")
+    parser.add_argument('--incremental', action='store_true', help="使用增量保存")
+    parser.add_argument('--preset', choices=list(SAVE_PRESETS), default=SAVE_PRESET_FAST,
+                        help="完整重写时的保存预设：fast 最快，balanced 兼顾，compact 文件最小（默认 fast）")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="低内存模式：内存映射打开输入、及时清空对象缓存，每个进程只处理一个文件")
+    parser.add_argument('--store-shrink', type=store_shrink_percent, default=None, metavar='PERCENT',
+                        help=f"各阶段之间收缩 MuPDF 对象缓存的百分比，0 为不收缩"
+                             f"（默认低内存模式为 {STORE_SHRINK_LOW_MEMORY}，否则为 0）")
+    parser.add_argument('--page-map', action='store_true',
+                        help="按印刷页码定位：使用 PDF 的页码标签，没有时识别页眉页脚中的页码，表中没有的页码再按偏移量计算")
+    parser.add_argument('--write-labels', action='store_true',
+                        help="与 --page-map 一起使用：把页眉页脚中识别出的页码写入输出文件的页码标签")
+    parser.add_argument('--detect-headings', action='store_true',
+                        help=f"没有 {TOC_SIDECAR_SUFFIX} 文件的 PDF 按字体识别正文中的标题生成目录，而不是跳过")
+    parser.add_argument('--report', default='outline_report.json', help="汇总报告路径")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs, skipped = load_batch_jobs(args.batch, args.offset)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法读取批量任务：{e}")
+        return 2
+    if args.detect_headings:
+        # 识别出的页码是实际页码，不加偏移量
+        jobs.extend({'pdf': pdf_path, 'detect_headings': True, 'offset': 0} for pdf_path in skipped)
+        skipped = []
+    for pdf_path in skipped:
+        print(f"⚠️  跳过（没有 {TOC_SIDECAR_SUFFIX} 文件）：{pdf_path}")
+    if not jobs:
+        print("❌ 没有可处理的文件")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for job in jobs:
+        output_pdf = generate_output_path(job['pdf'])
+        if args.output_dir:
+            output_pdf = os.path.join(args.output_dir, os.path.basename(output_pdf))
+        job['output'] = output_pdf
+        job['incremental'] = args.incremental
+        job['low_memory'] = args.low_memory
+        job['store_shrink'] = args.store_shrink
+        job['preset'] = args.preset
+        job['page_map'] = args.page_map
+        job['write_labels'] = args.write_labels
+
+    summary = run_batch(jobs, args.workers, args.report, isolate_jobs=args.low_memory)
+    print(f"✅ 完成 {summary['total']} 个文件：成功 {summary['ok']}，部分成功 {summary['partial']}，"
+          f"失败 {summary['failed']}，用时 {summary['seconds']:.1f}s")
+    if summary['bytes_written']:
+        print(f"📦 保存预设 {args.preset}：{summary['input_bytes'] / 2 ** 20:.1f} MB → "
+              f"{summary['bytes_written'] / 2 ** 20:.1f} MB")
+    print(f"📄 汇总报告：{args.report}")
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    if '--serve' in sys.argv[1:]:
+        from outline_service import serve_main
+        sys.exit(serve_main(sys.argv[1:]))
+    if '--watch' in sys.argv[1:]:
+        from outline_watch import watch_main
+        sys.exit(watch_main(sys.argv[1:]))
+    sys.exit(batch_main(sys.argv[1:]))
@@ -0,0 +1,457 @@
+"""
+PDF目录工具 - 本机服务模式
+以 HTTP 接口接收 PDF 和目录文本，在进程池中添加大纲。
+单独成为一个模块，界面和批量模式不必加载 http.server 等只有服务才用到的库。
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from outline_core import (
+    SAVE_PRESETS, SAVE_PRESET_FAST, STORE_SHRINK_LOW_MEMORY, WORKER_CRASHED_MESSAGE, store_shrink_percent,
+    failed_job_result, run_batch_job
+)
+
+
+# 服务模式：上传时每次读写的块大小
+SERVICE_CHUNK_SIZE = 1 << 20
+
+# 服务模式下最近多少个任务参与延迟统计
+SERVICE_LATENCY_WINDOW = 1000
+
+
+class OutlineService:
+    """
+    服务模式的任务管理：上传的任务先进入队列，由调度线程交给固定大小的进程池，
+    每个任务仍然用 run_batch_job 解析目录并写入 PDF。
+    上传中、排队和处理中的任务合计不超过 queue_size：开始接收请求体之前先占用名额，超过时拒绝新任务。
+    工作进程异常退出后重建进程池，受影响的任务记为失败。
+    记录每个任务的状态，以及吞吐量和延迟统计。
+    """
+
+    def __init__(self, job_dir, workers=None, queue_size=64, keep_seconds=3600, low_memory=False,
+                 store_shrink=None):
+        self.job_dir = job_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.keep_seconds = keep_seconds
+        self.low_memory = low_memory
+        self.store_shrink = store_shrink
+        self.queue_size = queue_size
+        self.active = 0  # 已占用名额但尚未完成的任务数（上传中、排队和处理中），受 lock 保护
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0}
+        self.latencies = deque(maxlen=SERVICE_LATENCY_WINDOW)  # (排队秒数, 处理秒数, 总秒数)
+        self.slots = threading.Semaphore(self.workers)
+        self.executor = self.new_executor()
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def new_executor(self):
+        pool_options = {}
+        if self.low_memory and sys.version_info >= (3, 11):
+            pool_options['max_tasks_per_child'] = 1
+        # 服务是多线程的，工作进程用 spawn 启动，避免 fork 时复制其他线程持有的锁
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'), **pool_options)
+
+    def replace_broken_executor(self, broken):
+        """
+        工作进程异常退出后进程池不能再用，换成新的；同一个进程池只替换一次。
+        """
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self.new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def reserve(self):
+        """
+        接收请求体之前占用一个任务名额。已达上限时返回 False，调用方应回复 503；
+        占用后上传失败要调用 release()。
+        """
+        self.purge_finished()
+        with self.lock:
+            if self.active >= self.queue_size:
+                self.counters['rejected'] += 1
+                return False
+            self.active += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+    def new_job(self, offset, incremental, preset):
+        """
+        登记一个新任务并创建它的工作目录，返回任务字典。
+        """
+        job_id = os.urandom(8).hex()
+        work_dir = os.path.join(self.job_dir, job_id)
+        os.makedirs(work_dir)
+        return {
+            'id': job_id,
+            'status': 'uploading',
+            'created': time.time(),
+            'pdf': os.path.join(work_dir, "input.pdf"),
+            'toc': os.path.join(work_dir, "toc.txt"),
+            'output': os.path.join(work_dir, "output.pdf"),
+            'offset': offset,
+            'incremental': incremental,
+            'preset': preset,
+            'low_memory': self.low_memory,
+            'store_shrink': self.store_shrink,
+        }
+
+    def submit(self, job, upload_bytes):
+        """
+        上传完成后放入队列，使用 reserve() 占用的名额。
+        """
+        with self.lock:
+            job['status'] = 'queued'
+            job['queued'] = time.time()
+            self.queue.put_nowait(job)
+            self.jobs[job['id']] = job
+            self.counters['submitted'] += 1
+            self.counters['bytes_in'] += upload_bytes
+
+    def dispatch(self):
+        """
+        调度线程：有空闲的工作进程时才从队列中取出任务，队列之外不积压任务。
+        """
+        while True:
+            job = self.queue.get()
+            self.slots.acquire()
+            with self.lock:
+                job['status'] = 'running'
+                job['started'] = time.time()
+            task = {key: job[key] for key in ('pdf', 'toc', 'output', 'offset', 'incremental', 'preset',
+                                              'low_memory', 'store_shrink')}
+            executor = self.executor
+            try:
+                future = executor.submit(run_batch_job, task)
+            except BrokenProcessPool:
+                self.replace_broken_executor(executor)
+                self.finish_job(job, failed_job_result(task, WORKER_CRASHED_MESSAGE))
+                continue
+            except Exception as e:
+                self.finish_job(job, failed_job_result(task, f"无法提交任务：{str(e)}"))
+                continue
+            future.add_done_callback(lambda future, job=job, executor=executor: self.on_job_done(job, executor, future))
+
+    def on_job_done(self, job, executor, future):
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            self.replace_broken_executor(executor)
+            result = failed_job_result(job, WORKER_CRASHED_MESSAGE)
+        except Exception as e:
+            result = failed_job_result(job, f"处理 PDF 时发生错误：{str(e)}")
+        self.finish_job(job, result)
+
+    def finish_job(self, job, result):
+        """
+        记录任务结果，归还工作进程和任务名额。
+        """
+        self.slots.release()
+        finished = time.time()
+        with self.lock:
+            self.active -= 1
+            job.update({key: value for key, value in result.items() if key not in ('pdf', 'output')})
+            job['finished'] = finished
+            self.counters['completed' if result['status'] != 'failed' else 'failed'] += 1
+            self.latencies.append((job['started'] - job['queued'], finished - job['started'],
+                                   finished - job['queued']))
+
+    def public_status(self, job):
+        """
+        返回可以发给客户端的任务状态。
+        """
+        status = {key: job[key] for key in ('id', 'status', 'offset', 'incremental', 'preset') if key in job}
+        for key in ('entries', 'errors', 'save_mode', 'peak_rss_mb', 'bytes_written'):
+            if key in job:
+                status[key] = job[key]
+        if 'started' in job:
+            status['queue_seconds'] = round(job['started'] - job['queued'], 3)
+        if 'finished' in job:
+            status['processing_seconds'] = round(job['finished'] - job['started'], 3)
+        return status
+
+    def stats(self):
+        """
+        返回计数器、队列长度以及最近任务的吞吐量和延迟统计。
+        """
+        def percentile(values, fraction):
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(len(values) * fraction))], 3) if values else None
+
+        with self.lock:
+            latencies = list(self.latencies)
+            running = sum(1 for job in self.jobs.values() if job['status'] == 'running')
+            queued = sum(1 for job in self.jobs.values() if job['status'] == 'queued')
+            counters = dict(self.counters)
+        uptime = time.time() - self.started
+        finished = counters['completed'] + counters['failed']
+        return {
+            **counters,
+            'workers': self.workers,
+            'queued': queued,
+            'running': running,
+            'uptime_seconds': round(uptime, 1),
+            'jobs_per_second': round(finished / uptime, 3) if uptime > 0 else None,
+            'latency_seconds': {
+                'queue_p50': percentile([item[0] for item in latencies], 0.5),
+                'processing_p50': percentile([item[1] for item in latencies], 0.5),
+                'total_p50': percentile([item[2] for item in latencies], 0.5),
+                'total_p95': percentile([item[2] for item in latencies], 0.95),
+                'total_max': percentile([item[2] for item in latencies], 1.0),
+            },
+        }
+
+    def purge_finished(self):
+        """
+        删除完成超过 keep_seconds 的任务及其文件。
+        """
+        deadline = time.time() - self.keep_seconds
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.get('finished', deadline + 1) < deadline]
+            for job_id in expired:
+                del self.jobs[job_id]
+        for job_id in expired:
+            self.remove_files(job_id)
+
+    def remove_files(self, job_id):
+        shutil.rmtree(os.path.join(self.job_dir, job_id), ignore_errors=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class OutlineRequestHandler(BaseHTTPRequestHandler):
+    """
+    服务模式的 HTTP 接口：
+    POST /jobs?offset=N&incremental=1&preset=fast  请求体为 UTF-8 目录文本紧接 PDF 内容，
+        目录文本的字节数放在 X-Toc-Length 头中；返回 202 和任务状态
+    GET /jobs/<id>  任务状态
+    GET /jobs/<id>/result  下载添加了大纲的 PDF
+    DELETE /jobs/<id>  删除已完成的任务
+    GET /stats  计数器和延迟统计
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "OutlineService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def send_json(self, code, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, code, message):
+        self.send_json(code, {'error': message})
+
+    def route(self):
+        """
+        返回 (任务, 子路径)；路径不是 /jobs/<id>[/子路径] 时任务为 None。
+        """
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            with self.service.lock:
+                job = self.service.jobs.get(parts[1])
+            return job, parts[2] if len(parts) == 3 else ''
+        return None, None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path == '/stats':
+            self.send_json(200, self.service.stats())
+            return
+        job, sub_path = self.route()
+        if job is None:
+            self.send_error_json(404, "任务不存在")
+        elif sub_path == '':
+            self.send_json(200, self.service.public_status(job))
+        elif sub_path == 'result':
+            self.send_result(job)
+        else:
+            self.send_error_json(404, "路径不存在")
+
+    def send_result(self, job):
+        """
+        分块发送输出的 PDF，不把整个文件读进内存。
+        """
+        if job['status'] not in ('ok', 'partial'):
+            self.send_json(409, {'error': "任务尚未成功完成", **self.service.public_status(job)})
+            return
+        size = os.path.getsize(job['output'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        with open(job['output'], 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, SERVICE_CHUNK_SIZE)
+        with self.service.lock:
+            self.service.counters['bytes_out'] += size
+
+    def do_DELETE(self):
+        job, sub_path = self.route()
+        if job is None or sub_path:
+            self.send_error_json(404, "任务不存在")
+            return
+        if 'finished' not in job:
+            self.send_error_json(409, "任务尚未完成")
+            return
+        with self.service.lock:
+            self.service.jobs.pop(job['id'], None)
+        self.service.remove_files(job['id'])
+        self.send_json(200, {'id': job['id'], 'deleted': True})
+
+    def do_POST(self):
+        if urlsplit(self.path).path.rstrip('/') != '/jobs':
+            self.send_error_json(404, "路径不存在")
+            return
+        if self.headers.get('Transfer-Encoding'):
+            # 分块上传时无法事先检查大小，也无法定位目录文本和 PDF 的分界
+            self.close_connection = True
+            self.send_error_json(411, "不支持 Transfer-Encoding（如 chunked）上传，请给出 Content-Length 后直接发送请求体")
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+            toc_length = int(self.headers['X-Toc-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self.send_error_json(411, "需要 Content-Length 和 X-Toc-Length 请求头")
+            return
+        if not 0 < toc_length < length:
+            self.close_connection = True
+            self.send_error_json(400, "X-Toc-Length 必须大于 0 且小于请求体长度")
+            return
+        if length > self.server.max_upload_bytes:
+            self.close_connection = True
+            self.send_error_json(413, "上传的文件太大")
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+        except ValueError:
+            self.close_connection = True
+            self.send_error_json(400, "offset 必须是整数")
+            return
+        preset = query.get('preset', [SAVE_PRESET_FAST])[0]
+        if preset not in SAVE_PRESETS:
+            self.close_connection = True
+            self.send_error_json(400, f"未知的保存预设：{preset}")
+            return
+        incremental = query.get('incremental', ['0'])[0] in ('1', 'true', 'yes')
+
+        # 先占用名额再接收请求体，队列已满时不必把上传的文件写到磁盘
+        if not self.service.reserve():
+            self.close_connection = True
+            self.send_error_json(503, "任务队列已满，请稍后重试")
+            return
+        job = None
+        submitted = False
+        try:
+            job = self.service.new_job(offset, incremental, preset)
+            self.receive_upload(job, length, toc_length)
+            self.service.submit(job, length)
+            submitted = True
+        except (OSError, ValueError) as e:
+            self.close_connection = True
+            self.send_error_json(400, f"上传失败：{e}")
+            return
+        finally:
+            if not submitted:
+                # 上传失败或连接中断：删除写了一半的文件并归还名额
+                if job is not None:
+                    self.service.remove_files(job['id'])
+                self.service.release()
+        self.send_json(202, self.service.public_status(job), {'Location': f"/jobs/{job['id']}"})
+
+    def receive_upload(self, job, length, toc_length):
+        """
+        读取目录文本，再把其余的 PDF 内容分块写入任务目录。
+        """
+        toc_bytes = self.rfile.read(toc_length)
+        if len(toc_bytes) != toc_length:
+            raise ValueError("请求体不完整")
+        with open(job['toc'], 'w', encoding='utf-8') as f:
+            f.write(toc_bytes.decode('utf-8-sig'))
+        remaining = length - toc_length
+        with open(job['pdf'], 'wb') as f:
+            while remaining:
+                chunk = self.rfile.read(min(SERVICE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError("请求体不完整")
+                f.write(chunk)
+                remaining -= len(chunk)
+
+
+def serve_main(argv):
+    """
+    服务模式入口：python "source code.py" --serve [选项]
+    """
+    parser = argparse.ArgumentParser(
+        prog='source code.py --serve',
+        description="以本机 HTTP 服务的方式为 PDF 添加大纲，不打开窗口。")
+    parser.add_argument('--serve', action='store_true', required=True)
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址，默认只接受本机连接")
+    parser.add_argument('--port', type=int, default=8765, help="监听端口，默认 8765")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="最多同时接受的任务数（上传中、排队和处理中的合计），超过时返回 503")
+    parser.add_argument('--job-dir', help="保存上传文件和结果的目录，默认为临时目录")
+    parser.add_argument('--keep-minutes', type=float, default=60, help="完成的任务保留多少分钟")
+    parser.add_argument('--max-upload-mb', type=int, default=2048, help="单个请求体的大小上限（MB）")
+    parser.add_argument('--low-memory', action='store_true', help="低内存模式，每个工作进程只处理一个任务")
+    parser.add_argument('--store-shrink', type=store_shrink_percent, default=None, metavar='PERCENT',
+                        help=f"各阶段之间收缩 MuPDF 对象缓存的百分比，0 为不收缩"
+                             f"（默认低内存模式为 {STORE_SHRINK_LOW_MEMORY}，否则为 0）")
+    args = parser.parse_args(argv)
+
+    job_dir = args.job_dir or tempfile.mkdtemp(prefix="outline-service-")
+    os.makedirs(job_dir, exist_ok=True)
+    service = OutlineService(job_dir, args.workers, args.queue_size, args.keep_minutes * 60, args.low_memory,
+                             args.store_shrink)
+    server = ThreadingHTTPServer((args.host, args.port), OutlineRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload_bytes = args.max_upload_mb * 2 ** 20
+    print(f"🌐 服务已启动：http://{args.host}:{server.server_address[1]}（{service.workers} 个工作进程）")
+    print(f"📁 任务目录：{job_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 服务已停止")
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(serve_main(sys.argv[1:]))
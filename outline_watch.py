@@ -0,0 +1,325 @@
+"""
+PDF目录工具 - 监视文件夹模式
+发现新的 PDF 与同名目录文本文件对后自动添加大纲；Linux 上用 inotify 等待变化，其他系统定时扫描。
+单独成为一个模块，界面和批量模式不必加载 ctypes 等只有监视模式才用到的库。
+"""
+
+import sys
+import os
+import argparse
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from outline_core import (
+    SAVE_PRESETS, SAVE_PRESET_FAST, STORE_SHRINK_LOW_MEMORY, TOC_SIDECAR_SUFFIX, WORKER_CRASHED_MESSAGE,
+    store_shrink_percent, failed_job_result, generate_output_path, run_batch_job
+)
+
+
+# 监视模式：inotify 事件掩码（写完关闭、移入、删除）和溢出标志
+INOTIFY_WATCH_MASK = 0x00000008 | 0x00000080 | 0x00000200
+INOTIFY_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    用 Linux 的 inotify 等待文件夹中的文件变化，不需要反复扫描目录。
+    wait() 返回有变化的文件路径集合；事件队列溢出时返回 None，调用方应重新扫描整个文件夹。
+    """
+
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.folders = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), INOTIFY_WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"无法监视文件夹：{folder}")
+            self.folders[wd] = folder
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        paths = set()
+        while ready:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, position)
+                position += INOTIFY_EVENT.size
+                name = data[position:position + length].rstrip(b'\0')
+                position += length
+                if mask & INOTIFY_Q_OVERFLOW:
+                    return None
+                if wd in self.folders and name:
+                    paths.add(os.path.join(self.folders[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    没有 inotify 的系统上的兜底方式：每隔一段时间让调用方重新扫描文件夹。
+    """
+
+    def __init__(self, folders):
+        self.folders = folders
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+def sidecar_stem(path):
+    """
+    返回 PDF 或目录文本文件对应的“书名”（去掉 .pdf 或 .toc.txt 的路径），其他文件返回 None。
+    """
+    if path.lower().endswith('.pdf'):
+        return os.path.splitext(path)[0]
+    if path.endswith(TOC_SIDECAR_SUFFIX):
+        return path[:-len(TOC_SIDECAR_SUFFIX)]
+    return None
+
+
+class HotFolder:
+    """
+    监视文件夹：发现新的 PDF 与同名 .toc.txt 文件对后，交给进程池并行添加大纲。
+    两个文件的修改时间都早于 debounce 秒时才认为已经写完；
+    按 (文件大小, 修改时间) 记录处理过的文件对，同一版本只处理一次，文件再次改动时才重新处理。
+    输出文件已存在且比输入新时认为之前已经处理过，重启后不会重复处理。
+    工作进程异常退出时重建进程池，受影响的文件对放回等待列表，之后逐个单独处理，
+    单独处理时仍然崩溃的文件对才记为失败，其他文件不受影响。
+    """
+
+    def __init__(self, folders, output_dir=None, workers=None, offset=0, options=None, debounce=2.0,
+                 poll_interval=2.0, use_inotify=True):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.offset = offset
+        self.options = options or {}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.watcher = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.watcher = InotifyWatcher(self.folders)
+            except (OSError, AttributeError) as e:
+                print(f"⚠️  无法使用 inotify（{e}），改为每 {poll_interval:g} 秒扫描一次")
+        if self.watcher is None:
+            self.watcher = PollingWatcher(self.folders)
+        self.waiting = set()  # 等待写完的书名
+        self.done = {}  # 书名 -> 已处理的文件版本
+        self.running = {}  # future -> (书名, 文件版本)
+        self.running_stems = set()
+        self.suspects = set()  # 处理时遇到工作进程异常退出的 (书名, 文件版本)，需要单独重新处理
+        self.executor = None
+        self.pdf_paths = {}  # 书名 -> PDF 路径（扩展名可能是大写）
+        self.counts = {'ok': 0, 'partial': 0, 'failed': 0}
+
+    def pdf_path(self, stem):
+        path = self.pdf_paths.get(stem)
+        if path and os.path.exists(path):
+            return path
+        for ext in ('.pdf', '.PDF'):
+            if os.path.exists(stem + ext):
+                return stem + ext
+        return None
+
+    def output_path(self, pdf_path):
+        output_pdf = generate_output_path(pdf_path)
+        if self.output_dir:
+            output_pdf = os.path.join(self.output_dir, os.path.basename(output_pdf))
+        return output_pdf
+
+    def rescan(self):
+        for folder in self.folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    self.notice(entry.path)
+
+    def notice(self, path):
+        stem = sidecar_stem(path)
+        if stem is None:
+            return
+        if path.lower().endswith('.pdf'):
+            self.pdf_paths[stem] = path
+        self.waiting.add(stem)
+
+    def new_executor(self):
+        pool_options = {}
+        if self.options.get('low_memory') and sys.version_info >= (3, 11):
+            pool_options['max_tasks_per_child'] = 1
+        return ProcessPoolExecutor(max_workers=self.workers, **pool_options)
+
+    def replace_broken_executor(self, broken):
+        """
+        工作进程异常退出后进程池不能再用，换成新的；同一个进程池只替换一次。
+        """
+        if self.executor is broken:
+            print(f"⚠️  {WORKER_CRASHED_MESSAGE}，重新启动进程池", flush=True)
+            self.executor = self.new_executor()
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def check_waiting(self):
+        """
+        检查等待中的文件对，写完且没处理过的提交给进程池。
+        """
+        now = time.time()
+        for stem in list(self.waiting):
+            if any(isolated for _, _, _, isolated in self.running.values()):
+                return  # 正在单独处理可能导致崩溃的文件
+            pdf_path = self.pdf_path(stem)
+            try:
+                pdf_stat = os.stat(pdf_path) if pdf_path else None
+                toc_stat = os.stat(stem + TOC_SIDECAR_SUFFIX)
+            except OSError:
+                pdf_stat = None
+            if pdf_stat is None:
+                self.waiting.discard(stem)  # 另一个文件到达时会再次收到通知
+                continue
+            if now - max(pdf_stat.st_mtime, toc_stat.st_mtime) < self.debounce:
+                continue  # 可能还在写入
+            version = (pdf_stat.st_size, pdf_stat.st_mtime_ns, toc_stat.st_size, toc_stat.st_mtime_ns)
+            isolated = (stem, version) in self.suspects
+            if isolated and self.running:
+                continue  # 等其他文件处理完再单独处理
+            self.waiting.discard(stem)
+            if self.done.get(stem) == version or stem in self.running_stems:
+                continue
+            output_pdf = self.output_path(pdf_path)
+            if stem not in self.done:
+                try:
+                    if os.stat(output_pdf).st_mtime_ns > max(pdf_stat.st_mtime_ns, toc_stat.st_mtime_ns):
+                        self.done[stem] = version
+                        continue
+                except OSError:
+                    pass
+            job = {'pdf': pdf_path, 'toc': stem + TOC_SIDECAR_SUFFIX, 'output': output_pdf,
+                   'offset': self.offset, **self.options}
+            executor = self.executor
+            try:
+                future = executor.submit(run_batch_job, job)
+            except BrokenProcessPool:
+                self.replace_broken_executor(executor)
+                self.waiting.add(stem)  # 下一轮提交给新的进程池
+                continue
+            self.running[future] = (stem, version, executor, isolated)
+            self.running_stems.add(stem)
+
+    def collect_finished(self):
+        for future in [future for future in self.running if future.done()]:
+            stem, version, executor, isolated = self.running.pop(future)
+            self.running_stems.discard(stem)
+            self.waiting.add(stem)  # 处理期间文件可能又被改动过；进程异常退出时也由此重新提交
+            pdf = self.pdf_paths.get(stem, stem)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                self.replace_broken_executor(executor)
+                if not isolated:
+                    self.suspects.add((stem, version))
+                    continue  # 不知道是不是这个文件导致的，稍后单独重新处理
+                result = failed_job_result({'pdf': pdf}, WORKER_CRASHED_MESSAGE)
+            except Exception as e:
+                result = failed_job_result({'pdf': pdf}, str(e))
+            self.suspects.discard((stem, version))
+            self.done[stem] = version
+            self.counts[result['status']] += 1
+            print(f"{result['status']:<7} {result['seconds']:>8.2f}s  {result['pdf']}", flush=True)
+            for error in result['errors']:
+                print(f"    {error}", flush=True)
+
+    def run(self, once=False):
+        """
+        开始监视，直到按 Ctrl+C；once 为 True 时处理完现有文件就退出。
+        """
+        self.executor = self.new_executor()
+        try:
+            self.rescan()
+            try:
+                while True:
+                    self.check_waiting()
+                    self.collect_finished()
+                    if once and not self.waiting and not self.running:
+                        break
+                    # 有文件在等待写完或正在处理时缩短等待，及时提交和输出结果
+                    busy = self.waiting or self.running
+                    timeout = min(self.debounce, 0.5) if busy else self.poll_interval
+                    changed = self.watcher.wait(timeout)
+                    if changed is None:
+                        self.rescan()
+                    else:
+                        for path in changed:
+                            self.notice(path)
+            except KeyboardInterrupt:
+                print("👋 停止监视，等待正在处理的文件完成…")
+                for future in self.running:
+                    future.cancel()
+                self.collect_finished()
+            finally:
+                self.watcher.close()
+        finally:
+            self.executor.shutdown(wait=True)
+        return self.counts
+
+
+def watch_main(argv):
+    """
+    监视模式入口：python "source code.py" --watch 文件夹 [文件夹 ...] [选项]
+    """
+    parser = argparse.ArgumentParser(
+        prog='source code.py --watch',
+        description=f"监视文件夹，自动为放入的 PDF（配同名 {TOC_SIDECAR_SUFFIX} 文件）添加大纲。")
+    parser.add_argument('--watch', nargs='+', required=True, metavar='FOLDER', help="要监视的文件夹")
+    parser.add_argument('--output-dir', help="输出目录，默认与输入文件相同")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    parser.add_argument('--offset', type=int, default=0, help="页码偏移量")
+    parser.add_argument('--debounce', type=float, default=2.0, help="文件最后修改后等待多少秒才处理，默认 2")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="不能使用 inotify 时的扫描间隔（秒）")
+    parser.add_argument('--polling', action='store_true', help="不使用 inotify，定时扫描文件夹")
+    parser.add_argument('--once', action='store_true', help="处理完文件夹中现有的文件后退出")
+    parser.add_argument('--incremental', action='store_true', help="使用增量保存")
+    parser.add_argument('--preset', choices=list(SAVE_PRESETS), default=SAVE_PRESET_FAST, help="完整重写时的保存预设")
+    parser.add_argument('--low-memory', action='store_true', help="低内存模式，每个工作进程只处理一个文件")
+    parser.add_argument('--store-shrink', type=store_shrink_percent, default=None, metavar='PERCENT',
+                        help=f"各阶段之间收缩 MuPDF 对象缓存的百分比，0 为不收缩"
+                             f"（默认低内存模式为 {STORE_SHRINK_LOW_MEMORY}，否则为 0）")
+    args = parser.parse_args(argv)
+
+    for folder in args.watch:
+        if not os.path.isdir(folder):
+            print(f"❌ 文件夹不存在：{folder}")
+            return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    options = {'incremental': args.incremental, 'preset': args.preset, 'low_memory': args.low_memory,
+               'store_shrink': args.store_shrink}
+    hot_folder = HotFolder(args.watch, args.output_dir, args.workers, args.offset, options, args.debounce,
+                           args.poll_interval, use_inotify=not args.polling)
+    method = "inotify" if isinstance(hot_folder.watcher, InotifyWatcher) else "定时扫描"
+    print(f"👀 正在监视 {len(args.watch)} 个文件夹（{method}，{hot_folder.workers} 个工作进程）")
+    counts = hot_folder.run(once=args.once)
+    print(f"✅ 成功 {counts['ok']}，部分成功 {counts['partial']}，失败 {counts['failed']}")
+    return 0 if counts['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(watch_main(sys.argv[1:]))
@@ -1,15 +1,35 @@
 import sys
 import os
-import fitz  # PyMuPDF 
 import platform
 import subprocess
-import re  # 引入正则表达式模块
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import OrderedDict
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QLabel, QTextEdit, QPushButton,
-    QFileDialog, QMessageBox, QSpinBox, QHBoxLayout, QDialog, QScrollArea
+    QApplication, QWidget, QVBoxLayout, QLabel, QTextEdit, QPlainTextEdit, QPushButton,
+    QFileDialog, QMessageBox, QSpinBox, QHBoxLayout, QDialog, QScrollArea,
+    QCheckBox, QComboBox, QProgressDialog, QToolTip, QListWidget
+)
+from PyQt5.QtCore import Qt, QTimer, QThread, QEvent, pyqtSignal
+from PyQt5.QtGui import (
+    QPalette, QColor, QFont, QTextCursor, QSyntaxHighlighter, QTextCharFormat, QTextBlockUserData, QImage, QPixmap
+)
+
+from outline_core import (
+    fitz, SAVE_PRESET_FAST, SAVE_PRESET_NAMES, SAVE_MODE_NAMES, OutlineCancelled, JobMetrics,
+    PageTextIndex, TOC_SIDECAR_SUFFIX, parse_outline_line, toc_to_lines, toc_to_text,
+    generate_output_path, parse_outline, add_outline_to_pdf, extract_contents_toc, detect_page_offset,
+    build_page_map, PAGE_MAP_FOLIOS, PAGE_MAP_SOURCE_NAMES, render_page_thumbnail, invalidate_thumbnail_documents,
+    detect_headings,
+    run_batch_job, batch_main
 )
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPalette, QColor, QFont
+
+
+# 模块导入完成的时间，启动计时模式下用来区分导入和建窗口的耗时
+MODULE_LOADED_AT = time.time()
 
 
 def is_dark_mode():
@@ -47,6 +67,72 @@ def is_dark_mode():
         return False
 
 
+# 处理阶段：阶段名 -> (显示文本, 进度百分比)
+OUTLINE_STAGES = {
+    'parse': ("正在解析目录…", 10),
+    'open': ("正在打开 PDF…", 25),
+    'set_toc': ("正在写入大纲…", 45),
+    'save': ("正在保存文件…", 65),
+    'done': ("即将完成…", 100),
+}
+
+
+# macOS 全局偏好设置文件，切换深浅色时会被改写
+MACOS_GLOBAL_PREFERENCES = os.path.expanduser("~/Library/Preferences/.GlobalPreferences.plist")
+
+# 主题兜底轮询间隔（毫秒）：无变化时逐步加倍，直到上限
+THEME_POLL_MIN_INTERVAL = 2000
+THEME_POLL_MAX_INTERVAL = 120000
+
+# QEvent::ThemeChange，PyQt5 没有导出这个枚举值
+THEME_CHANGE_EVENT = 210
+
+
+def theme_settings_stamp():
+    """
+    返回系统主题设置的廉价“指纹”，只在它变化时才需要重新调用 is_dark_mode()。
+    不启动任何子进程：macOS 读取偏好设置文件的修改时间，Windows 直接读取注册表值。
+    其他系统主题固定为浅色，返回 None。
+    """
+    system = platform.system()
+    if system == "Darwin":
+        try:
+            return os.stat(MACOS_GLOBAL_PREFERENCES).st_mtime_ns
+        except OSError:
+            return None
+    elif system == "Windows":
+        # 注册表在进程内读取，本身就很廉价
+        return is_dark_mode()
+    return None
+
+
+def initial_dark_mode():
+    """
+    窗口第一次绘制前使用的主题判断。
+    macOS 上 is_dark_mode() 要启动子进程，这里先按应用调色板的亮度估计，
+    窗口显示后再由 check_theme_change() 确认；其他系统直接调用 is_dark_mode()，本身就很廉价。
+    """
+    if platform.system() == "Darwin":
+        return QApplication.palette().color(QPalette.Window).lightness() < 128
+    return is_dark_mode()
+
+
+def write_startup_report(path, window_created_at, first_paint_at):
+    """
+    启动计时模式：把模块导入完成、窗口创建完成和第一次绘制的时间（Unix 时间戳）写入 JSON 文件。
+    从启动进程到第一次绘制的总耗时由启动者计算，这样源码运行和打包后的应用都能测量。
+    """
+    report = {
+        'module_loaded': MODULE_LOADED_AT,
+        'window_created': window_created_at,
+        'first_paint': first_paint_at,
+        'frozen': getattr(sys, 'frozen', False),
+        'pymupdf_loaded': 'pymupdf' in sys.modules,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f)
+
+
 def set_global_font(app):
     """
     根据操作系统设置全局字体。
@@ -130,6 +216,7 @@ class HelpDialog(QDialog):
 <h3>📏 层级缩进</h3>
 <ul>
 <li><b>每4个空格 = 1个层级</b></li>
+<li>也可以用 Tab 缩进，每个 Tab = 1个层级</li>
 <li>无缩进 → 第1层</li>
 <li>4个空格 → 第2层</li>
 <li>8个空格 → 第3层</li>
@@ -188,6 +275,510 @@ class HelpDialog(QDialog):
         self.setLayout(layout)
 
 
+class OutlineWorker(QThread):
+    """
+    在后台线程中解析目录并写入 PDF，避免界面卡死。
+    通过信号报告处理阶段，支持取消。
+    """
+
+    stage_changed = pyqtSignal(str, int)  # 显示文本, 进度百分比
+    succeeded = pyqtSignal(str, list, object)  # 保存方式, 错误列表, JobMetrics
+    failed = pyqtSignal(str, str)  # 标题, 错误信息
+    cancelled = pyqtSignal()
+
+    def __init__(self, input_pdf, output_pdf, toc_text, page_offset, incremental, doc=None, parent=None,
+                 preset=SAVE_PRESET_FAST, page_map=None, page_labels=None):
+        super().__init__(parent)
+        self.doc = doc  # 加载时已经打开的输入文档，可为 None
+        self.preset = preset
+        self.page_map = page_map  # 印刷页码对照表，可为 None
+        self.page_labels = page_labels  # 要写入的页码标签规则，可为 None
+        self.input_pdf = input_pdf
+        self.output_pdf = output_pdf
+        self.toc_text = toc_text
+        self.page_offset = page_offset
+        self.incremental = incremental
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        请求取消，处理会在下一个阶段开始前停止。
+        """
+        self._cancel_event.set()
+
+    def report_stage(self, stage):
+        """
+        进度回调：发出阶段信号，已请求取消时中止处理。
+        """
+        if self._cancel_event.is_set():
+            raise OutlineCancelled()
+        text, percent = OUTLINE_STAGES[stage]
+        self.stage_changed.emit(text, percent)
+
+    def run(self):
+        errors = []
+        metrics = JobMetrics(source="gui", pdf=self.input_pdf, output=self.output_pdf)
+        try:
+            metrics.enter('parse')
+            self.report_stage('parse')
+            outline = parse_outline(self.toc_text, self.page_offset, errors, self.page_map)
+            metrics.update(entries=len(outline))
+            if not outline and not errors:
+                metrics.finish('failed')
+                self.failed.emit("解析错误", "无法解析目录内容，请检查格式。")
+                return
+            save_mode = add_outline_to_pdf(
+                self.input_pdf, self.output_pdf, outline, errors, self.incremental, self.report_stage, self.doc,
+                metrics=metrics, preset=self.preset, page_labels=self.page_labels)
+        except OutlineCancelled:
+            metrics.finish('cancelled')
+            self.cancelled.emit()
+        except Exception as e:
+            metrics.finish('failed')
+            self.failed.emit("错误", f"处理 PDF 时发生错误：{str(e)}")
+        else:
+            metrics.finish('partial' if errors else 'ok')
+            self.succeeded.emit(save_mode, errors, metrics)
+        finally:
+            # 在解析阶段取消或目录为空时没有交给 add_outline_to_pdf，文档要在这里关闭
+            if self.doc is not None and not self.doc.is_closed:
+                self.doc.close()
+            self.doc = None
+
+
+class QueueWorker(QThread):
+    """
+    在后台用进程池并行处理文件队列中的 PDF。
+    同时提交的文件数不超过工作进程数，这样界面显示“处理中”的正是实际在处理的文件。
+    """
+
+    job_started = pyqtSignal(int)  # 队列序号
+    job_finished = pyqtSignal(int, object)  # 队列序号, run_batch_job 的结果
+
+    def __init__(self, jobs, workers=None, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs  # [(队列序号, 任务字典), ...]
+        self.workers = workers or os.cpu_count() or 1
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        不再开始新的文件，正在处理的文件会继续处理完。
+        """
+        self._cancel_event.set()
+
+    def run(self):
+        pending = list(self.jobs)
+        running = {}
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+            while running or (pending and not self._cancel_event.is_set()):
+                while pending and len(running) < self.workers and not self._cancel_event.is_set():
+                    index, job = pending.pop(0)
+                    running[executor.submit(run_batch_job, job)] = (index, job)
+                    self.job_started.emit(index)
+                done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, job = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:  # 工作进程异常退出等
+                        result = {'pdf': job['pdf'], 'output': job['output'], 'status': 'failed', 'seconds': 0,
+                                  'errors': [f"处理 PDF 时发生错误：{str(e)}"]}
+                    self.job_finished.emit(index, result)
+
+
+# 文件队列中各状态的显示文字
+QUEUE_STATUS_TEXT = {
+    'new': "📄",
+    'pending': "⏳ 等待",
+    'running': "🔄 处理中",
+    'ok': "✅ 完成",
+    'partial': "⚠️ 部分完成",
+    'failed': "❌ 失败",
+    'skipped': "⏭️ 没有目录",
+}
+
+
+# 停止输入多久（毫秒）后汇总目录检查结果
+VALIDATION_DELAY = 300
+
+# 大纲分批填入文本框时每批的行数
+TOC_LOAD_CHUNK_LINES = 2000
+
+
+def file_state(path):
+    """
+    返回 (绝对路径, 大小, 修改时间)，用来判断打开后文件是否被改动过。
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class TocReader(QThread):
+    """
+    在后台线程中打开 PDF 并读取现有目录。
+    打开后立即报告页数，读完大纲后再报告目录行；
+    读完之后才通过 opened 信号把文档交给界面保留（之后添加大纲时直接复用，不必重新打开），
+    交出后本线程不再使用它，界面随时可以关闭。
+    """
+
+    page_counted = pyqtSignal(int, bool)  # 页数, 是否经过修复
+    opened = pyqtSignal(object, object)  # 文档, 文件状态
+    toc_read = pyqtSignal(list)  # 目录文本行
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+
+    def run(self):
+        try:
+            state = file_state(self.file_path)
+            doc = fitz.open(self.file_path)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        try:
+            self.page_counted.emit(len(doc), doc.is_repaired)
+            lines = list(toc_to_lines(doc.get_toc()))
+        except Exception as e:
+            doc.close()
+            self.failed.emit(str(e))
+            return
+        self.opened.emit(doc, state)
+        self.toc_read.emit(lines)
+
+
+class LineIssue(QTextBlockUserData):
+    """
+    附加在目录文本块上的问题说明，用于悬停提示。
+    """
+
+    def __init__(self, message):
+        super().__init__()
+        self.message = message
+
+
+class OutlineHighlighter(QSyntaxHighlighter):
+    """
+    边输入边检查目录：只重新解析被修改的行，把有问题的行标上红色波浪线。
+    缺少页码、加偏移后页码小于 0 或超出 PDF 页数、层级跳级都会被标出。
+    每个文本块的状态记录到该行为止最后一个有效条目的物理页码和层级，以及该行是否有错（最低位），
+    某行状态变化时 Qt 会自动继续检查下一行，所以层级跳级和按上一条目区分的重复印刷页码也能增量更新。
+    """
+
+    LEVEL_LIMIT = 256  # 块状态中层级占用的取值范围
+
+    @classmethod
+    def pack_state(cls, after, level, error):
+        return (after * cls.LEVEL_LIMIT + min(level, cls.LEVEL_LIMIT - 1)) << 1 | (1 if error else 0)
+
+    @classmethod
+    def unpack_state(cls, state):
+        """
+        返回 (最后一个有效条目的物理页码, 层级)；还没有检查过的块为 (0, 0)。
+        """
+        if state < 0:
+            return 0, 0
+        return divmod(state >> 1, cls.LEVEL_LIMIT)
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.page_offset = 0
+        self.page_map = None  # 按印刷页码定位时的对照表
+        self.page_count = None  # 未加载 PDF 时不检查页码上限
+        self.error_format = QTextCharFormat()
+        self.error_format.setUnderlineStyle(QTextCharFormat.WaveUnderline)
+        self.error_format.setUnderlineColor(QColor("#E53935"))
+
+    def highlightBlock(self, text):
+        after, previous_level = self.unpack_state(self.previousBlockState())
+        level = previous_level
+        message = None
+        parsed = parse_outline_line(text, self.page_offset, self.page_map, after)
+        if parsed is not None:
+            line_level, title, page_number, message = parsed
+            if message is None:
+                after = page_number  # 与 iter_outline 一致，页码超出范围或跳级的行也作为下一行的参照
+                if self.page_count is not None and page_number >= self.page_count:
+                    message = f"页码 {page_number + 1} 超出 PDF 页数范围（共 {self.page_count} 页）"
+                elif line_level > previous_level + 1:
+                    message = f"层级从第 {previous_level} 层跳到第 {line_level} 层，缺少上一级标题"
+                else:
+                    level = line_level
+        self.setCurrentBlockState(self.pack_state(after, level, message))
+        if message:
+            self.setCurrentBlockUserData(LineIssue(message))
+            self.setFormat(0, len(text), self.error_format)
+        else:
+            self.setCurrentBlockUserData(None)
+
+
+class TocTextEdit(QPlainTextEdit):
+    """
+    目录编辑框：鼠标悬停在有问题的行上时显示问题说明。
+    """
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            block = self.cursorForPosition(self.viewport().mapFromGlobal(event.globalPos())).block()
+            issue = block.userData()
+            if isinstance(issue, LineIssue):
+                QToolTip.showText(event.globalPos(), f"第 {block.blockNumber() + 1} 行：{issue.message}", self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().event(event)
+
+
+class BackgroundTask(QThread):
+    """
+    在后台线程中运行一个耗时函数，完成后通过信号返回结果或错误信息。
+    """
+
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, func, *args, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(result)
+
+
+class PageRangeDialog(QDialog):
+    """
+    选择页码范围的对话框（页码从 1 开始）。
+    """
+
+    def __init__(self, page_count, title, prompt, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(prompt))
+
+        range_layout = QHBoxLayout()
+        self.first_spin_box = QSpinBox()
+        self.first_spin_box.setRange(1, page_count)
+        self.last_spin_box = QSpinBox()
+        self.last_spin_box.setRange(1, page_count)
+        self.last_spin_box.setValue(min(page_count, 10))
+        self.first_spin_box.valueChanged.connect(
+            lambda value: self.last_spin_box.setValue(max(value, self.last_spin_box.value())))
+        range_layout.addWidget(QLabel("从第"))
+        range_layout.addWidget(self.first_spin_box)
+        range_layout.addWidget(QLabel("页到第"))
+        range_layout.addWidget(self.last_spin_box)
+        range_layout.addWidget(QLabel("页"))
+        layout.addLayout(range_layout)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        cancel_button = QPushButton("取消")
+        cancel_button.clicked.connect(self.reject)
+        ok_button = QPushButton("确定")
+        ok_button.clicked.connect(self.accept)
+        button_layout.addWidget(cancel_button)
+        button_layout.addWidget(ok_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def page_range(self):
+        first = self.first_spin_box.value()
+        return first, max(first, self.last_spin_box.value())
+
+
+# 页面预览：缩略图宽度（像素）、缓存占用内存上限、渲染线程数、预取前后各几行的目标页
+THUMBNAIL_WIDTH = 180
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PREFETCH_LINES = 3
+
+
+class PixmapCache:
+    """
+    缩略图缓存：总内存超过 max_bytes 时淘汰最久没有用到的缩略图。
+    """
+
+    def __init__(self, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._pixmaps = OrderedDict()
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def __contains__(self, key):
+        return key in self._pixmaps
+
+    def get(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        old = self._pixmaps.pop(key, None)
+        if old is not None:
+            self.total_bytes -= self.pixmap_bytes(old)
+        self._pixmaps[key] = pixmap
+        self.total_bytes += self.pixmap_bytes(pixmap)
+        while self.total_bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self.total_bytes -= self.pixmap_bytes(evicted)
+
+    def clear(self):
+        self._pixmaps.clear()
+        self.total_bytes = 0
+
+
+class PagePreview(QWidget):
+    """
+    目录编辑框旁边的页面预览，显示光标所在行目标页的缩略图。
+    缩略图在线程池中渲染（每个线程各自打开文档），同时预取前后几行的目标页；
+    不再需要、还没开始的渲染会被取消，渲染好的缩略图保存在 PixmapCache 中。
+    """
+
+    rendered = pyqtSignal(str, int, object)  # PDF 路径, 页码, 渲染结果或异常
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pdf_path = None
+        self.current_page = None
+        self.cache = PixmapCache()
+        self.pending = {}  # 页码 -> Future
+        self.executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+        # 渲染线程中发出信号，Qt 会把它排队到界面线程处理
+        self.rendered.connect(self.on_rendered)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.image_label = QLabel()
+        self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label.setFixedSize(THUMBNAIL_WIDTH + 2, int(THUMBNAIL_WIDTH * 1.5))
+        self.image_label.setStyleSheet("border: 1px solid #9E9E9E;")
+        self.image_label.setWordWrap(True)
+        self.caption_label = QLabel("")
+        self.caption_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.image_label)
+        layout.addWidget(self.caption_label)
+        layout.addStretch()
+        self.setLayout(layout)
+
+    def render_width(self):
+        return int(THUMBNAIL_WIDTH * self.devicePixelRatioF())
+
+    def set_document(self, pdf_path):
+        """
+        切换到新的 PDF：取消排队中的渲染，清空缓存，各线程保留的文档下次渲染时重新打开。
+        """
+        self.cancel_pending()
+        invalidate_thumbnail_documents()
+        self.cache.clear()
+        self.pdf_path = pdf_path
+        self.current_page = None
+        self.show_message("将光标放在目录行上预览目标页")
+
+    def show_pages(self, page, neighbors, page_count):
+        """
+        显示 page（从 0 开始；None 表示这一行没有有效页码）的缩略图，并预取 neighbors 中的页面。
+        page_count 为 None（PDF 还没打开）时不检查页码范围。
+        """
+        if self.pdf_path is None:
+            return
+        self.current_page = page
+
+        def valid(number):
+            return number is not None and (page_count is None or number < page_count)
+
+        wanted = [number for number in [page] + neighbors if valid(number)]
+        for number in list(self.pending):
+            if number not in wanted and self.pending[number].cancel():
+                del self.pending[number]
+        for number in wanted:
+            self.request(number)
+
+        if page is None:
+            self.show_message("这一行没有有效页码")
+        elif not valid(page):
+            self.show_message(f"第 {page + 1} 页超出 PDF 页数范围")
+        else:
+            pixmap = self.cache.get(page)
+            if pixmap is not None:
+                self.show_pixmap(page, pixmap)
+            else:
+                self.show_message(f"正在渲染第 {page + 1} 页…")
+
+    def request(self, number):
+        if number in self.pending or number in self.cache:
+            return
+        pdf_path = self.pdf_path
+        future = self.executor.submit(render_page_thumbnail, pdf_path, number, self.render_width())
+        self.pending[number] = future
+        future.add_done_callback(lambda done: self.emit_rendered(pdf_path, number, done))
+
+    def emit_rendered(self, pdf_path, number, future):
+        # 在渲染线程中调用
+        if future.cancelled():
+            return
+        error = future.exception()
+        self.rendered.emit(pdf_path, number, error if error is not None else future.result())
+
+    def on_rendered(self, pdf_path, number, result):
+        if pdf_path != self.pdf_path:
+            return  # 渲染期间已经换了文件
+        self.pending.pop(number, None)
+        if isinstance(result, Exception):
+            if number == self.current_page:
+                self.show_message(f"无法渲染第 {number + 1} 页：{result}")
+            return
+        width, height, stride, samples = result
+        pixmap = QPixmap.fromImage(QImage(samples, width, height, stride, QImage.Format_RGB888))
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.cache.put(number, pixmap)
+        if number == self.current_page:
+            self.show_pixmap(number, pixmap)
+
+    def show_pixmap(self, number, pixmap):
+        self.image_label.setPixmap(pixmap)
+        self.caption_label.setText(f"第 {number + 1} 页")
+
+    def show_message(self, text):
+        self.image_label.setText(text)
+        self.caption_label.setText("")
+
+    def cancel_pending(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def release_documents(self):
+        """
+        原地改写 PDF 之前调用：取消排队中的渲染，换用新的线程池，
+        旧线程结束时各自保留的文档随之关闭，不再占用文件。
+        """
+        self.cancel_pending()
+        invalidate_thumbnail_documents()
+        self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+
+    def shutdown(self):
+        """
+        关闭窗口时取消排队中的渲染，并等待正在进行的渲染结束。
+        """
+        self.cancel_pending()
+        self.executor.shutdown(wait=True)
+
+
 class PDFOutlineTool(QWidget):
     BUTTON_YELLOW = "#FF9800"  # 与“添加大纲”按钮相同的黄色
 
@@ -196,10 +787,19 @@ class PDFOutlineTool(QWidget):
         self.setWindowTitle('(*¯︶¯*)♡(^^)')
         self.resize(800, 600)
         self.setAcceptDrops(True)
+        self.worker = None  # 后台处理线程
+        self.toc_reader = None  # 后台读取目录的线程
+        self.open_document = None  # (文件状态, 加载时打开的文档)，添加大纲时复用
+        self.page_map_task = None  # 后台建立印刷页码表的线程
         self.init_ui()
-        self.current_theme = is_dark_mode()
+        self.pending_toc_lines = []  # 等待分批显示的目录行
+        self.pending_toc_position = 0
+        self.toc_load_timer = QTimer(self)
+        self.toc_load_timer.timeout.connect(self.append_toc_chunk)
+        self.current_theme = initial_dark_mode()
         self.apply_system_theme()
-        self.init_theme_checker()
+        self.first_painted = False  # 主题检测等不影响首帧的工作在第一次绘制之后再做
+        self.created_at = time.time()
 
     def init_ui(self):
         main_layout = QVBoxLayout()
@@ -244,6 +844,31 @@ class PDFOutlineTool(QWidget):
         input_layout.addWidget(browse_button, alignment=Qt.AlignCenter)
         main_layout.addLayout(input_layout)
 
+        # 文件队列：一次拖入多个 PDF 时显示，选中某个文件即可编辑它的目录和偏移量
+        self.queue_entries = []
+        self.queue_row = -1
+        self.queue_worker = None
+        self.queue_widget = QWidget()
+        queue_layout = QVBoxLayout(self.queue_widget)
+        queue_layout.setContentsMargins(0, 0, 0, 0)
+        self.queue_list = QListWidget()
+        self.queue_list.setMaximumHeight(130)
+        self.queue_list.currentRowChanged.connect(self.select_queue_item)
+        queue_buttons_layout = QHBoxLayout()
+        self.queue_status_label = QLabel("")
+        self.queue_process_button = QPushButton("▶️ 处理全部")
+        self.queue_process_button.clicked.connect(self.process_queue)
+        self.queue_clear_button = QPushButton("🗑️ 清空队列")
+        self.queue_clear_button.clicked.connect(self.clear_queue)
+        queue_buttons_layout.addWidget(self.queue_status_label)
+        queue_buttons_layout.addStretch()
+        queue_buttons_layout.addWidget(self.queue_process_button)
+        queue_buttons_layout.addWidget(self.queue_clear_button)
+        queue_layout.addWidget(self.queue_list)
+        queue_layout.addLayout(queue_buttons_layout)
+        self.queue_widget.hide()
+        main_layout.addWidget(self.queue_widget)
+
         # 页码偏移设置
         offset_layout = QHBoxLayout()
         offset_layout.setSpacing(10)
@@ -253,9 +878,44 @@ class PDFOutlineTool(QWidget):
         self.offset_spin_box.setRange(-1000, 1000)
         self.offset_spin_box.setValue(0)  # 默认值为 0
         self.offset_spin_box.setFixedWidth(80)
+        self.detect_offset_button = QPushButton("🔍 自动检测")
+        self.detect_offset_button.setToolTip("在正文中查找目录标题，推算页码偏移量")
+        self.detect_offset_button.clicked.connect(self.detect_offset)
+        self.offset_hint_label = QLabel("")
+        # 印刷页码表：罗马数字前言、插页、多卷合订时一个偏移量不够用
+        self.page_map_check_box = QCheckBox("按印刷页码")
+        self.page_map_check_box.setToolTip("根据 PDF 的页码标签（没有时识别页眉页脚中的页码）定位目录页码，\n"
+                                           "可以使用罗马数字等页码；对照表中没有的页码仍按偏移量计算")
+        self.page_map_check_box.toggled.connect(self.on_page_map_toggled)
+        self.write_labels_check_box = QCheckBox("写入页码标签")
+        self.write_labels_check_box.setToolTip("把页眉页脚中识别出的页码写入输出文件，阅读器中显示的页码与书上一致")
+        self.write_labels_check_box.setEnabled(False)
         offset_layout.addWidget(offset_label)
         offset_layout.addWidget(self.offset_spin_box)
+        offset_layout.addWidget(self.detect_offset_button)
+        offset_layout.addWidget(self.page_map_check_box)
+        offset_layout.addWidget(self.write_labels_check_box)
+        offset_layout.addWidget(self.offset_hint_label)
         offset_layout.addStretch()
+
+        # 保存方式：增量保存只追加大纲对象，适合很大的 PDF
+        self.incremental_check_box = QCheckBox("增量保存")
+        self.incremental_check_box.setToolTip("只追加大纲对象，不重写整个文件；加密或损坏的文件会自动完整重写")
+        self.in_place_check_box = QCheckBox("直接写入原文件")
+        self.in_place_check_box.setToolTip("不生成“_含目录”副本，直接修改原 PDF")
+        self.timing_check_box = QCheckBox("显示耗时")
+        self.timing_check_box.setToolTip("完成后显示各阶段的耗时和内存统计")
+        # 完整重写时的保存预设
+        self.preset_combo_box = QComboBox()
+        for preset, name in SAVE_PRESET_NAMES.items():
+            self.preset_combo_box.addItem(name, preset)
+        self.preset_combo_box.setToolTip("快速：原样写出，最快\n均衡：去掉无用对象并压缩，速度和大小兼顾\n"
+                                         "紧凑：合并重复对象、重新压缩图片和字体，文件最小但最慢\n增量保存时不起作用")
+        offset_layout.addWidget(self.incremental_check_box)
+        offset_layout.addWidget(self.in_place_check_box)
+        offset_layout.addWidget(QLabel("保存预设："))
+        offset_layout.addWidget(self.preset_combo_box)
+        offset_layout.addWidget(self.timing_check_box)
         main_layout.addLayout(offset_layout)
 
         # 目录内容部分
@@ -297,19 +957,80 @@ class PDFOutlineTool(QWidget):
         """)
         help_button.clicked.connect(self.show_help)
         
+        self.extract_button = QPushButton("📑 提取目录页")
+        self.extract_button.setStyleSheet("""
+            QPushButton {
+                background-color: #9C27B0;
+                color: white;
+                border: none;
+                padding: 5px 15px;
+                font-size: 12px;
+                border-radius: 3px;
+            }
+            QPushButton:hover {
+                background-color: #7B1FA2;
+            }
+        """)
+        self.extract_button.clicked.connect(self.extract_contents_pages)
+
+        # 没有印刷目录页时按字体识别标题
+        self.headings_button = QPushButton("🧭 识别标题")
+        self.headings_button.setToolTip("统计全文的字号和粗细，把比正文显眼的标题行列成目录（页码为实际页码）")
+        self.headings_button.setStyleSheet("""
+            QPushButton {
+                background-color: #00897B;
+                color: white;
+                border: none;
+                padding: 5px 15px;
+                font-size: 12px;
+                border-radius: 3px;
+            }
+            QPushButton:hover {
+                background-color: #00695C;
+            }
+        """)
+        self.headings_button.clicked.connect(self.detect_document_headings)
+
+        self.preview_check_box = QCheckBox("页面预览")
+        self.preview_check_box.setToolTip("在目录旁显示光标所在行的目标页（已计入页码偏移）")
+        self.preview_check_box.setChecked(True)
+        self.preview_check_box.toggled.connect(self.on_preview_toggled)
+
         toc_header_layout.addWidget(toc_label)
         toc_header_layout.addStretch()
+        toc_header_layout.addWidget(self.preview_check_box)
+        toc_header_layout.addWidget(self.headings_button)
+        toc_header_layout.addWidget(self.extract_button)
         toc_header_layout.addWidget(help_button)
         toc_header_layout.addWidget(template_button)
         
-        self.toc_text_edit = QTextEdit()
+        # 纯文本编辑器按文本块布局，只排版可见部分，几万行目录也能流畅滚动和编辑
+        self.toc_text_edit = TocTextEdit()
         self.toc_text_edit.setPlaceholderText("目录会出现在这里\n你可以改它....")
+        self.outline_highlighter = OutlineHighlighter(self.toc_text_edit.document())
+        self.toc_status_label = QLabel("")
+        self.page_preview = PagePreview()
+        self.page_preview.hide()  # 加载 PDF 后才显示
+        self.toc_text_edit.cursorPositionChanged.connect(self.update_preview)
+        editor_layout = QHBoxLayout()
+        editor_layout.addWidget(self.toc_text_edit)
+        editor_layout.addWidget(self.page_preview)
         toc_layout.addLayout(toc_header_layout)
-        toc_layout.addWidget(self.toc_text_edit)
+        toc_layout.addLayout(editor_layout)
+        toc_layout.addWidget(self.toc_status_label)
+
+        # 停止输入一段时间后再汇总检查结果；偏移量变化时需要重新检查所有行
+        self.validation_timer = QTimer(self)
+        self.validation_timer.setSingleShot(True)
+        self.validation_timer.setInterval(VALIDATION_DELAY)
+        self.validation_timer.timeout.connect(self.update_validation)
+        self.revalidate_all = False
+        self.toc_text_edit.document().contentsChanged.connect(self.validation_timer.start)
+        self.offset_spin_box.valueChanged.connect(self.schedule_full_validation)
         main_layout.addLayout(toc_layout)
 
         # 添加大纲按钮
-        process_button = QPushButton("✅ 添加大纲")
+        self.process_button = process_button = QPushButton("✅ 添加大纲")
         process_button.setFixedHeight(40)
         process_button.setStyleSheet(f"""
             QPushButton {{
@@ -372,7 +1093,7 @@ class PDFOutlineTool(QWidget):
                 font-size: 14px;
                 color: #24292E;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 font-size: 14px;
                 color: #24292E;
                 background-color: #FFFFFF;
@@ -395,7 +1116,7 @@ class PDFOutlineTool(QWidget):
             }}
         """)
         self.toc_text_edit.setStyleSheet(f"""
-            QTextEdit {{
+            QPlainTextEdit {{
                 font-size: 14px;
                 color: #24292E;
                 background-color: #FFFFFF;
@@ -438,7 +1159,7 @@ class PDFOutlineTool(QWidget):
                 font-size: 14px;
                 color: #FFFFFF;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 font-size: 14px;
                 color: #FFFFFF;
                 background-color: #3C3C3C;
@@ -461,7 +1182,7 @@ class PDFOutlineTool(QWidget):
             }}
         """)
         self.toc_text_edit.setStyleSheet(f"""
-            QTextEdit {{
+            QPlainTextEdit {{
                 font-size: 14px;
                 color: #FFFFFF;
                 background-color: #3C3C3C;
@@ -470,30 +1191,85 @@ class PDFOutlineTool(QWidget):
             }}
         """)
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_painted:
+            self.first_painted = True
+            self.first_paint_at = time.time()
+            QTimer.singleShot(0, self.on_first_paint)
+
+    def on_first_paint(self):
+        """
+        窗口已经显示：启动计时模式下写入报告后退出，否则开始主题检测并确认主题。
+        """
+        report_path = os.environ.get("OUTLINE_STARTUP_REPORT")
+        if report_path:
+            write_startup_report(report_path, self.created_at, self.first_paint_at)
+            QApplication.instance().quit()
+            return
+        self.init_theme_checker()
+        self.check_theme_change()
+        # 窗口显示后就在界面线程中加载 PyMuPDF，避免之后几个后台线程同时触发延迟导入
+        QTimer.singleShot(0, lambda: fitz.TOOLS)
+
     def init_theme_checker(self):
         """
-        初始化定时器，定期检查系统主题是否变化。
+        初始化主题检测。
+        主要依靠 Qt 的主题/调色板变化事件和窗口激活事件；
+        另有一个兜底定时器，只比较廉价的设置指纹，无变化时间隔按指数退避。
+        """
+        self.theme_stamp = theme_settings_stamp()
+        self.theme_poll_interval = THEME_POLL_MIN_INTERVAL
+        self.theme_timer = QTimer(self)
+        self.theme_timer.setSingleShot(True)
+        self.theme_timer.timeout.connect(self.poll_theme_change)
+        if platform.system() in ("Darwin", "Windows"):
+            self.theme_timer.start(self.theme_poll_interval)
+
+    def event(self, event):
+        """
+        系统主题或应用调色板变化时立即检查主题；
+        窗口重新激活很频繁，只在设置指纹变化时才检查，避免每次切回窗口都启动子进程。
         """
-        self.theme_timer = QTimer()
-        self.theme_timer.timeout.connect(self.check_theme_change)
-        self.theme_timer.start(1000)  # 每秒检查一次
+        if hasattr(self, 'theme_timer'):
+            if event.type() in (THEME_CHANGE_EVENT, QEvent.ApplicationPaletteChange):
+                self.check_theme_change()
+            elif event.type() == QEvent.WindowActivate and theme_settings_stamp() != self.theme_stamp:
+                self.check_theme_change()
+        return super().event(event)
+
+    def poll_theme_change(self):
+        """
+        兜底轮询：设置指纹没变就延长下次检查的间隔。
+        """
+        stamp = theme_settings_stamp()
+        if stamp != self.theme_stamp:
+            self.check_theme_change()
+        else:
+            self.theme_poll_interval = min(self.theme_poll_interval * 2, THEME_POLL_MAX_INTERVAL)
+            self.theme_timer.start(self.theme_poll_interval)
 
     def check_theme_change(self):
         """
         检查系统主题是否变化，如果变化则应用相应的样式。
+        检查后重置兜底轮询的间隔。
         """
+        self.theme_stamp = theme_settings_stamp()
         current = is_dark_mode()
         if current != self.current_theme:
             self.current_theme = current
             self.apply_system_theme()
+        if platform.system() in ("Darwin", "Windows"):
+            self.theme_poll_interval = THEME_POLL_MIN_INTERVAL
+            self.theme_timer.start(self.theme_poll_interval)
 
     def dragEnterEvent(self, event):
         """
         处理拖入事件，接受拖入的 PDF 文件。
         """
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            if urls and urls[0].toLocalFile().lower().endswith('.pdf'):
+            pdf_paths = self.dropped_pdf_paths(event)
+            if pdf_paths:
                 event.acceptProposedAction()
                 if self.current_theme:
                     # 深色模式拖放样式
@@ -517,7 +1293,10 @@ class PDFOutlineTool(QWidget):
                             font-size: 16px;
                         }}
                     """)
-                self.input_label.setText("释放鼠标以导入 PDF 文件")
+                if len(pdf_paths) > 1:
+                    self.input_label.setText(f"释放鼠标以导入 {len(pdf_paths)} 个 PDF 文件")
+                else:
+                    self.input_label.setText("释放鼠标以导入 PDF 文件")
             else:
                 event.ignore()
         else:
@@ -532,16 +1311,193 @@ class PDFOutlineTool(QWidget):
     def dropEvent(self, event):
         """
         处理文件拖放事件，自动识别并加载 PDF 文件。
+        一次拖入多个文件（或队列中已有文件）时加入文件队列。
         """
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            if urls:
-                file_path = urls[0].toLocalFile()
-                if file_path.lower().endswith('.pdf'):
-                    self.load_pdf(file_path)
+            pdf_paths = self.dropped_pdf_paths(event)
+            if len(pdf_paths) == 1 and not self.queue_entries:
+                self.load_pdf(pdf_paths[0])
+            elif pdf_paths:
+                self.add_to_queue(pdf_paths)
         # 恢复样式
         self.reset_input_label_style()
 
+    @staticmethod
+    def dropped_pdf_paths(event):
+        """
+        返回拖入的所有 PDF 文件路径。
+        """
+        paths = (url.toLocalFile() for url in event.mimeData().urls())
+        return [path for path in paths if path.lower().endswith('.pdf')]
+
+    def add_to_queue(self, pdf_paths):
+        """
+        把 PDF 加入文件队列。有同名 .toc.txt 文件时直接使用其中的目录文本，
+        否则在选中该文件时读取 PDF 中现有的目录。目录文件无法读取的 PDF 不加入队列。
+        """
+        queued = {entry['pdf'] for entry in self.queue_entries}
+        skipped = []
+        for pdf_path in pdf_paths:
+            if pdf_path in queued:
+                continue
+            toc_text = None
+            sidecar = os.path.splitext(pdf_path)[0] + TOC_SIDECAR_SUFFIX
+            if os.path.isfile(sidecar):
+                try:
+                    with open(sidecar, encoding='utf-8-sig') as f:
+                        toc_text = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    skipped.append(f"{os.path.basename(sidecar)}：{e}")
+                    continue
+            self.queue_entries.append({'pdf': pdf_path, 'toc_text': toc_text,
+                                       'offset': self.offset_spin_box.value(), 'status': 'new'})
+            self.queue_list.addItem("")
+            self.update_queue_item(len(self.queue_entries) - 1)
+        if skipped:
+            QMessageBox.warning(self, "目录文件读取失败",
+                                "以下目录文件无法读取（需要 UTF-8 编码），对应的 PDF 未加入队列：\n"
+                                + "\n".join(skipped))
+        if not self.queue_entries:
+            return
+        self.queue_widget.show()
+        self.update_queue_status()
+        if self.queue_list.currentRow() < 0:
+            self.queue_list.setCurrentRow(0)
+
+    def update_queue_item(self, row):
+        entry = self.queue_entries[row]
+        text = f"{QUEUE_STATUS_TEXT[entry['status']]}  {os.path.basename(entry['pdf'])}"
+        result = entry.get('result')
+        if result is not None:
+            text += f"（{result['seconds']:.1f}s"
+            if result['errors']:
+                text += f"，{len(result['errors'])} 个问题"
+            text += "）"
+        elif entry['toc_text'] is None and entry['status'] == 'new':
+            text += "（未设置目录）"
+        self.queue_list.item(row).setText(text)
+
+    def update_queue_status(self):
+        finished = sum(1 for entry in self.queue_entries if 'result' in entry)
+        self.queue_status_label.setText(f"共 {len(self.queue_entries)} 个文件，已处理 {finished} 个")
+
+    def store_queue_entry(self):
+        """
+        把编辑框中的目录和偏移量保存到当前选中的队列项。目录还在加载时不保存。
+        """
+        if not 0 <= self.queue_row < len(self.queue_entries):
+            return
+        if self.toc_load_timer.isActive() or (self.toc_reader is not None and self.toc_reader.isRunning()):
+            return
+        entry = self.queue_entries[self.queue_row]
+        if entry['pdf'] != getattr(self, 'input_pdf_path', None):
+            return
+        toc_text = self.toc_text_edit.toPlainText()
+        entry['toc_text'] = toc_text if toc_text.strip() else None
+        entry['offset'] = self.offset_spin_box.value()
+        self.update_queue_item(self.queue_row)
+
+    def select_queue_item(self, row):
+        """
+        切换队列中选中的文件：保存上一个文件的编辑，加载这个文件的目录和偏移量。
+        """
+        self.store_queue_entry()
+        self.queue_row = row
+        if row < 0:
+            return
+        entry = self.queue_entries[row]
+        self.offset_spin_box.setValue(entry['offset'])
+        self.load_pdf(entry['pdf'], entry['toc_text'])
+
+    def clear_queue(self):
+        if self.queue_worker is not None and self.queue_worker.isRunning():
+            return
+        self.queue_row = -1
+        self.queue_entries = []
+        self.queue_list.clear()
+        self.queue_widget.hide()
+
+    def process_queue(self):
+        """
+        在后台并行处理队列中还没有成功处理的文件；处理中再次点击则取消剩余的文件。
+        """
+        if self.queue_worker is not None and self.queue_worker.isRunning():
+            self.queue_worker.cancel()
+            self.queue_process_button.setEnabled(False)
+            return
+        self.store_queue_entry()
+        self.release_open_document()
+        incremental = self.incremental_check_box.isChecked()
+        in_place = self.in_place_check_box.isChecked()
+        if in_place:
+            self.page_preview.release_documents()
+        preset = self.preset_combo_box.currentData()
+        # 每个文件在工作进程中各自建立印刷页码表，写入页码标签同样只对识别出页眉页脚页码的文件生效
+        page_map = self.page_map_check_box.isChecked()
+        write_labels = page_map and self.write_labels_check_box.isChecked()
+        jobs = []
+        for row, entry in enumerate(self.queue_entries):
+            if entry['status'] in ('ok', 'partial'):
+                continue  # 已经处理过
+            entry.pop('result', None)
+            if not entry['toc_text']:
+                entry['status'] = 'skipped'
+            else:
+                output_pdf = entry['pdf'] if in_place else self.generate_output_path(entry['pdf'])
+                jobs.append((row, {'pdf': entry['pdf'], 'toc_text': entry['toc_text'], 'offset': entry['offset'],
+                                   'output': output_pdf, 'incremental': incremental, 'preset': preset,
+                                   'page_map': page_map, 'write_labels': write_labels}))
+                entry['status'] = 'pending'
+            self.update_queue_item(row)
+        if not jobs:
+            QMessageBox.information(self, "没有可处理的文件", "队列中的文件都已处理，或者还没有设置目录。")
+            return
+        self.queue_worker = QueueWorker(jobs, parent=self)
+        self.queue_worker.job_started.connect(self.on_queue_job_started)
+        self.queue_worker.job_finished.connect(self.on_queue_job_finished)
+        self.queue_worker.finished.connect(self.on_queue_finished)
+        self.queue_process_button.setText("⏹️ 取消")
+        self.queue_clear_button.setEnabled(False)
+        self.queue_worker.start()
+
+    def on_queue_job_started(self, row):
+        self.queue_entries[row]['status'] = 'running'
+        self.update_queue_item(row)
+
+    def on_queue_job_finished(self, row, result):
+        entry = self.queue_entries[row]
+        entry['status'] = result['status']
+        entry['result'] = result
+        self.update_queue_item(row)
+        self.update_queue_status()
+
+    def on_queue_finished(self):
+        """
+        队列处理结束：把所有文件的问题汇总到一个报告中。
+        """
+        self.queue_worker = None
+        self.queue_process_button.setText("▶️ 处理全部")
+        self.queue_process_button.setEnabled(True)
+        self.queue_clear_button.setEnabled(True)
+        counts = {}
+        report = []
+        for row, entry in enumerate(self.queue_entries):
+            if entry['status'] == 'pending':
+                entry['status'] = 'new'  # 取消后没有开始的文件
+                self.update_queue_item(row)
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+            name = os.path.basename(entry['pdf'])
+            if entry['status'] == 'skipped':
+                report.append(f"{name}：没有目录内容，可以放一个同名 {TOC_SIDECAR_SUFFIX} 文件，或在队列中选中后编辑")
+            for error in entry.get('result', {}).get('errors', []):
+                report.append(f"{name}：{error}")
+        if report:
+            ErrorDialog(report, self).exec_()
+        QMessageBox.information(
+            self, "队列处理完成",
+            f"成功 {counts.get('ok', 0)}，部分成功 {counts.get('partial', 0)}，"
+            f"失败 {counts.get('failed', 0)}，没有目录 {counts.get('skipped', 0)}")
+
     def reset_input_label_style(self):
         """
         重置拖放区域的样式和文本。
@@ -558,7 +1514,7 @@ class PDFOutlineTool(QWidget):
                 }}
             """)
             self.toc_text_edit.setStyleSheet(f"""
-                QTextEdit {{
+                QPlainTextEdit {{
                     font-size: 14px;
                     color: #FFFFFF;
                     background-color: #3C3C3C;
@@ -578,7 +1534,7 @@ class PDFOutlineTool(QWidget):
                 }}
             """)
             self.toc_text_edit.setStyleSheet(f"""
-                QTextEdit {{
+                QPlainTextEdit {{
                     font-size: 14px;
                     color: #24292E;
                     background-color: #FFFFFF;
@@ -596,42 +1552,179 @@ class PDFOutlineTool(QWidget):
         if file_path:
             self.load_pdf(file_path)
 
-    def load_pdf(self, file_path):
+    def load_pdf(self, file_path, toc_text=None):
         """
         加载 PDF 文件并读取其目录。
+        toc_text 不为 None 时（队列中已经有这个文件的目录）显示它，而不是 PDF 中现有的目录。
         """
         self.input_line_edit.setText(file_path)
         self.input_label.setText(f"已加载文件：{os.path.basename(file_path)}")
         self.input_pdf_path = file_path
-        self.load_existing_toc(file_path)
-
-    def load_existing_toc(self, file_path):
+        self.page_index = PageTextIndex(file_path)  # 需要时才提取页面文字
+        self.page_map = None  # 勾选“按印刷页码”时才建立
+        self.write_labels_check_box.setEnabled(False)
+        self.page_preview.set_document(file_path)
+        self.page_preview.setVisible(self.preview_check_box.isChecked())
+        self.offset_hint_label.setText("")
+        if self.page_map_check_box.isChecked():
+            self.start_page_map_task()
+        self.load_existing_toc(file_path, toc_text)
+
+    def load_existing_toc(self, file_path, toc_text=None):
         """
         读取并显示 PDF 文件中现有的目录（如果有）。
+        在后台线程中读取：打开后先显示页数，读完大纲后分批填入文本框，避免大纲很大时界面卡死。
+        给出 toc_text 时只在后台打开文件，文本框显示 toc_text。
+        """
+        self.stop_toc_loading()
+        self.release_open_document()
+        self.toc_text_edit.clear()
+        # 之前的读取线程可能还在读大纲，它的结果会因为不是当前线程而被丢弃，文档由它交出后再关闭
+        reader = TocReader(file_path, self)
+        self.toc_reader = reader
+        reader.page_counted.connect(lambda *result: self.on_page_counted(reader, file_path, *result))
+        reader.opened.connect(lambda *result: self.on_pdf_opened(reader, *result))
+        if toc_text is None:
+            reader.toc_read.connect(lambda lines: self.on_toc_read(reader, lines))
+        else:
+            self.toc_text_edit.setPlainText(toc_text)
+        reader.failed.connect(lambda message: self.on_toc_failed(reader, message))
+        reader.start()
+
+    def on_page_counted(self, reader, file_path, page_count, repaired):
+        """
+        PDF 已打开：显示页数。
+        """
+        if reader is not self.toc_reader:
+            return  # 读取期间已经换了文件
+        self.page_count = page_count
+        note = "，文件已损坏并自动修复" if repaired else ""
+        self.input_label.setText(f"已加载文件：{os.path.basename(file_path)}（共 {page_count} 页{note}）")
+        self.schedule_full_validation()
+
+    def on_pdf_opened(self, reader, doc, state):
+        """
+        大纲已读完：保留打开的文档供添加大纲时复用。
+        """
+        if reader is not self.toc_reader:
+            doc.close()  # 读取期间已经换了文件或关闭了窗口
+            return
+        self.release_open_document()
+        self.open_document = (state, doc)
+
+    def on_toc_failed(self, reader, message):
+        if reader is self.toc_reader:
+            QMessageBox.critical(self, "错误", f"无法读取 PDF 文件的目录：{message}")
+
+    def on_toc_read(self, reader, lines):
+        """
+        后台读取完成，开始分批显示目录。
+        """
+        if reader is not self.toc_reader:
+            return
+        self.pending_toc_lines = lines
+        self.pending_toc_position = 0
+        if lines:
+            self.toc_text_edit.setReadOnly(True)
+            self.toc_text_edit.setUndoRedoEnabled(False)
+            self.toc_load_timer.start(0)
+
+    def take_open_document(self, file_path):
         """
+        取出加载时打开的文档（之后由调用方负责关闭）。
+        文件已被改动或不是同一个文件时返回 None。
+        """
+        if self.open_document is None:
+            return None
+        state, doc = self.open_document
+        self.open_document = None
         try:
-            doc = fitz.open(file_path)
-            toc = doc.get_toc()
-            doc.close()
-            if toc:
-                toc_text = self.toc_to_text(toc)
-                self.toc_text_edit.setPlainText(toc_text)
-            else:
-                self.toc_text_edit.clear()
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"无法读取 PDF 文件的目录：{str(e)}")
+            if file_state(file_path) == state:
+                return doc
+        except OSError:
+            pass
+        doc.close()
+        return None
+
+    def release_open_document(self):
+        """
+        关闭保留的文档。
+        """
+        if self.open_document is not None:
+            self.open_document[1].close()
+            self.open_document = None
 
-    def toc_to_text(self, toc):
+    def schedule_full_validation(self):
         """
-        将 PyMuPDF 获取的目录列表转换为文本格式，便于显示和编辑。
+        偏移量或 PDF 页数变化后，稍后重新检查所有行。
         """
-        lines = []
-        for entry in toc:
-            level, title, page = entry
-            indent = ' ' * 4 * (level - 1)  # 每级缩进 4 个空格
-            line = f"{indent}{title}  {page}"
-            lines.append(line)
-        return '\n'.join(lines)
+        self.revalidate_all = True
+        self.validation_timer.start()
+
+    def update_validation(self):
+        """
+        汇总各行的检查结果并显示在目录下方。
+        只有偏移量或页数变化时才重新检查全部行；平时各行在编辑时已经单独检查过。
+        """
+        highlighter = self.outline_highlighter
+        if self.revalidate_all:
+            self.revalidate_all = False
+            highlighter.page_offset = self.offset_spin_box.value()
+            highlighter.page_map = self.active_page_map()
+            highlighter.page_count = getattr(self, 'page_count', None)
+            highlighter.rehighlight()
+            self.update_preview()  # 目标页随偏移量和页码表变化
+
+        issue_count = 0
+        first_issue = None
+        block = self.toc_text_edit.document().begin()
+        while block.isValid():
+            state = block.userState()
+            if state >= 0 and state & 1:
+                issue_count += 1
+                if first_issue is None:
+                    first_issue = block
+            block = block.next()
+
+        if issue_count:
+            message = first_issue.userData().message
+            self.toc_status_label.setText(
+                f"⚠️ {issue_count} 行有问题，第 {first_issue.blockNumber() + 1} 行：{message}")
+        elif self.toc_text_edit.document().isEmpty():
+            self.toc_status_label.setText("")
+        else:
+            self.toc_status_label.setText("✅ 目录格式正确")
+
+    def append_toc_chunk(self):
+        """
+        把下一批目录行追加到文本框末尾，每批之间让出事件循环。
+        """
+        start = self.pending_toc_position
+        chunk = self.pending_toc_lines[start:start + TOC_LOAD_CHUNK_LINES]
+        cursor = QTextCursor(self.toc_text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(('\n' if start else '') + '\n'.join(chunk))
+        self.pending_toc_position = start + len(chunk)
+        if self.pending_toc_position >= len(self.pending_toc_lines):
+            self.stop_toc_loading()
+            self.toc_text_edit.moveCursor(QTextCursor.Start)
+
+    def stop_toc_loading(self):
+        """
+        停止分批加载，恢复编辑。
+        """
+        self.toc_load_timer.stop()
+        self.pending_toc_lines = []
+        self.pending_toc_position = 0
+        self.toc_text_edit.setReadOnly(False)
+        self.toc_text_edit.setUndoRedoEnabled(True)
+
+    # 核心功能在 outline_core 中，这里保留原来的静态方法名
+    toc_to_lines = staticmethod(toc_to_lines)
+    toc_to_text = staticmethod(toc_to_text)
+    generate_output_path = staticmethod(generate_output_path)
+    parse_outline = staticmethod(parse_outline)
+    add_outline_to_pdf = staticmethod(add_outline_to_pdf)
 
     def process(self):
         """
@@ -643,8 +1736,20 @@ class PDFOutlineTool(QWidget):
             QMessageBox.warning(self, "输入缺失", "请先拖放或选择一个 PDF 文件。")
             return
 
+        if self.toc_load_timer.isActive() or (self.toc_reader is not None and self.toc_reader.isRunning()):
+            QMessageBox.warning(self, "请稍候", "目录仍在加载中。")
+            return
+
+        if self.page_map_check_box.isChecked() and self.page_map_task is not None:
+            QMessageBox.warning(self, "请稍候", "印刷页码表仍在建立中。")
+            return
+
         page_offset = self.offset_spin_box.value()
         toc_text = self.toc_text_edit.toPlainText().strip()
+        page_map = self.active_page_map()
+        page_labels = None
+        if page_map is not None and page_map.source == PAGE_MAP_FOLIOS and self.write_labels_check_box.isChecked():
+            page_labels = page_map.label_rules()
 
         # 验证输入文件
         if not os.path.isfile(input_pdf):
@@ -655,117 +1760,120 @@ class PDFOutlineTool(QWidget):
             return
 
         # 自动生成输出文件路径
-        output_pdf = self.generate_output_path(input_pdf)
-
-        # 初始化错误列表
-        errors = []
-
-        # 解析目录
-        outline = self.parse_outline(toc_text, page_offset, errors)
-        if not outline and not errors:
-            QMessageBox.warning(self, "解析错误", "无法解析目录内容，请检查格式。")
-            return
+        if self.in_place_check_box.isChecked():
+            output_pdf = input_pdf
+        else:
+            output_pdf = self.generate_output_path(input_pdf)
+        incremental = self.incremental_check_box.isChecked()
+        preset = self.preset_combo_box.currentData()
+
+        if output_pdf == input_pdf:
+            self.page_preview.release_documents()
+
+        # 在后台线程中解析并写入，界面保持响应
+        doc = self.take_open_document(input_pdf)
+        self.worker = OutlineWorker(input_pdf, output_pdf, toc_text, page_offset, incremental, doc, self, preset,
+                                    page_map, page_labels)
+        self.progress_dialog = QProgressDialog("正在准备…", "取消", 0, 100, self)
+        self.progress_dialog.setWindowTitle("处理中")
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.canceled.connect(self.cancel_process)
+        self.worker.stage_changed.connect(self.on_process_stage)
+        self.worker.succeeded.connect(self.on_process_succeeded)
+        self.worker.failed.connect(self.on_process_failed)
+        self.worker.cancelled.connect(self.on_process_cancelled)
+        self.worker.finished.connect(self.on_process_finished)
+        self.process_button.setEnabled(False)
+        self.progress_dialog.show()
+        self.worker.start()
+
+    def cancel_process(self):
+        """
+        用户点击取消时通知后台线程停止。
+        """
+        self.progress_dialog.setLabelText("正在取消…")
+        self.worker.cancel()
 
-        # 添加大纲到 PDF
-        try:
-            self.add_outline_to_pdf(input_pdf, output_pdf, outline, errors)
-            if errors:
-                # 如果有错误，显示所有错误在一个滚动窗口
-                error_dialog = ErrorDialog(errors, self)
-                error_dialog.exec_()
-                QMessageBox.information(self, "完成（含错误）", f"大纲已部分添加到\n{output_pdf}")
-            else:
-                QMessageBox.information(self, "完成", f"大纲已成功添加到\n{output_pdf}")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"处理 PDF 时发生错误：{str(e)}")
+    def close_progress_dialog(self):
+        """
+        关闭进度对话框（关闭时不再触发取消）。
+        """
+        self.progress_dialog.canceled.disconnect(self.cancel_process)
+        self.progress_dialog.close()
 
-    def generate_output_path(self, input_pdf):
+    def on_process_stage(self, text, percent):
         """
-        根据输入文件路径生成输出文件路径。
+        更新进度对话框。
         """
-        dir_name, base_name = os.path.split(input_pdf)
-        name, ext = os.path.splitext(base_name)
-        new_name = f"{name}_含目录{ext}"
-        output_pdf = os.path.join(dir_name, new_name)
-        return output_pdf
+        if not self.progress_dialog.wasCanceled():
+            self.progress_dialog.setLabelText(text)
+            self.progress_dialog.setValue(percent)
 
-    def parse_outline(self, text, page_offset, errors):
+    def on_process_succeeded(self, save_mode, errors, metrics):
         """
-        解析用户输入的目录文本，调整页码，并生成大纲列表。
-        收集所有解析错误到 errors 列表。
-        将每行最后的部分作为页码。
+        处理完成，显示结果和错误报告；勾选“显示耗时”时附上各阶段的耗时统计。
         """
-        outline = []
-        for idx, line in enumerate(text.split('\n'), start=1):
-            line = line.rstrip()
-            if not line:
-                continue
-            # 计算缩进以确定层级
-            stripped_line = line.lstrip(' ')
-            indent = len(line) - len(stripped_line)
-            level = indent // 4 + 1  # 每 4 个空格为一个层级
-
-            # 方法一：使用正则表达式提取页码
-            match = re.match(r'^(.*\S)\s+(\d+)$', stripped_line)
-            if match:
-                title = match.group(1)
-                page = match.group(2)
-                try:
-                    page_number = int(page) + page_offset - 1  # 调整页码，考虑 0 起始索引
-                    if page_number < 0:
-                        errors.append(f"行 {idx} 页码调整后小于 0：{title}")
-                        continue
-                except ValueError:
-                    errors.append(f"行 {idx} 无法解析页码：{page}，标题：{title}")
-                    continue
-                outline.append({'level': level, 'title': title, 'page': page_number})
-            else:
-                # 方法二：按空白字符拆分，取最后一个作为页码
-                tokens = stripped_line.split()
-                if len(tokens) < 2:
-                    errors.append(f"行 {idx} 格式错误，缺少页码：{line}")
-                    continue
-                page = tokens[-1]
-                title = ' '.join(tokens[:-1])
-                try:
-                    page_number = int(page) + page_offset - 1
-                    if page_number < 0:
-                        errors.append(f"行 {idx} 页码调整后小于 0：{title}")
-                        continue
-                except ValueError:
-                    errors.append(f"行 {idx} 无法解析页码：{page}，标题：{title}")
-                    continue
-                outline.append({'level': level, 'title': title, 'page': page_number})
-        return outline
+        self.close_progress_dialog()
+        output_pdf = self.worker.output_pdf
+        mode_text = f"保存方式：{SAVE_MODE_NAMES[save_mode]}"
+        size_text = metrics.size_summary()
+        if size_text:
+            mode_text += f"\n{size_text}"
+        if self.timing_check_box.isChecked():
+            mode_text += f"\n\n{metrics.summary()}"
+        if errors:
+            # 如果有错误，显示所有错误在一个滚动窗口
+            error_dialog = ErrorDialog(errors, self)
+            error_dialog.exec_()
+            QMessageBox.information(self, "完成（含错误）", f"大纲已部分添加到\n{output_pdf}\n{mode_text}")
+        else:
+            QMessageBox.information(self, "完成", f"大纲已成功添加到\n{output_pdf}\n{mode_text}")
 
-    def add_outline_to_pdf(self, input_pdf, output_pdf, outline, errors):
+    def on_process_failed(self, title, message):
         """
-        将大纲添加到 PDF 中并保存为新文件。
-        如果 PDF 已有大纲，将其替换。
-        收集所有添加大纲时的错误到 errors 列表。
+        处理失败，显示错误信息。
         """
-        doc = fitz.open(input_pdf)
-        # 删除已有大纲（通过设置新的 TOC 会自动替换旧的）
-        # doc.set_toc([])  # 可选：清空现有 TOC
+        self.close_progress_dialog()
+        if title == "解析错误":
+            QMessageBox.warning(self, title, message)
+        else:
+            QMessageBox.critical(self, title, message)
 
-        toc = []
-        for item in outline:
-            if 0 <= item['page'] < len(doc):
-                toc.append([item['level'], item['title'], item['page']])
-            else:
-                errors.append(f"标题“{item['title']}”的页码 {item['page'] + 1} 超出 PDF 页数范围，将被忽略。")
+    def on_process_cancelled(self):
+        """
+        处理已取消，没有写入任何输出文件。
+        """
+        self.close_progress_dialog()
+        QMessageBox.information(self, "已取消", "处理已取消，未生成输出文件。")
 
-        if toc:
-            doc.set_toc(toc)
-        else:
-            errors.append("没有有效的大纲项被添加。")
+    def on_process_finished(self):
+        """
+        后台线程结束后恢复按钮。
+        """
+        self.process_button.setEnabled(True)
+        self.worker.deleteLater()
+        self.worker = None
 
-        try:
-            doc.save(output_pdf)
-        except Exception as e:
-            errors.append(f"保存新 PDF 文件时出错：{str(e)}")
-        finally:
-            doc.close()
+    def closeEvent(self, event):
+        """
+        关闭窗口时取消并等待后台处理结束，避免留下临时文件。
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        self.page_preview.shutdown()
+        if self.queue_worker is not None:
+            self.queue_worker.finished.disconnect(self.on_queue_finished)
+            self.queue_worker.cancel()
+            self.queue_worker.wait()
+        self.toc_reader = None  # 之后才送达的文档都会被直接关闭
+        for task in self.findChildren(BackgroundTask) + self.findChildren(TocReader):
+            task.wait()
+        self.release_open_document()
+        super().closeEvent(event)
 
     def use_template(self):
         """
@@ -782,8 +1890,198 @@ class PDFOutlineTool(QWidget):
 二、营养素的代谢及生理功能  1
     2.1 营养素的代谢  1
     2.2 营养素的生理功能  2"""
+        self.stop_toc_loading()
         self.toc_text_edit.setPlainText(template)
 
+    def extract_contents_pages(self):
+        """
+        从 PDF 中的印刷目录页提取目录文本，在后台线程中进行。
+        """
+        if not hasattr(self, 'input_pdf_path') or not hasattr(self, 'page_count'):
+            QMessageBox.warning(self, "输入缺失", "请先拖放或选择一个 PDF 文件。")
+            return
+        dialog = PageRangeDialog(self.page_count, "提取目录页", "目录印刷在 PDF 的哪几页？", self)
+        if not dialog.exec_():
+            return
+        first_page, last_page = dialog.page_range()
+
+        self.extract_button.setEnabled(False)
+        self.extract_button.setText("⏳ 正在提取…")
+        self.extract_task = BackgroundTask(extract_contents_toc, self.input_pdf_path, first_page, last_page, parent=self)
+        self.extract_task.succeeded.connect(self.on_contents_extracted)
+        self.extract_task.failed.connect(
+            lambda message: QMessageBox.critical(self, "错误", f"提取目录页时发生错误：{message}"))
+        self.extract_task.finished.connect(self.on_extract_finished)
+        self.extract_task.start()
+
+    def on_contents_extracted(self, toc_text):
+        """
+        把提取到的目录放进文本框。
+        """
+        if toc_text:
+            self.stop_toc_loading()
+            self.toc_text_edit.setPlainText(toc_text)
+        else:
+            QMessageBox.warning(self, "未找到目录", "所选页面中没有识别到“标题 页码”格式的目录行。")
+
+    def on_extract_finished(self):
+        self.extract_button.setEnabled(True)
+        self.extract_button.setText("📑 提取目录页")
+        self.extract_task.deleteLater()
+
+    def detect_document_headings(self):
+        """
+        按字体统计识别正文中的标题，生成目录，在后台线程中进行。
+        """
+        if not hasattr(self, 'input_pdf_path'):
+            QMessageBox.warning(self, "输入缺失", "请先拖放或选择一个 PDF 文件。")
+            return
+        self.headings_button.setEnabled(False)
+        self.headings_button.setText("⏳ 正在识别…")
+        self.headings_task = BackgroundTask(detect_headings, self.input_pdf_path, parent=self)
+        self.headings_task.succeeded.connect(self.on_headings_detected)
+        self.headings_task.failed.connect(
+            lambda message: QMessageBox.critical(self, "错误", f"识别标题时发生错误：{message}"))
+        self.headings_task.finished.connect(self.on_headings_finished)
+        self.headings_task.start()
+
+    def on_headings_detected(self, toc_text):
+        """
+        把识别出的目录放进文本框；页码是实际页码，所以偏移量归零、不按印刷页码定位。
+        """
+        if not toc_text:
+            QMessageBox.warning(self, "未识别到标题", "没有找到字号或粗细与正文明显不同的标题行。")
+            return
+        self.stop_toc_loading()
+        self.toc_text_edit.setPlainText(toc_text)
+        self.offset_spin_box.setValue(0)
+        self.page_map_check_box.setChecked(False)
+        self.offset_hint_label.setText(f"识别到 {toc_text.count(chr(10)) + 1} 条标题，页码为实际页码")
+
+    def on_headings_finished(self):
+        self.headings_button.setEnabled(True)
+        self.headings_button.setText("🧭 识别标题")
+        self.headings_task.deleteLater()
+
+    def detect_offset(self):
+        """
+        根据目录标题在正文中出现的页面自动推算页码偏移量，在后台线程中进行。
+        """
+        if not hasattr(self, 'input_pdf_path'):
+            QMessageBox.warning(self, "输入缺失", "请先拖放或选择一个 PDF 文件。")
+            return
+        toc_text = self.toc_text_edit.toPlainText().strip()
+        if not toc_text:
+            QMessageBox.warning(self, "目录缺失", "请输入目录内容。")
+            return
+
+        self.detect_offset_button.setEnabled(False)
+        self.offset_hint_label.setText("正在检测…")
+        self.detect_task = BackgroundTask(detect_page_offset, self.page_index, toc_text, parent=self)
+        self.detect_task.succeeded.connect(self.on_offset_detected)
+        self.detect_task.failed.connect(self.on_offset_detect_failed)
+        self.detect_task.finished.connect(self.on_detect_finished)
+        self.detect_task.start()
+
+    def on_offset_detected(self, result):
+        """
+        显示检测结果，并把建议的偏移量填入输入框。
+        """
+        if result is None:
+            self.offset_hint_label.setText("未能在正文中找到目录标题")
+            return
+        offset, confidence, sampled = result
+        self.offset_spin_box.setValue(offset)
+        self.offset_hint_label.setText(f"建议偏移量 {offset:+d}（置信度 {confidence:.0%}，抽查 {sampled} 条）")
+
+    def on_offset_detect_failed(self, message):
+        self.offset_hint_label.setText("")
+        QMessageBox.critical(self, "错误", f"检测页码偏移量时发生错误：{message}")
+
+    def on_detect_finished(self):
+        self.detect_offset_button.setEnabled(True)
+        self.detect_task.deleteLater()
+
+    def outline_line_page(self, block):
+        """
+        返回目录文本块指向的物理页码（从 0 开始），这一行没有有效页码时返回 None。
+        重复的印刷页码按上一行检查时记下的前一条目页码区分，与添加大纲时一致。
+        """
+        after, _ = OutlineHighlighter.unpack_state(block.previous().userState())
+        parsed = parse_outline_line(block.text(), self.offset_spin_box.value(), self.active_page_map(), after)
+        if parsed is None or parsed[3] is not None:
+            return None
+        return parsed[2]
+
+    def update_preview(self):
+        """
+        预览光标所在行的目标页，并预取前后几行的目标页。
+        """
+        if not self.page_preview.isVisible():
+            return
+        block = self.toc_text_edit.textCursor().block()
+        neighbors = []
+        before = after = block
+        for _ in range(THUMBNAIL_PREFETCH_LINES):
+            after = after.next()
+            before = before.previous()
+            neighbors.extend(self.outline_line_page(other) for other in (after, before) if other.isValid())
+        self.page_preview.show_pages(self.outline_line_page(block), neighbors, getattr(self, 'page_count', None))
+
+    def on_preview_toggled(self, checked):
+        self.page_preview.setVisible(checked and self.page_preview.pdf_path is not None)
+        self.update_preview()
+
+    def active_page_map(self):
+        """
+        勾选“按印刷页码”且已经建立对照表时返回它，否则返回 None（按偏移量计算页码）。
+        """
+        return self.page_map if self.page_map_check_box.isChecked() else None
+
+    def on_page_map_toggled(self, checked):
+        if checked and hasattr(self, 'input_pdf_path') and self.page_map is None:
+            self.start_page_map_task()
+        self.schedule_full_validation()
+
+    def start_page_map_task(self):
+        """
+        在后台建立当前 PDF 的印刷页码表，同一时间只建立一份；
+        建立期间换了文件时，完成后再为新文件建立。
+        """
+        if self.page_map_task is not None:
+            return
+        file_path = self.input_pdf_path
+        self.offset_hint_label.setText("正在建立页码表…")
+        self.page_map_task = BackgroundTask(build_page_map, file_path, parent=self)
+        self.page_map_task.succeeded.connect(lambda page_map: self.on_page_map_built(file_path, page_map))
+        self.page_map_task.failed.connect(lambda message: self.on_page_map_failed(file_path, message))
+        self.page_map_task.finished.connect(lambda: self.on_page_map_finished(file_path))
+        self.page_map_task.start()
+
+    def on_page_map_built(self, file_path, page_map):
+        if file_path != self.input_pdf_path:
+            return
+        self.page_map = page_map
+        if page_map is None:
+            self.offset_hint_label.setText("没有找到页码标签或页眉页脚中的页码，按偏移量计算")
+            return
+        self.write_labels_check_box.setEnabled(page_map.source == PAGE_MAP_FOLIOS)
+        self.offset_hint_label.setText(f"页码表来自{PAGE_MAP_SOURCE_NAMES[page_map.source]}，"
+                                       f"覆盖 {page_map.mapped_pages}/{len(page_map.labels)} 页")
+        self.schedule_full_validation()
+
+    def on_page_map_failed(self, file_path, message):
+        if file_path != self.input_pdf_path:
+            return
+        self.offset_hint_label.setText("")
+        QMessageBox.critical(self, "错误", f"建立印刷页码表时发生错误：{message}")
+
+    def on_page_map_finished(self, file_path):
+        self.page_map_task.deleteLater()
+        self.page_map_task = None
+        if file_path != self.input_pdf_path and self.page_map_check_box.isChecked():
+            self.start_page_map_task()
+
     def show_help(self):
         """
         显示格式说明对话框
@@ -799,6 +2097,16 @@ class PDFOutlineTool(QWidget):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后的应用中启动工作进程
+    if '--batch' in sys.argv[1:]:
+        sys.exit(batch_main(sys.argv[1:]))
+    if '--serve' in sys.argv[1:]:
+        from outline_service import serve_main
+        sys.exit(serve_main(sys.argv[1:]))
+    if '--watch' in sys.argv[1:]:
+        from outline_watch import watch_main
+        sys.exit(watch_main(sys.argv[1:]))
+
     app = QApplication(sys.argv)
     set_global_font(app)  # 设置全局字体
     window = PDFOutlineTool()
@@ -0,0 +1,38 @@
+"""
+测试共用的设置：让测试可以导入仓库根目录下的模块，界面测试使用无窗口的 Qt 平台。
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_gui_module():
+    """按文件路径加载 “source code.py”（文件名带空格，不能直接 import）"""
+    pytest.importorskip("PyQt5.QtWidgets")
+    spec = importlib.util.spec_from_file_location("outline_app", os.path.join(ROOT, "source code.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def qapp():
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def process_events_for(seconds):
+    from PyQt5.QtCore import QCoreApplication
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
@@ -0,0 +1,46 @@
+"""
+批量模式：工作进程异常退出时不影响其他文件，并且总会写出汇总报告。
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+import outline_core
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="依赖 fork 把替换后的任务函数带到工作进程")
+
+
+def crash_on_bad(job):
+    if job['pdf'].endswith("bad.pdf"):
+        os._exit(1)  # 模拟被系统杀死或 MuPDF 崩溃
+    return {'pdf': job['pdf'], 'output': job['output'], 'errors': [], 'status': 'ok',
+            'seconds': 0.0, 'peak_rss_mb': None}
+
+
+def test_worker_crash_fails_only_that_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(outline_core, "run_batch_job", crash_on_bad)
+    names = ["a.pdf", "b.pdf", "bad.pdf", "c.pdf", "d.pdf"]
+    jobs = [{'pdf': str(tmp_path / name), 'output': str(tmp_path / ("out-" + name))} for name in names]
+    report_path = tmp_path / "report.json"
+    summary = outline_core.run_batch(jobs, workers=2, report_path=str(report_path))
+
+    statuses = {os.path.basename(r['pdf']): r['status'] for r in summary['results']}
+    assert statuses == {"a.pdf": 'ok', "b.pdf": 'ok', "bad.pdf": 'failed', "c.pdf": 'ok', "d.pdf": 'ok'}
+    assert summary['unfinished'] == 0
+    assert json.loads(report_path.read_text(encoding='utf-8'))['failed'] == 1
+
+
+def test_report_written_when_interrupted(monkeypatch, tmp_path):
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(outline_core, "run_batch_job", crash_on_bad)
+    import concurrent.futures
+    monkeypatch.setattr(concurrent.futures, "as_completed", interrupted)
+    jobs = [{'pdf': str(tmp_path / "a.pdf"), 'output': str(tmp_path / "out.pdf")}]
+    report_path = tmp_path / "report.json"
+    with pytest.raises(KeyboardInterrupt):
+        outline_core.run_batch(jobs, workers=1, report_path=str(report_path))
+    assert json.loads(report_path.read_text(encoding='utf-8'))['unfinished'] == 1
@@ -0,0 +1,98 @@
+"""
+从印刷目录页识别“标题 …… 页码”条目，按缩进或章节编号推断层级。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+fitz = pytest.importorskip("fitz")
+
+# 目录页内容：(缩进, 标题, 印刷页码)
+CONTENTS_PAGES = [
+    [
+        (0, "前言", "iii"),
+        (0, "第一章 总论", "1"),
+        (20, "第一节 背景", "3"),
+        (20, "第二节 方法", "12"),
+        (40, "一、数据来源", "15"),
+    ],
+    [
+        (0, "第二章 结果", "27"),
+        (20, "第一节 主要发现", "30"),
+        (0, "参考文献", "101"),
+    ],
+]
+
+
+def make_contents_pdf(path, pages, margin=72):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 90), "书名", fontname="china-s", fontsize=24)
+    for rows in pages:
+        page = doc.new_page()
+        page.insert_text((margin, 60), "目录", fontname="china-s", fontsize=18)
+        y = 100
+        for indent, title, number in rows:
+            page.insert_text((margin + indent, y), title, fontname="china-s", fontsize=11)
+            page.insert_text((margin + 260, y), "." * 40, fontname="helv", fontsize=11)
+            # 页码单独右对齐
+            page.insert_text((margin + 420 - fitz.get_text_length(number, fontsize=11), y), number,
+                             fontname="helv", fontsize=11)
+            y += 22
+        margin += 10  # 奇偶页左边距不同
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def page_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(outline_core, "_page_cache", outline_core.PageTextCache(str(tmp_path / "cache")))
+
+
+def test_extract_contents_with_dot_leaders(tmp_path):
+    path = make_contents_pdf(str(tmp_path / "book.pdf"), CONTENTS_PAGES)
+    text = outline_core.extract_contents_toc(path, 2, 3, workers=1)
+    errors = []
+    outline = outline_core.parse_outline(text, 0, errors)
+    assert errors == []
+    assert [tuple(entry) for entry in outline] == [
+        (1, "第一章 总论", 0),
+        (2, "第一节 背景", 2),
+        (2, "第二节 方法", 11),
+        (3, "一、数据来源", 14),
+        (1, "第二章 结果", 26),
+        (2, "第一节 主要发现", 29),
+        (1, "参考文献", 100),
+    ]
+
+
+def test_levels_from_section_numbers():
+    # 没有缩进时按 1.2.3 式编号推断层级，层级只能逐级加深
+    rows = [(72, 100, 111, "1 Introduction .......... 1"),
+            (72, 122, 133, "1.1 Scope .......... 2"),
+            (72, 144, 155, "1.1.1 Terms … 4"),
+            (72, 166, 177, "2 Methods 9"),
+            (72, 188, 199, "2.1.1 Deep section ...... 10")]
+    assert outline_core.contents_rows_to_toc({0: rows}) == [
+        [1, "1 Introduction", 1],
+        [2, "1.1 Scope", 2],
+        [3, "1.1.1 Terms", 4],
+        [1, "2 Methods", 9],
+        [2, "2.1.1 Deep section", 10],
+    ]
+
+
+def test_wrapped_title_is_joined():
+    rows = [(72, 100, 111, "第一章 一个很长很长的标题"),
+            (72, 112, 123, "的第二行 ........ 5"),
+            (92, 134, 145, "第一节 短标题 ........ 7")]
+    assert outline_core.contents_rows_to_toc({0: rows}) == [
+        [1, "第一章 一个很长很长的标题 的第二行", 5],
+        [2, "第一节 短标题", 7],
+    ]
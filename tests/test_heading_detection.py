@@ -0,0 +1,93 @@
+"""
+按字体识别标题：字号对应层级，正文、页眉和页码不算标题。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+fitz = pytest.importorskip("fitz")
+
+BODY = "正文内容用来占据大多数字符，使它成为正文字体。" * 2
+
+# 每页的标题：(字号, 标题)
+PAGES = [
+    [(20, "第一章 总论"), (15, "第一节 背景")],
+    [(15, "第二节 方法"), (12.5, "一、数据来源")],
+    [(12.5, "二、处理流程")],
+    [(20, "第二章 结果")],
+    [(15, "第一节 主要发现")],
+    [],
+]
+
+
+def make_pdf(path):
+    doc = fitz.open()
+    for number, headings in enumerate(PAGES, start=1):
+        page = doc.new_page()
+        page.insert_text((72, 40), "页眉 书名", fontname="china-s", fontsize=15)  # 与节标题同字号
+        y = 90
+        for size, title in headings:
+            page.insert_text((72, y), title, fontname="china-s", fontsize=size)
+            y += size * 2
+            for _ in range(6):
+                page.insert_text((72, y), BODY[:40], fontname="china-s", fontsize=10)
+                y += 16
+        for _ in range(4):
+            page.insert_text((72, y), BODY[:40], fontname="china-s", fontsize=10)
+            y += 16
+        page.insert_text((290, 800), str(number), fontname="helv", fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def page_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(outline_core, "_page_cache", outline_core.PageTextCache(str(tmp_path / "cache")))
+
+
+EXPECTED = [
+    (1, "第一章 总论", 0),
+    (2, "第一节 背景", 0),
+    (2, "第二节 方法", 1),
+    (3, "一、数据来源", 1),
+    (3, "二、处理流程", 2),
+    (1, "第二章 结果", 3),
+    (2, "第一节 主要发现", 4),
+]
+
+
+def parsed(text):
+    errors = []
+    outline = outline_core.parse_outline(text, 0, errors)
+    assert errors == []
+    return [tuple(entry) for entry in outline]
+
+
+@pytest.mark.parametrize("sample_pages", [None, 3])
+def test_detect_headings_levels_and_pages(tmp_path, sample_pages):
+    path = make_pdf(str(tmp_path / "book.pdf"))
+    text = outline_core.detect_headings(path, workers=1, sample_pages=sample_pages)
+    assert parsed(text) == EXPECTED
+
+
+def test_max_levels(tmp_path):
+    path = make_pdf(str(tmp_path / "book.pdf"))
+    text = outline_core.detect_headings(path, workers=1, max_levels=2)
+    assert parsed(text) == [entry for entry in EXPECTED if entry[0] <= 2]
+
+
+def test_no_headings(tmp_path):
+    path = str(tmp_path / "plain.pdf")
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page().insert_text((72, 90), BODY, fontname="china-s", fontsize=10)
+    doc.save(path)
+    doc.close()
+    assert outline_core.detect_headings(path, workers=1) == ""
@@ -0,0 +1,35 @@
+"""
+处理记录：各阶段的内存统计和记录文件轮换。
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+
+def test_stages_record_current_rss(monkeypatch, tmp_path):
+    log_path = tmp_path / "jobs.jsonl"
+    monkeypatch.setenv("OUTLINE_METRICS_LOG", str(log_path))
+    metrics = outline_core.JobMetrics(source="test")
+    metrics.enter('parse')
+    metrics.enter('save')
+    record = metrics.finish('ok')
+    for stage in ('parse', 'save'):
+        assert set(record['stages'][stage]) == {'wall', 'cpu', 'rss_start_mb', 'rss_end_mb'}
+    if os.path.exists("/proc/self/statm"):
+        assert record['stages']['save']['rss_end_mb'] > 0
+    assert json.loads(log_path.read_text(encoding='utf-8'))['status'] == 'ok'
+
+
+def test_metrics_log_rotates(monkeypatch, tmp_path):
+    log_path = tmp_path / "jobs.jsonl"
+    log_path.write_text("x" * 100, encoding='utf-8')
+    monkeypatch.setenv("OUTLINE_METRICS_LOG", str(log_path))
+    monkeypatch.setattr(outline_core, "METRICS_LOG_MAX_BYTES", 50)
+    outline_core.JobMetrics(source="test").finish('ok')
+    assert (tmp_path / "jobs.jsonl.1").read_text(encoding='utf-8') == "x" * 100
+    assert len(log_path.read_text(encoding='utf-8').splitlines()) == 1
@@ -0,0 +1,132 @@
+"""
+update_outline_in_place 只改写变化的大纲条目，结果应与 set_toc 整体重建一致。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+fitz = pytest.importorskip("fitz")
+
+PAGES = 40
+
+
+def base_toc():
+    toc = []
+    for chapter in range(1, 7):
+        toc.append([1, f"第{chapter}章", chapter * 5])
+        for section in range(1, 4):
+            toc.append([2, f"{chapter}.{section} 节", chapter * 5 + section])
+            if chapter == 3:
+                toc.append([3, f"{chapter}.{section}.1 小节", chapter * 5 + section])
+    return toc
+
+
+@pytest.fixture
+def outlined_pdf(tmp_path):
+    path = str(tmp_path / "outlined.pdf")
+    doc = fitz.open()
+    for _ in range(PAGES):
+        doc.new_page()
+    doc.set_toc(base_toc())
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def edited(edit):
+    toc = base_toc()
+    edit(toc)
+    return toc
+
+
+def rename(toc):
+    toc[4][1] = "第2章（修订）"
+    toc[-1][1] = "6.3 节（修订）"
+
+
+def move_page(toc):
+    toc[8][2] = 30
+
+
+def change_levels(toc):
+    toc[2][0] = 3  # 1.2 节成为 1.1 节的子条目
+    toc[3][0] = 3
+
+
+def remove_subtree(toc):
+    start = next(i for i, entry in enumerate(toc) if entry[1] == "第3章")
+    end = next(i for i, entry in enumerate(toc) if entry[1] == "第4章")
+    del toc[start + 1:end]
+
+
+def append_entries(toc):
+    toc.append([2, "6.4 节", 35])
+    toc.append([1, "附录", 38])
+    toc.append([2, "附录 A", 39])
+
+
+def insert_in_middle(toc):
+    index = next(i for i, entry in enumerate(toc) if entry[1] == "第4章")
+    toc[index:index] = [[1, "插入章", 19], [2, "插入节", 20]]
+
+
+@pytest.mark.parametrize("edit", [rename, move_page, change_levels, remove_subtree, append_entries,
+                                  insert_in_middle])
+def test_update_matches_set_toc(outlined_pdf, tmp_path, edit):
+    toc = edited(edit)
+    doc = fitz.open(outlined_pdf)
+    try:
+        written = outline_core.update_outline_in_place(doc, toc)
+        assert written is not None and 0 < written < len(toc)
+        assert doc.get_toc() == toc
+        saved = str(tmp_path / "saved.pdf")
+        doc.save(saved, garbage=3)
+    finally:
+        doc.close()
+    # 保存并清理无用对象后重新打开，大纲树仍然完整
+    reopened = fitz.open(saved)
+    try:
+        assert reopened.get_toc() == toc
+    finally:
+        reopened.close()
+
+
+def test_unchanged_toc_writes_nothing(outlined_pdf):
+    doc = fitz.open(outlined_pdf)
+    try:
+        assert outline_core.update_outline_in_place(doc, base_toc()) == 0
+        assert doc.get_toc() == base_toc()
+    finally:
+        doc.close()
+
+
+def test_large_rewrite_falls_back_to_set_toc(outlined_pdf):
+    toc = [[1, f"新标题 {i}", i + 1] for i in range(len(base_toc()))]
+    doc = fitz.open(outlined_pdf)
+    try:
+        assert outline_core.update_outline_in_place(doc, toc) is None
+        assert doc.get_toc() == base_toc()  # 放弃时不修改文档
+    finally:
+        doc.close()
+
+
+def test_incremental_save_applies_edits(outlined_pdf, tmp_path):
+    toc = edited(remove_subtree)
+    toc[0][1] = "第1章（修订）"
+    outline = [outline_core.OutlineEntry(level, title, page - 1) for level, title, page in toc]
+    output = str(tmp_path / "output.pdf")
+    errors = []
+    metrics = outline_core.JobMetrics(input_pdf=outlined_pdf)
+    mode = outline_core.add_outline_to_pdf(outlined_pdf, output, outline, errors, incremental=True,
+                                           metrics=metrics)
+    assert errors == []
+    assert mode == outline_core.SAVE_INCREMENTAL
+    assert metrics.record['outline_update'] == "diff"
+    with fitz.open(output) as doc:
+        assert doc.get_toc() == toc
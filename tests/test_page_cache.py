@@ -0,0 +1,72 @@
+"""
+页面文字缓存的大小统计、淘汰和文件改写后的失效。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+
+def test_rewriting_pages_does_not_inflate_size(tmp_path):
+    cache = outline_core.PageTextCache(str(tmp_path))
+    for _ in range(5):
+        cache.put_pages("doc", "rows", {0: "x" * 100, 1: "y" * 50})
+    with cache.connect() as conn:
+        recorded = conn.execute("SELECT bytes FROM documents WHERE fingerprint = 'doc'").fetchone()[0]
+        stored = conn.execute("SELECT SUM(LENGTH(data)) FROM pages WHERE fingerprint = 'doc'").fetchone()[0]
+    assert recorded == stored
+
+
+def test_evicts_least_recently_used_document(tmp_path, monkeypatch):
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr(outline_core.time, "time", lambda: next(clock))
+    page = os.urandom(2000).hex()  # 压缩后仍有约 2000 字节
+    cache = outline_core.PageTextCache(str(tmp_path), max_bytes=5000)
+    cache.put_pages("a", "rows", {0: page})
+    cache.put_pages("b", "rows", {0: page})
+    assert cache.get_pages("a", "rows", [0])  # a 比 b 更近使用
+    cache.put_pages("c", "rows", {0: page})
+
+    assert cache.get_pages("b", "rows", [0]) == {}
+    assert cache.get_pages("a", "rows", [0]) == {0: page}
+    assert cache.get_pages("c", "rows", [0]) == {0: page}
+    with cache.connect() as conn:
+        documents = {row[0] for row in conn.execute("SELECT fingerprint FROM documents")}
+        total = conn.execute("SELECT SUM(LENGTH(data)) FROM pages").fetchone()[0]
+    assert documents == {"a", "c"}
+    assert total <= cache.max_bytes
+
+
+extracted = []
+
+
+def extract_upper_chunk(path, page_numbers):
+    extracted.extend(page_numbers)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return {number: text.upper() for number in page_numbers}
+
+
+def test_rewritten_file_is_extracted_again(tmp_path):
+    cache = outline_core.PageTextCache(str(tmp_path / "cache"))
+    path = tmp_path / "book.txt"
+    path.write_text("first", encoding="utf-8")
+    first = cache.fingerprint(str(path))
+    extracted.clear()
+    for _ in range(2):
+        pages = outline_core.extract_pages_cached(str(path), [0, 1], "upper", extract_upper_chunk, 1, cache)
+        assert pages == {0: "FIRST", 1: "FIRST"}
+    assert extracted == [0, 1]  # 第二次全部来自缓存
+
+    # 改写成同样大小的内容，只有修改时间不同
+    stat = os.stat(path)
+    path.write_text("other", encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.fingerprint(str(path)) != first
+    extracted.clear()
+    pages = outline_core.extract_pages_cached(str(path), [0, 1], "upper", extract_upper_chunk, 1, cache)
+    assert pages == {0: "OTHER", 1: "OTHER"}
+    assert extracted == [0, 1]
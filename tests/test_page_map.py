@@ -0,0 +1,94 @@
+"""
+印刷页码对照表：PDF 自带的页码标签、页脚页码识别和多卷重复页码。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+fitz = pytest.importorskip("fitz")
+
+FRONT_MATTER_AND_BODY = ['i', 'ii', 'iii', 'iv'] + [str(n) for n in range(1, 9)]
+
+
+def make_pdf(path, footers, page_labels=None):
+    """
+    footers 为每页页脚中的文字，None 表示该页没有页码。正文中放一个不在页眉页脚区域的数字。
+    """
+    doc = fitz.open()
+    for footer in footers:
+        page = doc.new_page()
+        page.insert_text((72, 400), "正文 2024 年", fontname="china-s", fontsize=11)
+        if footer is not None:
+            page.insert_text((page.rect.width / 2, page.rect.height - 30), footer, fontsize=10)
+    if page_labels:
+        doc.set_page_labels(page_labels)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return outline_core.PageTextCache(str(tmp_path / "cache"))
+
+
+def test_page_labels_roman_then_arabic(tmp_path, cache):
+    rules = [{'startpage': 0, 'prefix': '', 'style': 'r', 'firstpagenum': 1},
+             {'startpage': 4, 'prefix': '', 'style': 'D', 'firstpagenum': 1}]
+    path = make_pdf(str(tmp_path / "labels.pdf"), [None] * 12, rules)
+    page_map = outline_core.build_page_map(path, workers=1, cache=cache)
+    assert page_map.source == outline_core.PAGE_MAP_LABELS
+    assert page_map.labels == FRONT_MATTER_AND_BODY
+    assert page_map.resolve("iii") == 2
+    assert page_map.resolve("IV") == 3
+    assert page_map.resolve("1") == 4
+    assert page_map.resolve("9") is None
+    assert page_map.label_rules() == rules
+
+
+def test_footer_folios(tmp_path, cache):
+    # 封面和章首页不印页码，前言用罗马数字，正文从 2 开始印
+    footers = [None, 'ii', 'iii', 'iv', None] + [str(n) for n in range(2, 9)]
+    path = make_pdf(str(tmp_path / "folios.pdf"), footers)
+    page_map = outline_core.build_page_map(path, workers=1, cache=cache)
+    assert page_map.source == outline_core.PAGE_MAP_FOLIOS
+    assert page_map.labels == FRONT_MATTER_AND_BODY
+
+    errors = []
+    outline = outline_core.parse_outline("前言 i\n第一章 1\n    1.1 节 5\n", 0, errors, page_map)
+    assert errors == []
+    assert [entry.page for entry in outline] == [0, 4, 8]
+
+
+def test_no_folios_returns_none(tmp_path, cache):
+    path = make_pdf(str(tmp_path / "plain.pdf"), [None] * 10)
+    assert outline_core.build_page_map(path, workers=1, cache=cache) is None
+
+
+def test_repeated_printed_pages(tmp_path, cache):
+    # 两卷合订，每卷都从第 1 页印起
+    footers = [str(n) for n in range(1, 7)] * 2
+    path = make_pdf(str(tmp_path / "volumes.pdf"), footers)
+    page_map = outline_core.build_page_map(path, workers=1, cache=cache)
+    assert page_map.labels == footers
+    assert page_map.resolve("3") == 2
+    assert page_map.resolve("3", after=7) == 8
+    assert page_map.resolve("2", after=11) == 7  # 都在之前时取最后一个
+
+    errors = []
+    text = "卷一 1\n    第二章 3\n卷二 1\n    第二章 3\n    第三章 5\n"
+    outline = outline_core.parse_outline(text, 0, errors, page_map)
+    assert errors == []
+    assert [entry.page for entry in outline] == [0, 2, 6, 8, 10]
+
+
+def test_folio_labels_skip_inserted_plate():
+    # 第 4 页是不计页码的插页，之后的页码差值改变，插页不应被补上页码
+    candidates = [['1'], ['2'], ['3'], [], ['4'], ['5'], ['6']]
+    assert outline_core.folio_labels(candidates) == ['1', '2', '3', None, '4', '5', '6']
@@ -0,0 +1,39 @@
+"""
+加入文件队列时目录文件无法读取：提示并跳过该文件，其他文件照常加入。
+"""
+
+import pytest
+
+from conftest import load_gui_module
+
+fitz = pytest.importorskip("fitz")
+
+
+def make_pdf(path):
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_unreadable_sidecar_is_skipped(qapp, tmp_path, monkeypatch):
+    app = load_gui_module()
+    warnings = []
+    monkeypatch.setattr(app.QMessageBox, "warning", lambda *args, **kwargs: warnings.append(args[2]))
+    good = make_pdf(str(tmp_path / "good.pdf"))
+    bad = make_pdf(str(tmp_path / "bad.pdf"))
+    (tmp_path / "good.toc.txt").write_text("第一章 1\n", encoding="utf-8")
+    (tmp_path / "bad.toc.txt").write_bytes("第一章 1\n".encode("gbk"))
+
+    window = app.PDFOutlineTool()
+    try:
+        monkeypatch.setattr(window, "load_pdf", lambda *args, **kwargs: None)
+        window.add_to_queue([good, bad])
+        assert [entry['pdf'] for entry in window.queue_entries] == [good]
+        assert window.queue_entries[0]['toc_text'] == "第一章 1\n"
+        assert len(warnings) == 1 and "bad.toc.txt" in warnings[0]
+    finally:
+        window.close()
+        window.deleteLater()
+        qapp.processEvents()
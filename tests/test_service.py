@@ -0,0 +1,124 @@
+"""
+服务模式的任务接收上限和上传检查。
+"""
+
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+import outline_service
+
+
+class BlockedExecutor:
+    """不真正运行任务的进程池替身，任务一直处于处理中"""
+
+    def __init__(self):
+        self.submitted = []
+        self.broken = False
+
+    def submit(self, fn, task):
+        if self.broken:
+            raise BrokenProcessPool("工作进程异常退出")
+        future = Future()
+        self.submitted.append(future)
+        return future
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(outline_service.OutlineService, "new_executor", lambda self: BlockedExecutor())
+    return outline_service.OutlineService(str(tmp_path), workers=2, queue_size=3)
+
+
+def submit(service):
+    if not service.reserve():
+        return False
+    job = service.new_job(0, False, outline_core.SAVE_PRESET_FAST)
+    service.submit(job, 1)
+    return True
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def server(service):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), outline_service.OutlineRequestHandler)
+    server.service = service
+    server.max_upload_bytes = 2 ** 20
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_running_jobs_count_against_queue_size(service):
+    assert [submit(service) for _ in range(5)] == [True, True, True, False, False]
+    assert service.counters['rejected'] == 2
+
+
+def test_worker_crash_fails_job_and_replaces_pool(service):
+    submit(service)
+    assert wait_for(lambda: len(service.executor.submitted) == 1)
+    broken = service.executor
+    broken.submitted[0].set_exception(BrokenProcessPool("工作进程异常退出"))
+    job, = service.jobs.values()
+    assert job['status'] == 'failed'
+    assert service.executor is not broken
+    assert service.active == 0
+
+    # 提交时进程池已经损坏：任务记为失败，调度线程继续工作
+    service.executor.broken = True
+    submit(service)
+    assert wait_for(lambda: sum(job['status'] == 'failed' for job in service.jobs.values()) == 2)
+    assert wait_for(lambda: service.active == 0)
+    submit(service)
+    assert wait_for(lambda: len(service.executor.submitted) == 1)
+
+
+def test_full_queue_rejects_before_reading_body(service, server):
+    for _ in range(3):
+        submit(service)
+    with socket.create_connection(server.server_address) as sock:
+        # 只发请求头，不发请求体：必须立即得到 503
+        sock.sendall(b"POST /jobs HTTP/1.1\r\nHost: x\r\nContent-Length: 100000\r\nX-Toc-Length: 4\r\n\r\n")
+        sock.settimeout(5)
+        assert sock.recv(100).startswith(b"HTTP/1.1 503")
+    assert service.active == 3
+
+
+def test_interrupted_upload_releases_slot(service, server):
+    with socket.create_connection(server.server_address) as sock:
+        sock.sendall(b"POST /jobs HTTP/1.1\r\nHost: x\r\nContent-Length: 100000\r\nX-Toc-Length: 4\r\n\r\nA 1\n%PDF")
+        assert wait_for(lambda: service.active == 1)
+    assert wait_for(lambda: service.active == 0)
+    assert service.jobs == {}
+    assert os.listdir(service.job_dir) == []
+
+
+def test_chunked_upload_is_rejected(service, server):
+    conn = http.client.HTTPConnection(*server.server_address)
+    conn.request('POST', '/jobs', body=iter([b"A 1\n", b"%PDF"]),
+                 headers={'X-Toc-Length': '4', 'Transfer-Encoding': 'chunked'}, encode_chunked=True)
+    response = conn.getresponse()
+    assert response.status == 411
+    assert service.jobs == {}
@@ -0,0 +1,42 @@
+"""
+add_outline_to_pdf 在各阶段之间收缩 MuPDF 对象缓存的设置。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outline_core
+
+fitz = pytest.importorskip("fitz")
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    path = str(tmp_path / "sample.pdf")
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page()
+    doc.save(path)
+    doc.close()
+    return path
+
+
+@pytest.mark.parametrize("low_memory, store_shrink, expected", [
+    (False, None, []),
+    (True, None, [outline_core.STORE_SHRINK_LOW_MEMORY] * 2),
+    (True, 0, []),
+    (False, 40, [40, 40]),
+])
+def test_store_shrink(monkeypatch, sample_pdf, low_memory, store_shrink, expected):
+    calls = []
+    monkeypatch.setattr(fitz.TOOLS, "store_shrink", calls.append)
+    outline = [outline_core.OutlineEntry(1, "A", 0)]
+    output = sample_pdf + ".out.pdf"
+    outline_core.add_outline_to_pdf(sample_pdf, output, outline, [], low_memory=low_memory,
+                                    store_shrink=store_shrink)
+    assert calls == expected
+    assert fitz.open(output).get_toc() == [[1, "A", 1]]
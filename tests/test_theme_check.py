@@ -0,0 +1,67 @@
+"""
+主题检测不应在空闲或窗口反复激活时启动子进程。
+"""
+
+import os
+import time
+
+import pytest
+
+from conftest import load_gui_module, process_events_for
+
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+from PyQt5.QtCore import QEvent, QCoreApplication
+
+
+@pytest.fixture
+def app_module(monkeypatch, tmp_path):
+    app = load_gui_module()
+    preferences = tmp_path / ".GlobalPreferences.plist"
+    preferences.write_bytes(b"")
+    spawned = []
+
+    def fake_run(args, *a, **kw):
+        spawned.append(args)
+        return app.subprocess.CompletedProcess(args, 1, "", "")
+
+    # 模拟 macOS：设置指纹读取临时文件，is_dark_mode() 的子进程调用被记录下来
+    monkeypatch.setattr(app.platform, "system", lambda: "Darwin")
+    monkeypatch.setattr(app, "MACOS_GLOBAL_PREFERENCES", str(preferences))
+    monkeypatch.setattr(app.subprocess, "run", fake_run)
+    monkeypatch.setattr(app, "THEME_POLL_MIN_INTERVAL", 10)
+    monkeypatch.setattr(app, "THEME_POLL_MAX_INTERVAL", 80)
+    app.spawned = spawned
+    app.preferences = preferences
+    return app
+
+
+def test_idle_and_activate_do_not_spawn(app_module):
+    qapp = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    window = app_module.PDFOutlineTool()
+    try:
+        window.init_theme_checker()
+        window.check_theme_change()
+        assert len(app_module.spawned) == 1
+        app_module.spawned.clear()
+
+        # 空闲经过多个退避间隔（10 → 80 毫秒），其间窗口多次重新激活
+        deadline = time.monotonic() + 10
+        while window.theme_poll_interval < app_module.THEME_POLL_MAX_INTERVAL and time.monotonic() < deadline:
+            QCoreApplication.sendEvent(window, QEvent(QEvent.WindowActivate))
+            process_events_for(0.02)
+        for _ in range(5):
+            QCoreApplication.sendEvent(window, QEvent(QEvent.WindowActivate))
+            process_events_for(0.05)
+        assert window.theme_poll_interval == app_module.THEME_POLL_MAX_INTERVAL
+        assert app_module.spawned == []
+
+        # 设置文件被改写后，下一次激活才重新检测
+        stat = os.stat(app_module.preferences)
+        os.utime(app_module.preferences, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        QCoreApplication.sendEvent(window, QEvent(QEvent.WindowActivate))
+        assert len(app_module.spawned) == 1
+    finally:
+        window.theme_timer.stop()
+        window.close()
+        window.deleteLater()
+        qapp.processEvents()
@@ -0,0 +1,48 @@
+"""
+读取目录期间换文件：旧的读取线程交出的文档不能在它还在使用时被关闭。
+"""
+
+import pytest
+
+from conftest import load_gui_module, process_events_for
+
+fitz = pytest.importorskip("fitz")
+
+
+def make_pdf(path, pages, toc=None):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page()
+    if toc:
+        doc.set_toc(toc)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_switching_files_while_reading_toc(qapp, tmp_path, monkeypatch):
+    app = load_gui_module()
+    errors = []
+    monkeypatch.setattr(app.QMessageBox, "critical", lambda *args, **kwargs: errors.append(args[2]))
+    big = make_pdf(str(tmp_path / "big.pdf"), 20, [[1, f"T{i}", i % 20 + 1] for i in range(20000)])
+    small = make_pdf(str(tmp_path / "small.pdf"), 3)
+
+    window = app.PDFOutlineTool()
+    try:
+        window.load_pdf(big)
+        # 等到显示出页数（大纲还在读）再换文件
+        while getattr(window, 'page_count', None) != 20:
+            process_events_for(0.001)
+        window.load_pdf(small)
+        readers = window.findChildren(app.TocReader)
+        for reader in readers:
+            reader.wait()
+        process_events_for(0.2)
+        assert errors == []
+        assert window.page_count == 3
+        state, doc = window.open_document
+        assert doc.name == small and not doc.is_closed
+    finally:
+        window.close()
+        window.deleteLater()
+    assert window.open_document is None
@@ -0,0 +1,30 @@
+"""
+监视文件夹：工作进程异常退出时重建进程池，其他文件照常处理。
+"""
+
+import os
+import sys
+
+import pytest
+
+import outline_watch
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="依赖 fork 把替换后的任务函数带到工作进程")
+
+
+def crash_on_bad(job):
+    if os.path.basename(job['pdf']) == "bad.pdf":
+        os._exit(1)  # 模拟被系统杀死或 MuPDF 崩溃
+    return {'pdf': job['pdf'], 'output': job['output'], 'errors': [], 'status': 'ok', 'seconds': 0.0}
+
+
+def test_worker_crash_does_not_stop_watcher(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(outline_watch, "run_batch_job", crash_on_bad)
+    for name in ("a", "b", "bad"):
+        (tmp_path / f"{name}.pdf").write_bytes(b"%PDF")
+        (tmp_path / f"{name}.toc.txt").write_text("A 1\n", encoding='utf-8')
+    hot_folder = outline_watch.HotFolder([str(tmp_path)], workers=1, debounce=0, poll_interval=0.05,
+                                         use_inotify=False)
+    counts = hot_folder.run(once=True)
+    assert counts == {'ok': 2, 'partial': 0, 'failed': 1}
+    assert outline_watch.WORKER_CRASHED_MESSAGE in capsys.readouterr().out